@@ -0,0 +1,126 @@
+"""
+Synthetic corpora for the benchmarks.
+
+PDFs are written by hand (one Helvetica text object per page), so generating
+them needs no PDF library. Text follows a Zipf-like word distribution over a
+fixed vocabulary, which gives BM25 realistic mixes of common and rare terms.
+Everything is seeded, so a size always produces the same corpus.
+"""
+import io
+import os
+import random
+from typing import List, Tuple
+
+import numpy as np
+
+# name: (pdf files, pages per file, text chunks)
+SIZES = {
+    "small": (10, 4, 2000),
+    "medium": (50, 8, 20000),
+    "large": (200, 10, 100000),
+}
+
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "si", "de", "pa", "zu", "ge", "fi", "ho", "ba", "te"]
+
+
+def vocabulary(size: int = 5000, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+
+class TextGenerator:
+    def __init__(self, seed: int = 0, vocabulary_size: int = 5000):
+        self.rng = random.Random(seed)
+        self.words = vocabulary(vocabulary_size, seed)
+        # Zipf weights: the n-th most common word appears about 1/n as often as the first.
+        self.weights = [1.0 / rank for rank in range(1, len(self.words) + 1)]
+
+    def sentence(self, words: int) -> str:
+        sentence = " ".join(self.rng.choices(self.words, self.weights, k=words))
+        return sentence.capitalize() + "."
+
+    def text(self, words: int) -> str:
+        sentences = []
+        while words > 0:
+            length = min(words, self.rng.randint(6, 20))
+            sentences.append(self.sentence(length))
+            words -= length
+        return " ".join(sentences)
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[str], line_width: int = 90):
+    """Write a minimal valid PDF with one page per entry of ``pages``."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * index} 0 R" for index in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font = 3 + 2 * len(pages)
+    for index, text in enumerate(pages):
+        lines, line = [], ""
+        for word in text.split():
+            if line and len(line) + len(word) + 1 > line_width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+        content = " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 760 Td {content} ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * index} 0 R "
+                       f"/Resources << /Font << /F1 {font} 0 R >> >> >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    output, offsets = "%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    with open(path, "w", encoding="latin-1") as file:
+        file.write(output)
+
+
+def pdf_corpus(folder: str, files: int, pages: int, words_per_page: int = 400, seed: int = 0) -> List[str]:
+    """Write ``files`` PDFs of ``pages`` pages into ``folder`` and return their paths."""
+    os.makedirs(folder, exist_ok=True)
+    generator = TextGenerator(seed)
+    paths = []
+    for index in range(files):
+        path = os.path.join(folder, f"synthetic-{index:05d}.pdf")
+        write_pdf(path, [generator.text(words_per_page) for _ in range(pages)])
+        paths.append(path)
+    return paths
+
+
+def text_corpus(chunks: int, words_per_chunk: int = 120, seed: int = 0) -> List[str]:
+    generator = TextGenerator(seed)
+    return [generator.text(words_per_chunk) for _ in range(chunks)]
+
+
+def store_document(rag_db, document_id: int, texts: List[str], embeddings) -> List[int]:
+    """
+    Store synthetic chunks the way ingest does: the chunks joined by newlines as
+    the document's full text, each chunk addressed by its span of it.
+    """
+    spans: List[Tuple[int, int, int]] = []
+    offset = 0
+    for text in texts:
+        spans.append((offset, offset + len(text), len(text.split())))
+        offset += len(text) + 1
+    rag_db.insert_document_full_text(document_id, io.BytesIO("\n".join(texts).encode("utf-8")))
+    return rag_db.insert_document_chunks(document_id, texts, embeddings, spans)
+
+
+def vectors(count: int, dimensions: int = 1024, seed: int = 0) -> np.ndarray:
+    """Random unit vectors, as float32 rows."""
+    rows = np.random.default_rng(seed).standard_normal((count, dimensions), dtype=np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
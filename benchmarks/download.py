@@ -0,0 +1,73 @@
+"""
+Download benchmark for ``rag download`` against a stub arXiv server.
+
+Downloads the same synthetic papers at several concurrency levels into fresh
+folders and reports files/sec, then runs once more over the last folder to
+show that complete files are skipped. With ``--fail-rate`` some transfers are
+cut off and must resume with a Range request.
+
+    python benchmarks/download.py --papers 200 --latency-ms 50 --concurrency 1,4,16
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stub_arxiv  # noqa: E402
+
+
+def run(server, folder: str, papers: int, concurrency: int, rate: float) -> dict:
+    from rag.service._download_papers import ArxivDownloader
+
+    downloader = ArxivDownloader(folder, api_url=f"{server.url}/api/query", page_size=100,
+                                 concurrency=concurrency, rate=rate, api_interval=0, retry_backoff=0.01)
+    stats = downloader.download("synthetic", papers)
+    stats["concurrency"] = concurrency
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--papers", type=int, default=200)
+    parser.add_argument("--pdf-kb", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--fail-rate", type=float, default=0.1)
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma separated download concurrencies.")
+    parser.add_argument("--rate", type=float, default=0.0, help="PDF requests per second (0 for no limit).")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as work:
+        for concurrency in [int(value) for value in args.concurrency.split(",")]:
+            # A fresh server per run, so each one sees the same injected failures.
+            server = stub_arxiv.start(papers=args.papers, pdf_size=args.pdf_kb * 1024,
+                                      latency=args.latency_ms / 1000, fail_rate=args.fail_rate)
+            folder = os.path.join(work, f"c{concurrency}")
+            stats = run(server, folder, args.papers, concurrency, args.rate)
+            stats["range_requests"] = server.range_requests
+            results.append(stats)
+            server.shutdown()
+        server = stub_arxiv.start(papers=args.papers, pdf_size=args.pdf_kb * 1024)
+        rerun = run(server, folder, args.papers, results[-1]["concurrency"], args.rate)
+        rerun["pdf_requests"] = server.pdf_requests
+        server.shutdown()
+
+    print(f"{'concurrency':>11}{'files':>7}{'resumed':>9}{'failed':>8}{'seconds':>9}{'files/s':>9}{'MB/s':>8}")
+    for stats in results:
+        print(f"{stats['concurrency']:>11}{stats['downloaded'] + stats['resumed']:>7}{stats['resumed']:>9}"
+              f"{stats['failed']:>8}{stats['seconds']:>9.2f}{stats['files_per_sec']:>9.1f}"
+              f"{stats['mb_per_sec']:>8.1f}")
+    print(f"Rerun: {rerun['skipped']} of {rerun['found']} skipped, {rerun['pdf_requests']} PDF requests, "
+          f"{rerun['seconds']:.2f}s")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"runs": results, "rerun": rerun}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Graph benchmark for ``GraphDB``: bulk edge upserts and k-hop traversal latency.
+
+Builds a random graph with a skewed degree distribution (a few hubs, many
+leaves) in a temporary database, then expands random seed nodes by 1..k hops,
+with and without a weight threshold, through the recursive CTE and through
+the in-memory CSR adjacency, and reports p50/p99 latency and the size of the
+neighbourhoods reached.
+
+    python benchmarks/graph.py --nodes 100000 --edges 1000000 --hops 3 --queries 50
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def random_edges(nodes: int, edges: int, seed: int = 0, skew: float = 1.5):
+    """``(source, target, relationship, weight)`` rows; endpoints drawn with a power-law bias to low ids."""
+    rng = random.Random(seed)
+    relationships = ("CO_OCCURS", "MENTIONS", "CITES")
+    for _ in range(edges):
+        source = int(nodes * rng.random() ** skew)
+        target = int(nodes * rng.random() ** skew)
+        if source != target:
+            yield f"n{source}", f"n{target}", rng.choice(relationships), round(rng.random(), 3)
+
+
+def measure(traverse, seeds, repeat: int = 1) -> dict:
+    latencies, sizes = [], []
+    for seed in seeds:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            reached = traverse([seed])
+        latencies.append((time.perf_counter() - start) / repeat * 1000)
+        sizes.append(len(reached))
+    return {"p50_ms": percentile(latencies, 0.5), "p99_ms": percentile(latencies, 0.99),
+            "mean_nodes": statistics.mean(sizes)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=100_000)
+    parser.add_argument("--edges", type=int, default=1_000_000)
+    parser.add_argument("--hops", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--min-weight", type=float, default=0.8, help="Threshold for the filtered traversals.")
+    parser.add_argument("--batch", type=int, default=100_000, help="Edges per upsert transaction.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    from rag._database import GraphDB
+
+    results = {"nodes": args.nodes, "edges": args.edges, "traversals": []}
+    with tempfile.TemporaryDirectory() as work:
+        graph_db = GraphDB(os.path.join(work, "graph.db"), csr_cache_size=0)
+        start = time.perf_counter()
+        rows = random_edges(args.nodes, args.edges)
+        written = 0
+        while batch := [row for _, row in zip(range(args.batch), rows)]:
+            written += graph_db.upsert_edges(batch)
+        elapsed = time.perf_counter() - start
+        (edge_count,) = graph_db.conn.execute("SELECT COUNT(*) FROM edges").fetchone()
+        results.update(upsert_seconds=elapsed, edges_per_sec=written / elapsed, stored_edges=edge_count)
+        print(f"Upserted {written} edges ({edge_count} distinct) in {elapsed:.1f}s: "
+              f"{written / elapsed:,.0f} edges/sec")
+
+        rng = random.Random(1)
+        seeds = [f"n{rng.randrange(args.nodes)}" for _ in range(args.queries)]
+        print(f"{'hops':>4}{'min weight':>12}{'engine':>8}{'p50 ms':>10}{'p99 ms':>10}{'nodes':>10}")
+        for min_weight in (None, args.min_weight):
+            cached = GraphDB(graph_db.db_path, csr_cache_size=4)
+            start = time.perf_counter()
+            csr = cached.csr(min_weight)
+            build = time.perf_counter() - start
+            print(f"CSR adjacency{' (weight >= ' + str(min_weight) + ')' if min_weight else ''}: "
+                  f"{csr.edge_count} directed edges, {csr.nbytes / 1e6:.1f}MB, built in {build:.2f}s")
+            for hops in range(1, args.hops + 1):
+                for engine, db in (("sql", graph_db), ("csr", cached)):
+                    stats = measure(lambda nodes: db.neighbourhood(nodes, hops, min_weight=min_weight), seeds)
+                    stats.update(hops=hops, min_weight=min_weight, engine=engine,
+                                 csr_build_seconds=build if engine == "csr" else None)
+                    results["traversals"].append(stats)
+                    print(f"{hops:>4}{min_weight or '-':>12}{engine:>8}{stats['p50_ms']:>10.2f}"
+                          f"{stats['p99_ms']:>10.2f}{stats['mean_nodes']:>10.0f}")
+            cached.close()
+        graph_db.close()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
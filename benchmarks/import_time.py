@@ -0,0 +1,66 @@
+"""
+Import-time budget for the CLI.
+
+Runs ``rag --help`` under ``python -X importtime`` in a fresh interpreter and
+fails (exit code 1) when the modules it imports take longer than the budget,
+or when a heavy dependency that only some subcommands need is imported eagerly.
+
+    python benchmarks/import_time.py --budget-ms 300
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only the commands that use these may import them.
+LAZY_MODULES = ("langchain_community", "langchain_ollama", "chonkie", "tokenizers",
+                "sqlite_vec", "ollama", "httpx", "requests", "rich", "numpy", "fastapi", "uvicorn")
+
+HELP_SCRIPT = "import sys; sys.argv = ['rag', '--help']; from rag import cli; cli()"
+
+
+def measure(runs: int = 3):
+    """Return (best cumulative import time in microseconds, imported module names)."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    best, modules = None, set()
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", HELP_SCRIPT],
+                                capture_output=True, text=True, env=env, cwd=ROOT)
+        if result.returncode != 0:
+            raise SystemExit(f"rag --help failed:\n{result.stderr}")
+        total = 0
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            self_us, _, name = line[len("import time:"):].split("|")
+            total += int(self_us)
+            modules.add(name.strip().split(".")[0])
+        best = total if best is None else min(best, total)
+    return best, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget-ms", type=float, default=300.0,
+                        help="Maximum total import time for `rag --help`.")
+    parser.add_argument("--runs", type=int, default=3, help="Best of this many runs is reported.")
+    args = parser.parse_args()
+
+    total_us, modules = measure(args.runs)
+    eager = sorted(set(LAZY_MODULES) & modules)
+    print(f"rag --help imports: {total_us / 1000:.1f}ms (budget {args.budget_ms:.0f}ms)")
+    failed = False
+    if eager:
+        print(f"FAIL: imported eagerly: {', '.join(eager)}")
+        failed = True
+    if total_us / 1000 > args.budget_ms:
+        print("FAIL: import time over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Load test for ``rag serve`` against a stub Ollama.
+
+Builds a synthetic corpus in a temporary database, starts the stub Ollama and
+the HTTP API in-process, then drives ``/search`` (or ``/ask``) with concurrent
+clients and reports p50/p99 latency and throughput. For ``/ask`` the
+time-to-first-token is reported as well.
+
+    python benchmarks/load_test.py --endpoint search --clients 32 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus  # noqa: E402
+import stub_ollama  # noqa: E402
+
+WORDS = ("vector index query latency throughput corpus embedding retrieval answer model token cache "
+         "sqlite thread pool server request client document chunk search rank fusion").split()
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def build_corpus(db_file: str, documents: int, chunks_per_document: int, dimensions: int):
+    from rag._database import RagDb
+
+    RagDb.init_db(db_file)
+    rag_db = RagDb(db_file)
+    rng = random.Random(0)
+    for index in range(documents):
+        document_id, _ = rag_db.register_document(f"synthetic/{index}.pdf", f"hash-{index}")
+        texts = [" ".join(rng.choice(WORDS) for _ in range(60)) for _ in range(chunks_per_document)]
+        corpus.store_document(rag_db, document_id, texts,
+                              [stub_ollama.vector(text, dimensions) for text in texts])
+        rag_db.complete_document(document_id)
+    rag_db.cn.close()
+
+
+async def drive(url: str, endpoint: str, clients: int, requests: int) -> dict:
+    import httpx
+
+    latencies, first_tokens, errors = [], [], 0
+    counter = iter(range(requests))
+    rng = random.Random(1)
+
+    async def client(http):
+        nonlocal errors
+        for _ in counter:
+            question = " ".join(rng.choice(WORDS) for _ in range(6))
+            start = time.perf_counter()
+            try:
+                if endpoint == "search":
+                    response = await http.post(f"{url}/search", json={"query": question, "limit": 10})
+                    response.raise_for_status()
+                else:
+                    first_token = None
+                    async with http.stream("POST", f"{url}/ask", json={"question": question}) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if first_token is None and line and "token" in json.loads(line):
+                                first_token = time.perf_counter() - start
+                    if first_token is not None:
+                        first_tokens.append(first_token)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as http:
+        await asyncio.gather(*(client(http) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    result = {
+        "endpoint": endpoint,
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "requests_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else None,
+    }
+    if first_tokens:
+        result["ttft_p50_ms"] = percentile(first_tokens, 0.50) * 1000
+        result["ttft_p99_ms"] = percentile(first_tokens, 0.99) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--endpoint", choices=["search", "ask"], default="search")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8, help="Server pool threads.")
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=20, help="Chunks per document.")
+    parser.add_argument("--dimensions", type=int, default=1024)
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0)
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    parser.add_argument("--token-latency-ms", type=float, default=5.0)
+    parser.add_argument("--json", help="Also write the result to this file.")
+    args = parser.parse_args()
+
+    stub = stub_ollama.start(dimensions=args.dimensions, embed_latency=args.embed_latency_ms / 1000,
+                             first_token_latency=args.first_token_ms / 1000,
+                             token_latency=args.token_latency_ms / 1000)
+    with tempfile.TemporaryDirectory() as folder:
+        stub_ollama.use_stub(stub, os.path.join(folder, "ann"))
+        import uvicorn
+
+        from rag._server import create_app
+
+        db_file = os.path.join(folder, "load.db")
+        start = time.perf_counter()
+        build_corpus(db_file, args.documents, args.chunks, args.dimensions)
+        print(f"Built {args.documents * args.chunks} chunks in {time.perf_counter() - start:.1f}s")
+
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(create_app(db_file, args.workers), host="127.0.0.1",
+                                               port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        result = asyncio.run(drive(f"http://127.0.0.1:{port}", args.endpoint, args.clients, args.requests))
+        server.should_exit = True
+        thread.join()
+
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
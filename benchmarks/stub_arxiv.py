@@ -0,0 +1,155 @@
+"""
+A stand-in for the arXiv API and PDF server, for download benchmarks.
+
+Serves a paged Atom feed at /api/query for any search query and synthetic PDFs
+at /pdf/<id>.pdf, honouring Range requests. With ``--fail-rate`` a fraction of
+the PDF responses is cut off half way through, to exercise resumption.
+
+    python benchmarks/stub_arxiv.py --port 8081 --papers 1000 --latency-ms 50
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+
+def pdf_bytes(paper: int, size: int) -> bytes:
+    """Deterministic bytes shaped like a PDF: the header, filler and an %%EOF trailer."""
+    rng = random.Random(paper)
+    body = bytes(rng.getrandbits(8) for _ in range(min(size, 4096)))
+    body = (body * (size // len(body) + 1))[:size]
+    return b"%PDF-1.4\n" + body + b"\n%%EOF\n"
+
+
+class StubArxiv(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, papers: int = 100, pdf_size: int = 256 * 1024,
+                 latency: float = 0.0, fail_rate: float = 0.0):
+        super().__init__(address, _Handler)
+        self.papers = papers
+        self.pdf_size = pdf_size
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.api_requests = 0
+        self.pdf_requests = 0
+        self.range_requests = 0
+        self._pdfs = {}
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def pdf(self, paper: int) -> bytes:
+        with self._lock:
+            if paper not in self._pdfs:
+                self._pdfs[paper] = pdf_bytes(paper, self.pdf_size)
+            return self._pdfs[paper]
+
+    def should_fail(self, paper: int) -> bool:
+        # Each paper fails at most once, so a resumed download always completes.
+        with self._lock:
+            if paper in self._failed or random.Random(paper * 7919).random() >= self.fail_rate:
+                return False
+            self._failed.add(paper)
+            return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server: StubArxiv = self.server
+        time.sleep(server.latency)
+        url = urlparse(self.path)
+        if url.path == "/api/query":
+            self._feed(server, parse_qs(url.query))
+        elif match := re.fullmatch(r"/pdf/(\d+)\.pdf", url.path):
+            self._pdf(server, int(match.group(1)))
+        else:
+            self.send_error(404)
+
+    def _feed(self, server: StubArxiv, query: dict):
+        server.api_requests += 1
+        start = int(query.get("start", ["0"])[0])
+        count = int(query.get("max_results", ["10"])[0])
+        entries = "".join(
+            f"<entry><id>{server.url}/abs/{paper}</id><title>{escape(f'Synthetic paper {paper}')}</title>"
+            f'<link title="pdf" href="{server.url}/pdf/{paper}" rel="related" type="application/pdf"/></entry>'
+            for paper in range(start, min(start + count, server.papers))
+        )
+        data = ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+                f"<opensearch:totalResults>{server.papers}</opensearch:totalResults>"
+                f"<opensearch:startIndex>{start}</opensearch:startIndex>{entries}</feed>").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/atom+xml")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _pdf(self, server: StubArxiv, paper: int):
+        if paper >= server.papers:
+            self.send_error(404)
+            return
+        server.pdf_requests += 1
+        data = server.pdf(paper)
+        offset = 0
+        if match := re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", "")):
+            server.range_requests += 1
+            offset = int(match.group(1))
+            if offset >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {offset}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(data) - offset))
+        self.end_headers()
+        if not offset and server.should_fail(paper):
+            # Drop the connection half way through the body.
+            self.wfile.write(data[:len(data) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(data[offset:])
+
+
+def start(port: int = 0, **options) -> StubArxiv:
+    """Start a stub server on a background thread; ``port=0`` picks a free port."""
+    server = StubArxiv(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, name="stub-arxiv", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--papers", type=int, default=100)
+    parser.add_argument("--pdf-kb", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = StubArxiv(("127.0.0.1", args.port), papers=args.papers, pdf_size=args.pdf_kb * 1024,
+                       latency=args.latency_ms / 1000, fail_rate=args.fail_rate)
+    print(f"Stub arXiv listening on {server.url}/api/query")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
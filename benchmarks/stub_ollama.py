@@ -0,0 +1,177 @@
+"""
+A stand-in for the Ollama HTTP API, for benchmarks that must not depend on a GPU.
+
+Serves /api/embed, /api/embeddings, /api/chat (streamed or not), /api/generate
+(answering relevance grading prompts with a JSON yes/no) and /api/tags.
+Embeddings are deterministic unit vectors seeded by the text, so identical text
+always gets the identical vector. Latencies are simulated with sleeps.
+
+    python benchmarks/stub_ollama.py --port 11435 --embed-latency-ms 20
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = ("The retrieved passages describe the topic in detail [1], and the remaining "
+          "context adds supporting evidence [2].").split(" ")
+
+
+def vector(text: str, dimensions: int = 1024):
+    """Deterministic unit vector for ``text``."""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    values = [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+    norm = sum(value * value for value in values) ** 0.5
+    return [value / norm for value in values]
+
+
+class StubOllama(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, dimensions: int = 1024, embed_latency: float = 0.0,
+                 first_token_latency: float = 0.0, token_latency: float = 0.0, tokens: int = len(ANSWER)):
+        super().__init__(address, _Handler)
+        self.dimensions = dimensions
+        self.embed_latency = embed_latency
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.tokens = tokens
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "stub:latest", "model": "stub:latest", "size": 0}]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        server: StubOllama = self.server
+        server.requests += 1
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/api/embed":
+            texts = request.get("input", [])
+            texts = [texts] if isinstance(texts, str) else texts
+            time.sleep(server.embed_latency)
+            self._send_json({"model": request.get("model"),
+                             "embeddings": [vector(text, server.dimensions) for text in texts]})
+        elif self.path == "/api/embeddings":
+            time.sleep(server.embed_latency)
+            self._send_json({"embedding": vector(request.get("prompt", ""), server.dimensions)})
+        elif self.path == "/api/chat":
+            self._chat(server, request)
+        elif self.path == "/api/generate":
+            # Deterministic grades: about half of the (document, question) prompts are relevant.
+            time.sleep(server.first_token_latency)
+            relevant = hashlib.sha256(request.get("prompt", "").encode("utf-8")).digest()[0] % 2 == 0
+            self._send_json({"model": request.get("model"), "done": True,
+                             "response": json.dumps({"score": "yes" if relevant else "no"})})
+        else:
+            self.send_error(404)
+
+    def _chat(self, server: StubOllama, request: dict):
+        start = time.perf_counter_ns()
+        words = (ANSWER * (server.tokens // len(ANSWER) + 1))[:server.tokens]
+        created_at = datetime.now(timezone.utc).isoformat()
+
+        def chunk(content: str, done: bool) -> dict:
+            body = {"model": request.get("model"), "created_at": created_at,
+                    "message": {"role": "assistant", "content": content}, "done": done}
+            if done:
+                elapsed = time.perf_counter_ns() - start
+                body.update(done_reason="stop", total_duration=elapsed, load_duration=0,
+                            prompt_eval_count=len(json.dumps(request.get("messages", []))) // 4,
+                            prompt_eval_duration=int(server.first_token_latency * 1e9),
+                            eval_count=len(words),
+                            eval_duration=max(1, elapsed - int(server.first_token_latency * 1e9)))
+            return body
+
+        time.sleep(server.first_token_latency)
+        if not request.get("stream", True):
+            time.sleep(server.token_latency * (len(words) - 1))
+            self._send_json(chunk(" ".join(words), True))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for index, word in enumerate(words):
+            if index:
+                time.sleep(server.token_latency)
+            self._write_chunk(chunk(word + " ", False))
+        self._write_chunk(chunk("", True))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, body: dict):
+        data = (json.dumps(body) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start(port: int = 0, **options) -> StubOllama:
+    """Start a stub server on a background thread; ``port=0`` picks a free port."""
+    server = StubOllama(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, name="stub-ollama", daemon=True).start()
+    return server
+
+
+def use_stub(server: StubOllama, ann_index_path: str = None):
+    """
+    Point rag at the stub. Call before importing rag's services: their
+    constructors read these settings as default argument values.
+    """
+    import os
+
+    os.environ["OLLAMA_HOST"] = server.url
+    from rag._config import appConfig
+
+    appConfig["OLLAMA_URL"] = server.url
+    appConfig["OLLAMA_EMBEDDING_DIMENSIONS"] = str(server.dimensions)
+    if ann_index_path:
+        # Never pick up (or extend) an ANN index from the working directory.
+        appConfig["ANN_INDEX_PATH"] = ann_index_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dimensions", type=int, default=1024)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--first-token-ms", type=float, default=0.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--tokens", type=int, default=len(ANSWER))
+    args = parser.parse_args()
+    server = StubOllama(("127.0.0.1", args.port), dimensions=args.dimensions,
+                        embed_latency=args.embed_latency_ms / 1000,
+                        first_token_latency=args.first_token_ms / 1000,
+                        token_latency=args.token_latency_ms / 1000, tokens=args.tokens)
+    print(f"Stub Ollama listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
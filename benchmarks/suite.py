@@ -0,0 +1,209 @@
+"""
+Offline benchmark suite for ingest, inserts and search.
+
+Runs against the stub Ollama (no GPU or model downloads needed beyond the
+splitter's tokenizer) on synthetic corpora of one or more sizes and measures:
+
+* ingest: ``IngestService.ingest_folder`` over generated PDFs, files/sec and chunks/sec;
+* insert: batched full text and ``RagDb.insert_document_chunks`` writes, chunks/sec and
+  document registrations/sec;
+* search: vector, FTS and hybrid (``SearchService``) latency percentiles.
+
+Results are written as JSON; ``--compare`` prints the change against an
+earlier run.
+
+    python benchmarks/suite.py --sizes small,medium --output results.json
+    python benchmarks/suite.py --sizes small --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus  # noqa: E402
+import stub_ollama  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Metrics where a smaller number is better; everything else is a rate.
+LOWER_IS_BETTER = ("_ms", "seconds", "bytes")
+
+
+def percentiles(samples) -> dict:
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] * 1000
+
+    return {"p50_ms": at(0.50), "p90_ms": at(0.90), "p99_ms": at(0.99),
+            "mean_ms": statistics.mean(ordered) * 1000, "samples": len(ordered)}
+
+
+def bench_ingest(folder: str, files: int, pages: int) -> dict:
+    from rag._database import RagDb
+    from rag.service._ingest import IngestService
+
+    pdf_folder = os.path.join(folder, "pdf")
+    corpus.pdf_corpus(pdf_folder, files, pages)
+    db_file = os.path.join(folder, "ingest.db")
+    RagDb.init_db(db_file)
+    stats = IngestService(db_file).ingest_folder(pdf_folder)
+    stats["pages"] = files * pages
+    return stats
+
+
+def bench_insert(db_file: str, chunks: int, dimensions: int, batch: int = 100) -> dict:
+    from rag._database import RagDb
+
+    RagDb.init_db(db_file)
+    rag_db = RagDb(db_file)
+    texts = corpus.text_corpus(chunks)
+    vectors = corpus.vectors(chunks, dimensions)
+
+    start = time.perf_counter()
+    documents = [rag_db.register_document(f"synthetic/{index}.txt", f"hash-{index}")[0]
+                 for index in range((chunks + batch - 1) // batch)]
+    register_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for document_id, offset in zip(documents, range(0, chunks, batch)):
+        corpus.store_document(rag_db, document_id, texts[offset:offset + batch], vectors[offset:offset + batch])
+        rag_db.complete_document(document_id)
+    insert_seconds = time.perf_counter() - start
+    rag_db.cn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    rag_db.cn.close()
+    return {
+        "chunks": chunks,
+        "batch": batch,
+        "chunks_per_sec": chunks / insert_seconds,
+        "documents_per_sec": len(documents) / register_seconds if register_seconds else 0.0,
+        "seconds": insert_seconds,
+        "database_bytes_per_chunk": os.path.getsize(db_file) / chunks,
+    }
+
+
+def bench_search(db_file: str, queries: int, dimensions: int, k: int = 10) -> dict:
+    from rag._database import RagDb
+    from rag.service._search import SearchService
+
+    rag_db = RagDb(db_file)
+    generator = corpus.TextGenerator(seed=1)
+    texts = [generator.text(random.Random(index).randint(2, 8)) for index in range(queries)]
+    query_vectors = corpus.vectors(queries, dimensions, seed=1)
+
+    def timed(fn, items):
+        samples = []
+        for item in items:
+            start = time.perf_counter()
+            fn(item)
+            samples.append(time.perf_counter() - start)
+        return percentiles(samples)
+
+    service = SearchService(db_file)
+    try:
+        return {
+            "vector": timed(lambda vector: rag_db.search_embeddings(vector, k), query_vectors),
+            "fts": timed(lambda text: rag_db.search_fts(text, k), texts),
+            "hybrid": timed(lambda text: service.search(text, k), texts),
+        }
+    finally:
+        service.close()
+
+
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "dimensions": args.dimensions,
+        "embed_latency_ms": args.embed_latency_ms,
+        "queries": args.queries,
+    }
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(previous: dict, current: dict):
+    before, after = flatten(previous["results"]), flatten(current["results"])
+    print(f"{'metric':<40}{'before':>12}{'after':>12}{'change':>9}")
+    for name in sorted(before.keys() & after.keys()):
+        if name.endswith((".samples", ".chunks", ".files", ".batch", ".pages", ".failed")) or not before[name]:
+            continue
+        change = after[name] / before[name] - 1
+        better = change < 0 if name.endswith(LOWER_IS_BETTER) else change > 0
+        # Only flag changes beyond run-to-run noise.
+        marker = (" +" if better else " -") if abs(change) > 0.05 else ""
+        print(f"{name:<40}{before[name]:>12.2f}{after[name]:>12.2f}{change:>9.1%}{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="small", help=f"Comma separated, from {', '.join(corpus.SIZES)}.")
+    parser.add_argument("--skip", default="", help="Comma separated benchmarks to skip: ingest, insert, search.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimensions", type=int, default=1024)
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="An earlier results file to compare against.")
+    args = parser.parse_args()
+    skip = set(filter(None, args.skip.split(",")))
+
+    stub = stub_ollama.start(dimensions=args.dimensions, embed_latency=args.embed_latency_ms / 1000)
+    report = {"meta": metadata(args), "results": {}}
+    with tempfile.TemporaryDirectory() as folder:
+        stub_ollama.use_stub(stub, os.path.join(folder, "ann"))
+        for size in args.sizes.split(","):
+            files, pages, chunks = corpus.SIZES[size]
+            size_folder = os.path.join(folder, size)
+            os.makedirs(size_folder)
+            results = report["results"][size] = {}
+            if "ingest" not in skip:
+                results["ingest"] = bench_ingest(size_folder, files, pages)
+                print(f"[{size}] ingest: {results['ingest']['files_per_sec']:.2f} files/sec, "
+                      f"{results['ingest']['chunks_per_sec']:.1f} chunks/sec")
+            db_file = os.path.join(size_folder, "search.db")
+            if "insert" not in skip or "search" not in skip:
+                results["insert"] = bench_insert(db_file, chunks, args.dimensions)
+                print(f"[{size}] insert: {results['insert']['chunks_per_sec']:.0f} chunks/sec")
+            if "search" not in skip:
+                results["search"] = bench_search(db_file, args.queries, args.dimensions)
+                print(f"[{size}] search p50: " + ", ".join(
+                    f"{kind} {values['p50_ms']:.2f}ms" for kind, values in results["search"].items()))
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            compare(json.load(file), report)
+
+
+if __name__ == "__main__":
+    main()
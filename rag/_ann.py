@@ -0,0 +1,294 @@
+import json
+import logging
+import os
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single writer process is assumed.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Rows handled per step when assigning, copying or scanning vectors.
+_BLOCK = 65536
+# Upper bound on the vector-to-centroid distance matrix of one assignment step.
+_DISTANCE_BYTES = 64 << 20
+# k-means trains on 39 to 256 vectors per list, within this many bytes unless
+# even 39 per list needs more.
+_SAMPLE_PER_LIST = (39, 256)
+_SAMPLE_BYTES = 1 << 30
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) approximate nearest neighbour index over float32 vectors.
+
+    The index lives in a directory of ``.npy`` files that every process maps
+    read-only with ``mmap_mode="r"``, so the page cache holds one copy no matter
+    how many processes search it. Vectors are stored sorted by their nearest
+    k-means centroid; a search scores the ``nprobe`` closest lists with one
+    matrix product each, plus the delta segment of vectors added since the last
+    build.
+
+    ``meta.json`` names the current file version. Builds write a new version and
+    then atomically replace ``meta.json``, and appends only become visible when
+    ``delta_count`` is advanced, so readers never see a half written index.
+    Ids are opaque int64 values; ``RagDb`` maps them to chunk ids.
+    """
+
+    def __init__(self, path: str, nprobe: int = 16):
+        self.path = path
+        self.nprobe = nprobe
+        self._meta_stamp = None
+        self.meta = None
+
+    # -- files ------------------------------------------------------------
+
+    def _file(self, name: str, version: int) -> str:
+        # Delta segments are raw appendable arrays; everything else is a .npy file.
+        suffix = "" if name.startswith("delta") else ".npy"
+        return os.path.join(self.path, f"{name}.{version}{suffix}")
+
+    def exists(self) -> bool:
+        return os.path.isfile(os.path.join(self.path, "meta.json"))
+
+    def _read_meta(self) -> Optional[dict]:
+        meta_path = os.path.join(self.path, "meta.json")
+        try:
+            # os.replace gives every meta.json a new inode, so this spots each write.
+            stat = os.stat(meta_path)
+            stamp = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return None
+        if stamp != self._meta_stamp:
+            with open(meta_path, "r", encoding="utf-8") as file:
+                meta = json.load(file)
+            if self.meta is None or meta["version"] != self.meta["version"]:
+                self._open(meta)
+            self.meta, self._meta_stamp = meta, stamp
+        return self.meta
+
+    def _write_meta(self, meta: dict):
+        temp_path = os.path.join(self.path, "meta.json.tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, os.path.join(self.path, "meta.json"))
+
+    def _open(self, meta: dict):
+        version = meta["version"]
+        if meta["count"]:
+            self._centroids = np.load(self._file("centroids", version))
+            self._centroid_norms = (self._centroids * self._centroids).sum(axis=1)
+            self._offsets = np.load(self._file("offsets", version))
+            self._vectors = np.load(self._file("vectors", version), mmap_mode="r")
+            self._norms = np.load(self._file("norms", version), mmap_mode="r")
+            self._ids = np.load(self._file("ids", version), mmap_mode="r")
+        else:
+            self._centroids = None
+        self._delta_vectors_path = self._file("delta_vectors", version)
+        self._delta_ids_path = self._file("delta_ids", version)
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "write.lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    # -- writes -----------------------------------------------------------
+
+    def add(self, ids: Sequence[int], vectors: Sequence[Sequence[float]]):
+        """Append vectors to the delta segment; they are searchable immediately."""
+        if not len(ids):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._write_lock():
+            meta = self._read_meta()
+            if meta is None:
+                meta = {"version": 0, "dimensions": int(vectors.shape[1]), "count": 0,
+                        "nlist": 0, "delta_count": 0}
+                self.meta = meta
+                self._open(meta)
+            if vectors.shape[1] != meta["dimensions"]:
+                raise ValueError(f"Expected {meta['dimensions']} dimensions, got {vectors.shape[1]}")
+            # Truncate to the committed length first, dropping any torn append.
+            for path, row_bytes, rows in ((self._delta_vectors_path, 4 * meta["dimensions"], vectors),
+                                          (self._delta_ids_path, 8, ids)):
+                with open(path, "ab") as file:
+                    file.truncate(meta["delta_count"] * row_bytes)
+                    file.write(rows.tobytes())
+                    file.flush()
+                    os.fsync(file.fileno())
+            meta = dict(meta, delta_count=meta["delta_count"] + len(ids))
+            self._write_meta(meta)
+        if meta["count"] and meta["delta_count"] > max(_BLOCK, meta["count"] // 10):
+            logger.warning(f"ANN delta segment holds {meta['delta_count']} vectors; "
+                           "rebuild the index to keep searches fast")
+
+    def build(self, rows: Iterable[Tuple[int, bytes]], count: int, dimensions: int,
+              nlist: int = None, iterations: int = 10, sample_size: int = None, seed: int = 0):
+        """
+        Build a new index version from ``(id, float32 blob)`` rows and return its meta.
+
+        The rows are spooled once into a temporary memory-mapped file, k-means
+        centroids are trained on a sample of 39 to 256 vectors per list, and the
+        vectors are assigned and copied into list order block by block. Each
+        assignment step scores only as many vectors as fit ``_DISTANCE_BYTES``
+        of distances, so apart from the sample, memory does not grow with the
+        corpus or the number of lists.
+        """
+        nlist = nlist or max(1, min(count // 39, int(4 * count ** 0.5)))
+        with self._write_lock():
+            meta = self._read_meta()
+            version = meta["version"] + 1 if meta else 1
+            spool_path = os.path.join(self.path, "build.spool.npy")
+            spool = np.lib.format.open_memmap(spool_path, mode="w+", dtype=np.float32,
+                                              shape=(max(count, 1), dimensions))
+            ids = np.empty(count, dtype=np.int64)
+            filled = 0
+            for row_id, blob in rows:
+                if filled == count:
+                    break
+                ids[filled] = row_id
+                spool[filled] = np.frombuffer(blob, dtype=np.float32)
+                filled += 1
+            ids, count = ids[:filled], filled
+            if not count:
+                raise ValueError("Cannot build an ANN index without vectors")
+
+            nlist = min(nlist, count)
+            least, most = _SAMPLE_PER_LIST
+            sample_size = min(count, sample_size or max(least * nlist,
+                                                        min(most * nlist, _SAMPLE_BYTES // (4 * dimensions))))
+            rng = np.random.default_rng(seed)
+            sample = spool[np.sort(rng.choice(count, sample_size, replace=False))]
+            centroids = self._kmeans(np.asarray(sample), nlist, iterations, rng)
+            assignments = np.empty(count, dtype=np.int32)
+            for start in range(0, count, _BLOCK):
+                assignments[start:start + _BLOCK] = self._nearest(spool[start:start + _BLOCK], centroids)
+            order = np.argsort(assignments, kind="stable")
+            offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(assignments, minlength=len(centroids)), out=offsets[1:])
+
+            vectors = np.lib.format.open_memmap(self._file("vectors", version), mode="w+",
+                                                dtype=np.float32, shape=(count, dimensions))
+            norms = np.empty(count, dtype=np.float32)
+            for start in range(0, count, _BLOCK):
+                # Gather in file order (sequential reads), then restore list order.
+                rows = order[start:start + _BLOCK]
+                sorted_rows = np.sort(rows)
+                block = spool[sorted_rows][np.searchsorted(sorted_rows, rows)]
+                vectors[start:start + len(block)] = block
+                norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+            vectors.flush()
+            del vectors, spool
+            os.remove(spool_path)
+            np.save(self._file("centroids", version), centroids)
+            np.save(self._file("offsets", version), offsets)
+            np.save(self._file("norms", version), norms)
+            np.save(self._file("ids", version), ids[order])
+            for name in ("delta_vectors", "delta_ids"):
+                open(self._file(name, version), "wb").close()
+            old_version = meta["version"] if meta else None
+            meta = {"version": version, "dimensions": dimensions, "count": count,
+                    "nlist": len(centroids), "delta_count": 0}
+            self._write_meta(meta)
+            if old_version is not None:
+                self._remove_version(old_version)
+        logger.info(f"Built ANN index version {version}: {count} vectors in {len(centroids)} lists")
+        return meta
+
+    def _remove_version(self, version: int):
+        # Readers that still map the old files keep them alive until they reload.
+        for name in ("centroids", "offsets", "vectors", "norms", "ids", "delta_vectors", "delta_ids"):
+            try:
+                os.remove(self._file(name, version))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Index of each vector's nearest centroid, scored in blocks of at most ``_DISTANCE_BYTES``."""
+        centroid_norms = (centroids * centroids).sum(axis=1)
+        step = max(1, _DISTANCE_BYTES // (4 * len(centroids)))
+        nearest = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), step):
+            scores = vectors[start:start + step] @ centroids.T
+            scores *= -2.0
+            scores += centroid_norms
+            nearest[start:start + step] = scores.argmin(axis=1)
+        return nearest
+
+    @classmethod
+    def _kmeans(cls, sample: np.ndarray, k: int, iterations: int, rng) -> np.ndarray:
+        centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+        for _ in range(iterations):
+            labels = cls._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=k)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        return centroids
+
+    # -- reads ------------------------------------------------------------
+
+    def search(self, query: Sequence[float], k: int = 10, nprobe: int = None) -> List[Tuple[int, float]]:
+        """Return up to ``k`` ``(id, l2_distance)`` pairs, nearest first."""
+        meta = self._read_meta()
+        if meta is None:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        query_norm = float(query @ query)
+        candidate_ids, candidate_scores = [], []
+
+        if meta["count"]:
+            centroid_scores = self._centroid_norms - 2.0 * (self._centroids @ query)
+            probes = np.argsort(centroid_scores)[:nprobe or self.nprobe]
+            for probe in probes:
+                start, end = self._offsets[probe], self._offsets[probe + 1]
+                if start == end:
+                    continue
+                candidate_scores.append(self._norms[start:end] - 2.0 * (self._vectors[start:end] @ query))
+                candidate_ids.append(self._ids[start:end])
+
+        if meta["delta_count"]:
+            delta = np.memmap(self._delta_vectors_path, dtype=np.float32, mode="r",
+                              shape=(meta["delta_count"], meta["dimensions"]))
+            delta_ids = np.memmap(self._delta_ids_path, dtype=np.int64, mode="r",
+                                  shape=(meta["delta_count"],))
+            for start in range(0, meta["delta_count"], _BLOCK):
+                block = delta[start:start + _BLOCK]
+                candidate_scores.append(np.einsum("ij,ij->i", block, block) - 2.0 * (block @ query))
+                candidate_ids.append(delta_ids[start:start + _BLOCK])
+
+        if not candidate_ids:
+            return []
+        scores = np.concatenate(candidate_scores)
+        ids = np.concatenate(candidate_ids)
+        # Over-fetch so duplicate ids (re-added during a rebuild) still leave k results.
+        top = min(len(scores), 2 * k)
+        best = np.argpartition(scores, top - 1)[:top]
+        best = best[np.argsort(scores[best])]
+        results, seen = [], set()
+        for index in best:
+            row_id = int(ids[index])
+            if row_id in seen:
+                continue
+            seen.add(row_id)
+            results.append((row_id, float(np.sqrt(max(scores[index] + query_norm, 0.0)))))
+            if len(results) == k:
+                break
+        return results
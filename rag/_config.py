@@ -36,6 +36,58 @@ DEFAULT_CONFIG = {
     "OLLAMA_EMBEDDING_DIMENSIONS": os.environ.get(
         "OLLAMA_EMBEDDING_DIMENSIONS", 1024
     ),
+    "VECTOR_QUANTIZATION": os.environ.get("VECTOR_QUANTIZATION", "none"),
+    "VECTOR_RESCORE_OVERSAMPLE": os.environ.get("VECTOR_RESCORE_OVERSAMPLE", 8),
+    "ANN_INDEX_PATH": os.environ.get("ANN_INDEX_PATH", "rag-ann"),
+    "ANN_NPROBE": os.environ.get("ANN_NPROBE", 16),
+    "GRADER_MODEL": os.environ.get("GRADER_MODEL", "llama3.2"),
+    "GRADER_CONCURRENCY": os.environ.get("GRADER_CONCURRENCY", 4),
+    "CHAT_CACHE_SIMILARITY": os.environ.get("CHAT_CACHE_SIMILARITY", 0.92),
+    "CHAT_CACHE_TTL": os.environ.get("CHAT_CACHE_TTL", 604800),
+    "CHAT_CACHE_MAX_ENTRIES": os.environ.get("CHAT_CACHE_MAX_ENTRIES", 10000),
+    "OLLAMA_EMBEDDING_BATCH_SIZE": os.environ.get(
+        "OLLAMA_EMBEDDING_BATCH_SIZE", 32
+    ),
+    "OLLAMA_EMBEDDING_CONCURRENCY": os.environ.get(
+        "OLLAMA_EMBEDDING_CONCURRENCY", 4
+    ),
+    "OLLAMA_REQUEST_TIMEOUT": os.environ.get("OLLAMA_REQUEST_TIMEOUT", 120),
+    "OLLAMA_MAX_RETRIES": os.environ.get("OLLAMA_MAX_RETRIES", 3),
+    "INGEST_PARSE_WORKERS": os.environ.get(
+        "INGEST_PARSE_WORKERS", max(1, (os.cpu_count() or 2) // 2)
+    ),
+    "INGEST_SPLIT_WORKERS": os.environ.get(
+        "INGEST_SPLIT_WORKERS", max(1, (os.cpu_count() or 2) // 2)
+    ),
+    "SCAN_HASH_WORKERS": os.environ.get("SCAN_HASH_WORKERS", 4),
+    "EMBEDDING_CACHE_MAX_ENTRIES": os.environ.get(
+        "EMBEDDING_CACHE_MAX_ENTRIES", 1000000
+    ),
+    # off, skip (store near-duplicate chunks unsearchable) or reuse (share the original's vector).
+    "DEDUP_POLICY": os.environ.get("DEDUP_POLICY", "skip"),
+    "DEDUP_MAX_DISTANCE": os.environ.get("DEDUP_MAX_DISTANCE", 6),
+    "DEDUP_MIN_TOKENS": os.environ.get("DEDUP_MIN_TOKENS", 16),
+    "ARXIV_API_URL": os.environ.get("ARXIV_API_URL", "http://export.arxiv.org/api/query"),
+    "ARXIV_PAGE_SIZE": os.environ.get("ARXIV_PAGE_SIZE", 100),
+    "ARXIV_API_INTERVAL": os.environ.get("ARXIV_API_INTERVAL", 3),
+    "ARXIV_DOWNLOAD_CONCURRENCY": os.environ.get("ARXIV_DOWNLOAD_CONCURRENCY", 4),
+    # PDF requests per second across all download workers.
+    "ARXIV_DOWNLOAD_RATE": os.environ.get("ARXIV_DOWNLOAD_RATE", 1),
+    "WATCH_DEBOUNCE": os.environ.get("WATCH_DEBOUNCE", 2),
+    "WATCH_POLL_INTERVAL": os.environ.get("WATCH_POLL_INTERVAL", 5),
+    "SPACY_MODEL": os.environ.get("SPACY_MODEL", "en_core_web_sm"),
+    "ENTITY_BATCH_SIZE": os.environ.get("ENTITY_BATCH_SIZE", 256),
+    "ENTITY_WORKERS": os.environ.get("ENTITY_WORKERS", 2),
+    # Filtered graph adjacencies kept in memory for traversal; 0 traverses in SQLite.
+    "GRAPH_CSR_CACHE_SIZE": os.environ.get("GRAPH_CSR_CACHE_SIZE", "0"),
+    "FULL_TEXT_CACHE_SIZE": os.environ.get("FULL_TEXT_CACHE_SIZE", 67108864),
+    "SQLITE_CACHE_SIZE": os.environ.get("SQLITE_CACHE_SIZE", -65536),
+    "SQLITE_MMAP_SIZE": os.environ.get("SQLITE_MMAP_SIZE", 268435456),
+    "SERVER_HOST": os.environ.get("SERVER_HOST", "127.0.0.1"),
+    "SERVER_PORT": os.environ.get("SERVER_PORT", 8000),
+    "SERVER_WORKERS": os.environ.get("SERVER_WORKERS", 8),
+    # none, or db to append each command's metrics to the METRICS table.
+    "METRICS_EXPORT": os.environ.get("METRICS_EXPORT", "none"),
     "DATA_DIR": Path(get_default_data_dir("rag")),
     "LOG_FILE": str(os.environ.get("LOG_FILENAME", "rag.log")),
     "LOG_LEVEL": str(os.environ.get("LOG_LEVEL", "INFO")),
@@ -80,14 +132,14 @@ def setup_logging(default_level=DEFAULT_CONFIG["LOG_LEVEL"],
     logging_configured = True
 
 
-setup_logging()
 logger = logging.getLogger(__name__)
 
 
 class Config(dict):
     def __init__(self, config_path: Path, **defaults: Any):
+        # Only touches the disk when the file is missing or lacks a default key.
         self.config_path = config_path
-        logger.info(f"Config path: {config_path}")
+        logger.debug(f"Config path: {config_path}")
         if self._exists():
             self._read()
             has_new_config = False
@@ -95,7 +147,7 @@ class Config(dict):
                 if key not in self:
                     has_new_config = True
                     self[key] = value
-                    print("Key: {key} Value:{value}")
+                    logger.debug(f"New config key: {key} Value: {value}")
             if has_new_config:
                 self._write()
         else:
@@ -1,8 +1,15 @@
+import json
 import logging
 import os
+import re
+import shutil
 import sqlite3
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
 from sqlite3 import connect
-from typing import Sequence
+from typing import BinaryIO, List, Optional, Sequence, Tuple
 
 import sqlite_vec
 from sqlite_vec import serialize_float32
@@ -13,16 +20,121 @@ from rag._utils import compute_file_hash
 logger = logging.getLogger(__name__)
 
 
+class DocumentStatus:
+    """Values of DOCUMENT.status, in the order a document moves through them."""
+    PENDING = "PENDING"
+    INGESTING = "INGESTING"
+    INGESTED = "INGESTED"
+    FAILED = "FAILED"
+
+
+# Compact vec0 tables searched before rescoring against DOCUMENT_TEXT_CHUNK_VECTOR.
+QUANTIZED_VECTOR_TABLES = {
+    "int8": "DOCUMENT_TEXT_CHUNK_VECTOR_INT8",
+    "bit": "DOCUMENT_TEXT_CHUNK_VECTOR_BIT",
+}
+
+# SQL turning a float32 vector into the stored form, truncated Matryoshka-style
+# to the first {dimensions} components.
+_QUANTIZERS = {
+    "int8": ("int8", "vec_quantize_int8(vec_normalize(vec_slice({vector}, 0, {dimensions})), 'unit')"),
+    "bit": ("bit", "vec_quantize_binary(vec_slice({vector}, 0, {dimensions}))"),
+}
+
+
+class FullTextCache:
+    """
+    Decompressed document full texts, shared by every connection in the process.
+
+    Bounded by the total number of characters held; the least recently used
+    documents are dropped first. Entries are keyed by the DOCUMENT_FULL_TEXT
+    row, so a rewritten full text is never served from a stale entry.
+    """
+
+    def __init__(self, max_chars: int = int(appConfig.get("FULL_TEXT_CACHE_SIZE"))):
+        self.max_chars = max_chars
+        self.chars = 0
+        self.hits = 0
+        self.misses = 0
+        self._texts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[str]:
+        with self._lock:
+            text = self._texts.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._texts.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text: str):
+        with self._lock:
+            if key in self._texts or len(text) > self.max_chars:
+                return
+            self._texts[key] = text
+            self.chars += len(text)
+            while self.chars > self.max_chars:
+                _, evicted = self._texts.popitem(last=False)
+                self.chars -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._texts.clear()
+            self.chars = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"documents": len(self._texts), "chars": self.chars, "hits": self.hits, "misses": self.misses}
+
+
+full_text_cache = FullTextCache()
+
+
 class RagDb:
-    def __init__(self, db_file: str = appConfig.get("DATABASE_PATH")):
+    def __init__(self, db_file: str = appConfig.get("DATABASE_PATH"),
+                 cache_size: int = int(appConfig.get("SQLITE_CACHE_SIZE")),
+                 mmap_size: int = int(appConfig.get("SQLITE_MMAP_SIZE")),
+                 quantization: str = appConfig.get("VECTOR_QUANTIZATION"),
+                 quantized_dimensions: int = int(appConfig.get("OLLAMA_EMBEDDING_DIMENSIONS")),
+                 rescore_oversample: int = int(appConfig.get("VECTOR_RESCORE_OVERSAMPLE")),
+                 ann_index_path: str = appConfig.get("ANN_INDEX_PATH"),
+                 ann_nprobe: int = int(appConfig.get("ANN_NPROBE"))):
         super().__init__()
         self.db_file = db_file
+        if quantization != "none" and quantization not in QUANTIZED_VECTOR_TABLES:
+            raise ValueError(f"Unknown vector quantization: {quantization}")
+        self.quantization = quantization
+        # Only the width for tables built from now on: an existing table keeps its own, see _load_quantized_table.
+        self.quantized_dimensions = quantized_dimensions
+        self.quantized_table_built = False
+        self._quantized_table_warned = False
+        self.rescore_oversample = rescore_oversample
+        self.ann_index_path = ann_index_path
+        self.ann_index = None
+        # The ANN index is used, and kept up to date, once `rag build-index` has created it.
+        if os.path.isfile(os.path.join(ann_index_path, "meta.json")):
+            from rag._ann import IVFIndex
+
+            self.ann_index = IVFIndex(ann_index_path, ann_nprobe)
         self.cn = connect(self.db_file)
         self.cur = self.cn.cursor()
         self.cn.enable_load_extension(True)
         sqlite_vec.load(self.cn)
         self.cn.enable_load_extension(False)
-        logger.info(f"Sqlite3 version: {sqlite3.sqlite_version} sqlite_vec version: {self.version()}")
+        # DOCUMENT_TEXT_CHUNK_TEXT, the FTS content view, slices chunk text out of the full text with this.
+        self.cn.create_function("rag_chunk_text", 3, self._chunk_text, deterministic=True)
+        # WAL with synchronous=NORMAL only fsyncs at checkpoints, not on every commit.
+        self.cur.execute("PRAGMA journal_mode=WAL")
+        self.cur.execute("PRAGMA synchronous=NORMAL")
+        self.cur.execute("PRAGMA temp_store=MEMORY")
+        self.cur.execute(f"PRAGMA cache_size={int(cache_size)}")
+        self.cur.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self.cur.execute("PRAGMA busy_timeout=30000")
+        if quantization != "none":
+            self._load_quantized_table()
+        logger.debug(f"Sqlite3 version: {sqlite3.sqlite_version} sqlite_vec version: {self.version()}")
 
     def insert_document(self, file_path: str):
         file_hash = compute_file_hash(file_path)
@@ -35,36 +147,301 @@ class RagDb:
         logger.debug(f"Inserted file {file_path} => {row[0]}")
         return row[0]
 
-    def contains_document(self, file_path: str):
-        file_hash = compute_file_hash(file_path)
+    def contains_document(self, file_path: str, file_hash: str = None):
+        file_hash = file_hash or compute_file_hash(file_path)
         self.cur.execute(
-            "SELECT 1 FROM DOCUMENT WHERE file_hash = ? AND status = 'INGESTED'",
-            (file_hash,)
+            "SELECT 1 FROM DOCUMENT WHERE file_hash = ? AND status = ?",
+            (file_hash, DocumentStatus.INGESTED)
         )
         row = self.cur.fetchone()
         result = row is not None
         logger.debug(f"File {file_path} hash {file_hash} exists in the database: {result}")
         return result
 
-    def insert_document_text(self, id: str, data: str):
+    def register_document(self, file_path: str, file_hash: str = None):
+        """
+        Find the unfinished DOCUMENT row for a file's content, or create a PENDING one.
+
+        :return: ``(document_id, pages_done)``; ``pages_done`` is the resume
+            checkpoint, the number of leading pages whose chunks are stored.
+        """
+        file_hash = file_hash or compute_file_hash(file_path)
+        row = self.cur.execute(
+            """SELECT id, pages_done FROM DOCUMENT WHERE file_hash = ? AND status != ?
+            ORDER BY id DESC LIMIT 1""",
+            (file_hash, DocumentStatus.INGESTED),
+        ).fetchone()
+        if row is not None:
+            self.cur.execute("UPDATE DOCUMENT SET file_path = ? WHERE id = ?", (file_path, row[0]))
+            self.cn.commit()
+            logger.info(f"Resuming file {file_path} => {row[0]} after page {row[1]}")
+            return row[0], row[1]
         self.cur.execute(
-            "INSERT INTO DOCUMENT_TEXT_CHUNK(document_id, data, text_length) VALUES (:1,:2,:3) RETURNING id",
-            (id, data, len(data)),
+            "INSERT INTO DOCUMENT(file_path, file_hash, status) VALUES (?,?,?) RETURNING id",
+            (file_path, file_hash, DocumentStatus.PENDING),
         )
-        row = self.cur.fetchone()
+        (document_id,) = self.cur.fetchone()
+        self.cn.commit()
+        logger.debug(f"Registered file {file_path} => {document_id}")
+        return document_id, 0
+
+    def set_document_status(self, document_id: int, status: str):
+        self.cur.execute("UPDATE DOCUMENT SET status = ? WHERE id = ?", (status, document_id))
         self.cn.commit()
-        logger.info(f"Inserted document text (length {len(data)}) for {id} => {row[0]}")
-        return row[0]
 
-    def insert_document_text_fts(self, chunk_id: int, data: str):
+    def complete_document(self, document_id: int):
         self.cur.execute(
-            "INSERT INTO DOCUMENT_TEXT_CHUNK_FTS(chunk_id, data) VALUES (:1,:2,:3) RETURNING id",
-            (chunk_id, data),
+            "UPDATE DOCUMENT SET status = ?, completed = CURRENT_TIMESTAMP WHERE id = ?",
+            (DocumentStatus.INGESTED, document_id),
         )
-        row = self.cur.fetchone()
+        # Answers cached against the previous corpus may now be incomplete.
+        self.increment_meta("corpus_version")
         self.cn.commit()
-        logger.info(f"Inserted document fts text (length {len(data)}) for chunk {chunk_id} => {row[0]}")
-        return row[0]
+        logger.debug(f"Completed document {document_id}")
+
+    def get_meta(self, key: str, default: str = None) -> Optional[str]:
+        row = self.cur.execute("SELECT value FROM RAG_META WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def increment_meta(self, key: str, amount: float = 1):
+        """Add ``amount`` to a numeric RAG_META value; the caller commits."""
+        self.cur.execute(
+            """INSERT INTO RAG_META(key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = value + excluded.value""",
+            (key, amount),
+        )
+
+    def corpus_version(self) -> int:
+        return int(self.get_meta("corpus_version", 0))
+
+    def ingested_hashes(self, file_hashes: Sequence[str]) -> set:
+        """Return the subset of ``file_hashes`` whose documents are fully ingested."""
+        if not file_hashes:
+            return set()
+        rows = self.cur.execute(
+            f"""SELECT DISTINCT file_hash FROM DOCUMENT
+            WHERE status = ? AND file_hash IN ({",".join("?" * len(file_hashes))})""",
+            (DocumentStatus.INGESTED, *file_hashes),
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def get_scan_entries(self, file_paths: Sequence[str]) -> dict:
+        """Return ``{file_path: (file_size, mtime_ns, file_hash)}`` from the scan index."""
+        if not file_paths:
+            return {}
+        rows = self.cur.execute(
+            f"""SELECT file_path, file_size, mtime_ns, file_hash FROM FILE_SCAN
+            WHERE file_path IN ({",".join("?" * len(file_paths))})""",
+            list(file_paths),
+        ).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def upsert_scan_entries(self, entries: Sequence[tuple]):
+        """Record ``(file_path, file_size, mtime_ns, file_hash)`` rows in the scan index."""
+        with self.cn:
+            self.cur.executemany(
+                """INSERT INTO FILE_SCAN(file_path, file_size, mtime_ns, file_hash) VALUES (?,?,?,?)
+                ON CONFLICT(file_path) DO UPDATE SET file_size = excluded.file_size,
+                    mtime_ns = excluded.mtime_ns, file_hash = excluded.file_hash,
+                    scanned = CURRENT_TIMESTAMP""",
+                entries,
+            )
+
+    def insert_document_full_text(self, document_id: int, stream: BinaryIO,
+                                  block_size: int = 1 << 20) -> int:
+        """
+        Copy a document's UTF-8 full text from a binary stream into DOCUMENT_FULL_TEXT.
+
+        The text is zlib-compressed a block at a time into a spooled temporary
+        file, then copied into a ``zeroblob`` row through incremental blob
+        I/O, so memory use stays around ``block_size`` regardless of the text
+        size. Chunks address this text by character offsets. Any earlier full
+        text of the document, left by an interrupted run, is replaced.
+        """
+        stream.seek(0)
+        size = 0
+        compressor = zlib.compressobj()
+        with tempfile.SpooledTemporaryFile(max_size=8 * block_size) as compressed:
+            while block := stream.read(block_size):
+                size += len(block)
+                compressed.write(compressor.compress(block))
+            compressed.write(compressor.flush())
+            compressed_size = compressed.tell()
+            compressed.seek(0)
+            with self.cn:
+                self.cur.execute("DELETE FROM DOCUMENT_FULL_TEXT WHERE document_id = ?", (document_id,))
+                self.cur.execute(
+                    """INSERT INTO DOCUMENT_FULL_TEXT(document_id, compression, size, data)
+                    VALUES (?, 'zlib', ?, zeroblob(?)) RETURNING id""",
+                    (document_id, size, compressed_size),
+                )
+                (row_id,) = self.cur.fetchone()
+                with self.cn.blobopen("DOCUMENT_FULL_TEXT", "data", row_id) as blob:
+                    while block := compressed.read(block_size):
+                        blob.write(block)
+        logger.debug(f"Inserted full text ({size} bytes, {compressed_size} compressed) "
+                     f"for document {document_id} => {row_id}")
+        return row_id
+
+    def get_document_text(self, document_id: int) -> Optional[str]:
+        """Return a document's decompressed full text, through the process-wide cache."""
+        # Its own cursor: this also runs inside rag_chunk_text, during a query on self.cur.
+        row = self.cn.execute(
+            "SELECT id FROM DOCUMENT_FULL_TEXT WHERE document_id = ? ORDER BY id DESC LIMIT 1",
+            (document_id,),
+        ).fetchone()
+        return self._full_texts({document_id: row[0]}).get(document_id) if row else None
+
+    def _full_texts(self, rows: dict) -> dict:
+        """Map ``{document_id: full_text_row_id}`` to ``{document_id: text}``, decompressing misses."""
+        texts, missing = {}, {}
+        for document_id, row_id in rows.items():
+            text = full_text_cache.get((self.db_file, row_id))
+            if text is None:
+                missing[row_id] = document_id
+            else:
+                texts[document_id] = text
+        if missing:
+            for row_id, data in self.cn.execute(
+                    f"SELECT id, data FROM DOCUMENT_FULL_TEXT WHERE id IN ({','.join('?' * len(missing))})",
+                    list(missing),
+            ).fetchall():
+                text = texts[missing[row_id]] = zlib.decompress(data).decode("utf-8")
+                full_text_cache.put((self.db_file, row_id), text)
+        return texts
+
+    def _chunk_text(self, document_id: int, start: int, end: int) -> Optional[str]:
+        text = self.get_document_text(document_id)
+        return text[start:end] if text is not None else None
+
+    @staticmethod
+    def chunk_spans(chunks, offset: int = 0) -> List[Tuple[int, int, int]]:
+        """
+        ``(start, end, token_count)`` of splitter chunks, in full text coordinates.
+
+        :param chunks: chonkie chunks of one page.
+        :param offset: the character offset of that page in the document's full text.
+        """
+        return [(offset + chunk.start_index, offset + chunk.end_index, chunk.token_count) for chunk in chunks]
+
+    def insert_document_chunks(self, document_id: int, texts: Sequence[str],
+                               embeddings: Sequence[Optional[Sequence[float]]],
+                               spans: Sequence[Tuple[int, int, Optional[int]]],
+                               pages_done: Optional[int] = None,
+                               chunk_ids: Optional[Sequence[int]] = None,
+                               signatures: Optional[Sequence[Optional[int]]] = None,
+                               duplicate_of: Optional[Sequence[Optional[int]]] = None,
+                               index_duplicates: bool = True) -> List[int]:
+        """
+        Write a batch of chunks with their FTS rows and vectors in one transaction.
+
+        A chunk row stores only its ``(start, end, token_count)`` span of the
+        document's full text; ``texts`` are indexed into the external-content
+        FTS table and are not stored again. Chunk ids are reserved up front
+        under an immediate write lock, so the chunk, FTS and vector rows can
+        all be written with ``executemany``. A ``None`` embedding stores the
+        chunk without a vector. ``pages_done`` advances the document's resume
+        checkpoint in the same transaction, so the checkpoint never runs ahead
+        of, or behind, the stored chunks.
+
+        Near-duplicate detection passes the ``chunk_ids`` it reserved with
+        ``reserve_chunk_ids``, each chunk's SimHash ``signatures`` and the
+        chunk each one duplicates (``duplicate_of``). Duplicates get no vector
+        of their own, and with ``index_duplicates=False`` no FTS row either.
+
+        :return: the new chunk ids, aligned with ``texts``.
+        """
+        signatures = signatures or [None] * len(texts)
+        duplicate_of = duplicate_of or [None] * len(texts)
+        if not texts:
+            if pages_done is not None:
+                self.cur.execute("UPDATE DOCUMENT SET pages_done = ? WHERE id = ?", (pages_done, document_id))
+                self.cn.commit()
+            return []
+        with self.cn:
+            self.cur.execute("BEGIN IMMEDIATE")
+            if chunk_ids is None:
+                last_id = self._last_chunk_id()
+                chunk_ids = list(range(last_id + 1, last_id + 1 + len(texts)))
+            self.cur.executemany(
+                """INSERT INTO DOCUMENT_TEXT_CHUNK(id, document_id, start_offset, end_offset, token_count,
+                    simhash, duplicate_of)
+                VALUES (?,?,?,?,?,?,?)""",
+                [(chunk_id, document_id, *span, signature, duplicate)
+                 for chunk_id, span, signature, duplicate in zip(chunk_ids, spans, signatures, duplicate_of)],
+            )
+            self.cur.executemany(
+                "INSERT INTO DOCUMENT_TEXT_CHUNK_FTS(rowid, data) VALUES (?,?)",
+                [(chunk_id, text) for chunk_id, text, duplicate in zip(chunk_ids, texts, duplicate_of)
+                 if index_duplicates or duplicate is None],
+            )
+            self.cur.executemany(
+                "INSERT INTO DOCUMENT_TEXT_CHUNK_VECTOR(rowid, embedding) VALUES (?,?)",
+                [(chunk_id, serialize_float32(list(embedding)))
+                 for chunk_id, embedding in zip(chunk_ids, embeddings) if embedding is not None],
+            )
+            if self.quantization != "none":
+                if self._load_quantized_table():
+                    self.cur.executemany(
+                        self._quantized_insert_sql(self.quantization, self.quantized_dimensions),
+                        [(chunk_id, serialize_float32(list(embedding)))
+                         for chunk_id, embedding in zip(chunk_ids, embeddings) if embedding is not None],
+                    )
+                elif not self._quantized_table_warned:
+                    self._quantized_table_warned = True
+                    logger.warning(f"{QUANTIZED_VECTOR_TABLES[self.quantization]} has not been built, "
+                                   f"new vectors are only stored in full precision; run `rag quantize`")
+            if pages_done is not None:
+                self.cur.execute("UPDATE DOCUMENT SET pages_done = ? WHERE id = ?", (pages_done, document_id))
+            if self.ann_index is not None:
+                vectors = [(chunk_id, embedding) for chunk_id, embedding in zip(chunk_ids, embeddings)
+                           if embedding is not None]
+                ann_ids = self._reserve_ann_ids([chunk_id for chunk_id, _ in vectors])
+        if self.ann_index is not None and vectors:
+            # Appended after the commit: a crash in between only leaves the chunks
+            # out of ANN results until the next build-index.
+            self.ann_index.add(ann_ids, [embedding for _, embedding in vectors])
+        logger.debug(f"Inserted {len(chunk_ids)} chunks for document {document_id}")
+        return chunk_ids
+
+    def _last_chunk_id(self) -> int:
+        # Reserved ids live in sqlite_sequence before their rows are written.
+        (last_id,) = self.cur.execute(
+            """SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'DOCUMENT_TEXT_CHUNK'), 0),
+                          COALESCE((SELECT MAX(id) FROM DOCUMENT_TEXT_CHUNK), 0))"""
+        ).fetchone()
+        return last_id
+
+    def reserve_chunk_ids(self, count: int) -> List[int]:
+        """
+        Allocate ``count`` chunk ids ahead of ``insert_document_chunks``.
+
+        The ids are taken by advancing the AUTOINCREMENT sequence, so no other
+        writer can be given them, even before their rows exist.
+        """
+        with self.cn:
+            self.cur.execute("BEGIN IMMEDIATE")
+            last_id = self._last_chunk_id()
+            self.cur.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'DOCUMENT_TEXT_CHUNK'",
+                             (last_id + count,))
+            if not self.cur.rowcount:
+                self.cur.execute("INSERT INTO sqlite_sequence(name, seq) VALUES ('DOCUMENT_TEXT_CHUNK', ?)",
+                                 (last_id + count,))
+        return list(range(last_id + 1, last_id + 1 + count))
+
+    def chunk_signatures(self):
+        """Yield ``(chunk_id, simhash)`` of every stored chunk that is not itself a duplicate."""
+        yield from self.cn.execute(
+            "SELECT id, simhash FROM DOCUMENT_TEXT_CHUNK WHERE simhash IS NOT NULL AND duplicate_of IS NULL"
+        )
+
+    def _reserve_ann_ids(self, chunk_ids: Sequence[int]) -> List[int]:
+        # Runs inside the caller's write transaction, like the chunk id reservation.
+        (last_id,) = self.cur.execute("SELECT COALESCE(MAX(ann_id), 0) FROM ANN_INDEX_MAP").fetchone()
+        ann_ids = list(range(last_id + 1, last_id + 1 + len(chunk_ids)))
+        self.cur.executemany("INSERT INTO ANN_INDEX_MAP(ann_id, chunk_id) VALUES (?,?)",
+                             list(zip(ann_ids, chunk_ids)))
+        return ann_ids
 
     def insert_embedding(self, id: str, embedding: str):
         self.cur.execute(
@@ -73,26 +450,205 @@ class RagDb:
         )
         row = self.cur.fetchone()
         self.cn.commit()
-        logger.info(f"Inserted embedding for {id} => {row[0]}")
+        logger.debug(f"Inserted embedding for {id} => {row[0]}")
         return row[0]
 
-    def search_embeddings(self, query: str, limit: int = 10):
+    def search_embeddings(self, embedding: Sequence[float], limit: int = 10):
+        if self.ann_index is not None:
+            return self.search_embeddings_ann(embedding, limit)
+        if self.quantization != "none" and self.quantized_table_built:
+            return self.search_embeddings_quantized(embedding, limit)
+        return self.search_embeddings_exact(embedding, limit)
+
+    def search_embeddings_exact(self, embedding: Sequence[float], limit: int = 10):
+        self.cur.execute(
+            """SELECT rowid, distance FROM DOCUMENT_TEXT_CHUNK_VECTOR
+            WHERE embedding MATCH ? AND k = ? ORDER BY distance""",
+            (serialize_float32(list(embedding)), limit),
+        )
+        rows = self.cur.fetchall()
+        logger.debug(f"Found {len(rows)} nearest embeddings")
+        return rows
+
+    def search_embeddings_quantized(self, embedding: Sequence[float], limit: int = 10,
+                                    quantization: str = None, dimensions: int = None,
+                                    oversample: int = None, table: str = None):
+        """
+        Two-pass KNN: a coarse search over the compact quantized vectors, then
+        the ``limit * oversample`` candidates are rescored by L2 distance to the
+        full-precision vectors.
+
+        :return: ``[(rowid, distance), ...]`` nearest first, like ``search_embeddings_exact``.
+        """
+        quantization = quantization or self.quantization
+        dimensions = dimensions or self.quantized_dimensions
+        oversample = oversample or self.rescore_oversample
+        table = table or QUANTIZED_VECTOR_TABLES[quantization]
+        query = serialize_float32(list(embedding))
+        quantized = _QUANTIZERS[quantization][1].format(vector="?", dimensions=int(dimensions))
+        candidates = self.cur.execute(
+            f"SELECT rowid FROM {table} WHERE embedding MATCH {quantized} AND k = ?",
+            (query, limit * oversample),
+        ).fetchall()
+        # A join on json_each does one rowid lookup per candidate; rowid IN (...) scans vec0.
+        rows = self.cur.execute(
+            """SELECT v.rowid, vec_distance_l2(v.embedding, ?) AS distance
+            FROM json_each(?) c JOIN DOCUMENT_TEXT_CHUNK_VECTOR v ON v.rowid = c.value
+            ORDER BY distance LIMIT ?""",
+            (query, json.dumps([rowid for (rowid,) in candidates]), limit),
+        ).fetchall()
+        logger.debug(f"Rescored {len(candidates)} {quantization} candidates to {len(rows)} nearest embeddings")
+        return rows
+
+    def search_embeddings_ann(self, embedding: Sequence[float], limit: int = 10, nprobe: int = None):
+        """
+        KNN through the memory-mapped IVF index, mapped back to chunk ids.
+
+        :return: ``[(rowid, distance), ...]`` nearest first, like ``search_embeddings_exact``.
+        """
+        matches = self.ann_index.search(embedding, limit, nprobe)
+        chunk_ids = dict(self.cur.execute(
+            "SELECT m.ann_id, m.chunk_id FROM json_each(?) c JOIN ANN_INDEX_MAP m ON m.ann_id = c.value",
+            (json.dumps([ann_id for ann_id, _ in matches]),),
+        ).fetchall())
+        rows = [(chunk_ids[ann_id], distance) for ann_id, distance in matches if ann_id in chunk_ids]
+        logger.debug(f"Found {len(rows)} nearest embeddings in the ANN index")
+        return rows
+
+    def build_ann_index(self, path: str = None, nlist: int = None):
+        """
+        (Re)build the IVF index from DOCUMENT_TEXT_CHUNK_VECTOR.
+
+        Chunks without an ANN id get one first; existing ids are kept, so the
+        mapping stays valid for readers still using the previous index version.
+        """
+        from rag._ann import IVFIndex
+
+        path = path or self.ann_index_path
+        with self.cn:
+            self.cur.execute(
+                """INSERT INTO ANN_INDEX_MAP(chunk_id) SELECT v.rowid FROM DOCUMENT_TEXT_CHUNK_VECTOR v
+                WHERE NOT EXISTS (SELECT 1 FROM ANN_INDEX_MAP m WHERE m.chunk_id = v.rowid)"""
+            )
+        (count,) = self.cur.execute("SELECT COUNT(*) FROM ANN_INDEX_MAP").fetchone()
+        sample = self.cur.execute("SELECT embedding FROM DOCUMENT_TEXT_CHUNK_VECTOR LIMIT 1").fetchone()
+        if sample is None:
+            raise ValueError("There are no vectors to index")
+        rows = self.cn.execute(
+            """SELECT m.ann_id, v.embedding FROM ANN_INDEX_MAP m
+            JOIN DOCUMENT_TEXT_CHUNK_VECTOR v ON v.rowid = m.chunk_id"""
+        )
+        self.ann_index = self.ann_index or IVFIndex(path)
+        return self.ann_index.build(rows, count, len(sample[0]) // 4, nlist)
+
+    @staticmethod
+    def remove_ann_index(path: str = appConfig.get("ANN_INDEX_PATH")):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+            logger.debug(f"Removed the ANN index: {os.path.abspath(path)}.")
+
+    def quantized_table_dimensions(self, quantization: str) -> Optional[int]:
+        """:return: the width of the stored ``quantization`` vectors, or None if the table does not exist."""
+        row = self.cur.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (QUANTIZED_VECTOR_TABLES[quantization],),
+        ).fetchone()
+        match = row and re.search(r"embedding\s+\w+\[(\d+)\]", row[0])
+        return int(match.group(1)) if match else None
+
+    def _load_quantized_table(self) -> bool:
+        # The table may have been built narrower than configured (`rag quantize --dimensions`),
+        # or not at all when quantization was turned on for an existing database.
+        dimensions = self.quantized_table_dimensions(self.quantization)
+        if dimensions is not None:
+            self.quantized_dimensions = dimensions
+        self.quantized_table_built = dimensions is not None
+        return self.quantized_table_built
+
+    @staticmethod
+    def _quantized_insert_sql(quantization: str, dimensions: int, table: str = None) -> str:
+        table = table or QUANTIZED_VECTOR_TABLES[quantization]
+        quantized = _QUANTIZERS[quantization][1].format(vector="?", dimensions=int(dimensions))
+        return f"INSERT INTO {table}(rowid, embedding) VALUES (?, {quantized})"
+
+    def build_quantized_table(self, quantization: str = None, dimensions: int = None, table: str = None):
+        """
+        (Re)create a quantized vector table and fill it from DOCUMENT_TEXT_CHUNK_VECTOR.
+
+        ``dimensions`` below the model's size keeps only the leading components
+        (Matryoshka truncation); bit quantization needs a multiple of 8.
+        """
+        quantization = quantization or self.quantization
+        dimensions = int(dimensions or self.quantized_dimensions)
+        if quantization not in QUANTIZED_VECTOR_TABLES:
+            raise ValueError(f"Unknown vector quantization: {quantization}")
+        if quantization == "bit" and dimensions % 8:
+            raise ValueError("Bit quantization needs dimensions that are a multiple of 8")
+        table = table or QUANTIZED_VECTOR_TABLES[quantization]
+        element_type, quantizer = _QUANTIZERS[quantization]
+        quantized = quantizer.format(vector="embedding", dimensions=dimensions)
+        with self.cn:
+            self.cur.execute(f"DROP TABLE IF EXISTS {table}")
+            self.cur.execute(
+                f"CREATE VIRTUAL TABLE {table} USING vec0(rowid INTEGER PRIMARY KEY, embedding {element_type}[{dimensions}])"
+            )
+            self.cur.execute(
+                f"INSERT INTO {table}(rowid, embedding) SELECT rowid, {quantized} FROM DOCUMENT_TEXT_CHUNK_VECTOR"
+            )
+        if quantization == self.quantization and table == QUANTIZED_VECTOR_TABLES[quantization]:
+            self._load_quantized_table()
+        logger.info(f"Built {table} with {quantization}[{dimensions}] vectors")
+
+    def search_fts(self, query: str, limit: int = 10):
+        """BM25 search over chunk text; returns ``[(chunk_id,), ...]`` best first."""
+        match = self.fts_query(query)
+        if not match:
+            return []
         self.cur.execute(
-            """SELECT rowid, distance FROM DOCUMENT_TEXT_CHUNK_VECTOR 
-            WHERE embedding MATCH ? ORDER BY distance LIMIT ?""",
-            ([serialize_f32(query)], limit),
+            """SELECT rowid FROM DOCUMENT_TEXT_CHUNK_FTS
+            WHERE DOCUMENT_TEXT_CHUNK_FTS MATCH ? ORDER BY rank LIMIT ?""",
+            (match, limit),
         )
         rows = self.cur.fetchall()
-        logger.info(f"Found embeddings for {query} => {len(rows)} rows")
+        logger.debug(f"Found {len(rows)} full text matches")
         return rows
 
+    @staticmethod
+    def fts_query(query: str) -> str:
+        """Turn free text into an FTS5 query that ORs its quoted terms."""
+        return " OR ".join(f'"{term}"' for term in re.findall(r"\w+", query))
+
+    def get_chunks(self, chunk_ids: Sequence[int]) -> dict:
+        """
+        Fetch chunk text and source file for ``chunk_ids``, keyed by id.
+
+        The text is sliced out of each document's full text, which is
+        decompressed once per document and kept in ``full_text_cache``.
+        Chunks whose document has no full text yet (still being ingested)
+        are left out.
+        """
+        if not chunk_ids:
+            return {}
+        rows = self.cur.execute(
+            f"""SELECT c.id, c.document_id, d.file_path, c.start_offset, c.end_offset, f.id
+            FROM DOCUMENT_TEXT_CHUNK c JOIN DOCUMENT d ON d.id = c.document_id
+            JOIN DOCUMENT_FULL_TEXT f ON f.document_id = c.document_id
+            WHERE c.id IN ({",".join("?" * len(chunk_ids))})""",
+            list(chunk_ids),
+        ).fetchall()
+        texts = self._full_texts({row[1]: row[5] for row in rows})
+        return {row[0]: {"chunk_id": row[0], "document_id": row[1], "file_path": row[2],
+                         "text": texts[row[1]][row[3]:row[4]]}
+                for row in rows if row[1] in texts}
+
     def insert_chat_response(self, response: dict):
         sql = """
             INSERT INTO CHAT_RESPONSE (
                 model, message_role, message_content, done_reason,
                 done, total_duration, load_duration, prompt_eval_count,
-                prompt_eval_duration, eval_count, eval_duration
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                prompt_eval_duration, eval_count, eval_duration,
+                time_to_first_token, tokens_per_second
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
         data = (
             response["model"],
@@ -106,14 +662,19 @@ class RagDb:
             response["prompt_eval_duration"],
             response["eval_count"],
             response["eval_duration"],
+            # Only measured for streamed answers.
+            response.get("time_to_first_token"),
+            response.get("tokens_per_second"),
         )
         try:
             self.cur.execute(sql, data)
             self.cn.commit()
-            logger.debug("Video data inserted successfully.")
+            logger.debug(f"Inserted chat response {self.cur.lastrowid}")
+            return self.cur.lastrowid
         except sqlite3.Error as e:
             logger.debug(f"An error occurred: {e}")
             self.cn.rollback()
+            return None
 
     @staticmethod
     def init_db(
@@ -128,20 +689,26 @@ class RagDb:
         rag_db = RagDb(db)
         with open(schema_path, "r") as f:
             schema_sql = f.read()
-            logger.info(schema_sql)
+            logger.debug(schema_sql)
             rag_db.cur.executescript(schema_sql)
         rag_db.cn.commit()
+        # The schema was recreated, so the ANN ids the index refers to are gone,
+        # and full text row ids will be reused.
+        RagDb.remove_ann_index(rag_db.ann_index_path)
+        full_text_cache.clear()
+        if rag_db.quantization != "none":
+            rag_db.build_quantized_table()
         rag_db.cn.close()
         logger.info("Initialized the database")
 
     def insert_document_embedding(self, chunk_id: int, embedding: Sequence[float]):
-        logger.info(f"Inserting embedding for {chunk_id}")
+        logger.debug(f"Inserting embedding for {chunk_id}")
         self.cur.execute(
             "INSERT INTO DOCUMENT_TEXT_CHUNK_VECTOR(rowid, embedding) VALUES (:1,:2)",
             (chunk_id, serialize_float32(list(embedding))),
         )
         self.cn.commit()
-        logger.info(f"Inserted document embedding for {chunk_id}")
+        logger.debug(f"Inserted document embedding for {chunk_id}")
 
     @staticmethod
     def is_sqlite3_db(filename):
@@ -164,11 +731,16 @@ class RagDb:
 
     @staticmethod
     def remove_file(db):
+        full_text_cache.clear()
         if os.path.isfile(db):
             os.remove(db)
             logger.debug(f"Dropped the database:{os.path.abspath(db)}.")
         else:
             logger.debug(f"Database {os.path.abspath(db)} not found.")
+        # WAL mode leaves these next to the database file.
+        for suffix in ("-wal", "-shm"):
+            if os.path.isfile(db + suffix):
+                os.remove(db + suffix)
 
     def version(self):
         (vec_version,) = self.cur.execute("select vec_version()").fetchone()
@@ -192,7 +764,22 @@ class RagDb:
 
 
 class GraphDB:
-    def __init__(self, db_path='data/graph_database.sqlite'):
+    """
+    Property graph of nodes and weighted, typed edges in SQLite.
+
+    Writes are batched: ``upsert_nodes`` and ``upsert_edges`` take any number
+    of rows and write them with ``executemany`` in one transaction. Traversal
+    (``neighbourhood``) runs as a recursive CTE over the source and target
+    indexes. With ``csr_cache_size`` > 0 the adjacency of the most recently
+    traversed subgraphs (the edges passing a relationship and weight filter)
+    is also kept in memory as a ``CSRGraph``, which serves repeated
+    traversals without touching SQLite. Cached adjacency is dropped on every
+    write through this connection, and when ``PRAGMA data_version`` shows
+    another connection has committed.
+    """
+
+    def __init__(self, db_path='data/graph_database.sqlite',
+                 csr_cache_size: int = int(appConfig.get("GRAPH_CSR_CACHE_SIZE"))):
         if not db_path:
             raise ValueError(
                 "Database path must be provided to initialize the DatabaseConnection.")
@@ -200,7 +787,11 @@ class GraphDB:
         self.conn = sqlite3.connect(self.db_path)
         # Use WAL mode for better performance
         self.conn.execute('PRAGMA journal_mode=WAL;')
+        self.conn.execute("PRAGMA synchronous=NORMAL")
         self.initialize_schema()
+        self.csr_cache_size = csr_cache_size
+        self._csr = OrderedDict()
+        self._data_version = None
 
     def initialize_schema(self):
         with self.conn:
@@ -241,3 +832,142 @@ class GraphDB:
         with self.conn:
             self.conn.execute("DELETE FROM edges")
             self.conn.execute("DELETE FROM nodes")
+        self._csr.clear()
+
+    def upsert_nodes(self, nodes) -> int:
+        """
+        Insert or update nodes in one transaction.
+
+        :param nodes: ``(id, properties)`` pairs; ``properties`` is a dict or
+            None. The properties of an existing node are merged with the new
+            ones (JSON merge patch), not replaced.
+        :return: the number of rows written.
+        """
+        with self.conn:
+            cursor = self.conn.executemany(
+                """INSERT INTO nodes(id, properties) VALUES (?, ?)
+                ON CONFLICT(id) DO UPDATE SET properties = CASE
+                    WHEN nodes.properties IS NULL THEN excluded.properties
+                    WHEN excluded.properties IS NULL THEN nodes.properties
+                    ELSE json_patch(nodes.properties, excluded.properties) END""",
+                ((node_id, json.dumps(properties) if properties is not None else None)
+                 for node_id, properties in nodes),
+            )
+        self._csr.clear()
+        logger.debug(f"Upserted {cursor.rowcount} nodes")
+        return cursor.rowcount
+
+    def upsert_edges(self, edges, accumulate: bool = False, create_nodes: bool = True) -> int:
+        """
+        Insert or update edges in one transaction.
+
+        :param edges: ``(source, target, relationship, weight)`` rows.
+        :param accumulate: add the weight to an existing edge's weight, e.g. to
+            count co-occurrences, instead of replacing it.
+        :param create_nodes: also insert any endpoint not yet in ``nodes``,
+            without properties.
+        :return: the number of edge rows written.
+        """
+        weight = "COALESCE(edges.weight, 0) + excluded.weight" if accumulate else "excluded.weight"
+        with self.conn:
+            if create_nodes:
+                self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS edge_batch(source, target, relationship, weight)")
+                self.conn.execute("DELETE FROM temp.edge_batch")
+                cursor = self.conn.executemany("INSERT INTO temp.edge_batch VALUES (?, ?, ?, ?)", edges)
+                self.conn.execute(
+                    """INSERT OR IGNORE INTO nodes(id)
+                    SELECT source FROM temp.edge_batch UNION SELECT target FROM temp.edge_batch"""
+                )
+                self.conn.execute(
+                    f"""INSERT INTO edges(source, target, relationship, weight)
+                    SELECT source, target, relationship, weight FROM temp.edge_batch WHERE true
+                    ON CONFLICT(source, target, relationship) DO UPDATE SET weight = {weight}"""
+                )
+                self.conn.execute("DELETE FROM temp.edge_batch")
+            else:
+                cursor = self.conn.executemany(
+                    f"""INSERT INTO edges(source, target, relationship, weight) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(source, target, relationship) DO UPDATE SET weight = {weight}""",
+                    edges,
+                )
+        self._csr.clear()
+        logger.debug(f"Upserted {cursor.rowcount} edges")
+        return cursor.rowcount
+
+    def neighbourhood(self, seeds: Sequence[str], hops: int = 2, min_weight: Optional[float] = None,
+                      relationships: Optional[Sequence[str]] = None, directed: bool = False) -> dict:
+        """
+        Expand ``seeds`` to every node within ``hops`` edges.
+
+        :param min_weight: only follow edges at least this heavy; an edge
+            without a weight counts as 1.
+        :param relationships: only follow edges of these types.
+        :param directed: follow edges from source to target only, instead of
+            both ways.
+        :return: ``{node_id: distance in hops}``, the seeds included at 0.
+        """
+        if self.csr_cache_size > 0:
+            graph = self.csr(min_weight, relationships, directed)
+            return graph.neighbourhood(seeds, hops)
+        filters, parameters = self._edge_filter(min_weight, relationships)
+        steps = [f"""SELECT edges.target, walk.depth + 1 FROM walk JOIN edges ON edges.source = walk.node
+            WHERE walk.depth < :hops{filters}"""]
+        if not directed:
+            steps.append(f"""SELECT edges.source, walk.depth + 1 FROM walk JOIN edges ON edges.target = walk.node
+            WHERE walk.depth < :hops{filters}""")
+        rows = self.conn.execute(
+            f"""WITH RECURSIVE walk(node, depth) AS (
+                SELECT value, 0 FROM json_each(:seeds)
+                UNION {" UNION ".join(steps)}
+            )
+            SELECT node, MIN(depth) FROM walk GROUP BY node""",
+            {"seeds": json.dumps(list(seeds)), "hops": hops, **parameters},
+        )
+        return dict(rows)
+
+    @staticmethod
+    def _edge_filter(min_weight: Optional[float], relationships: Optional[Sequence[str]]):
+        filters, parameters = "", {}
+        if min_weight is not None:
+            filters += " AND COALESCE(edges.weight, 1.0) >= :min_weight"
+            parameters["min_weight"] = min_weight
+        if relationships is not None:
+            filters += " AND edges.relationship IN (SELECT value FROM json_each(:relationships))"
+            parameters["relationships"] = json.dumps(list(relationships))
+        return filters, parameters
+
+    def csr(self, min_weight: Optional[float] = None, relationships: Optional[Sequence[str]] = None,
+            directed: bool = False):
+        """
+        The in-memory adjacency of the edges passing the filter, built on first use.
+
+        Up to ``csr_cache_size`` filtered subgraphs are kept, least recently
+        used first out.
+        """
+        from rag._graph import CSRGraph
+
+        (data_version,) = self.conn.execute("PRAGMA data_version").fetchone()
+        if data_version != self._data_version:
+            # Another connection has written to the graph since the cache was filled.
+            self._csr.clear()
+            self._data_version = data_version
+        key = (min_weight, tuple(sorted(relationships)) if relationships is not None else None, directed)
+        graph = self._csr.get(key)
+        if graph is None:
+            filters, parameters = self._edge_filter(min_weight, relationships)
+            rows = self.conn.execute(f"SELECT source, target, weight FROM edges WHERE true{filters}", parameters)
+            graph = self._csr[key] = CSRGraph.from_edges(rows, symmetric=not directed)
+            logger.debug(f"Cached adjacency of {graph.edge_count} edges ({graph.nbytes} bytes) for {key}")
+            while len(self._csr) > self.csr_cache_size:
+                self._csr.popitem(last=False)
+        self._csr.move_to_end(key)
+        return graph
+
+    def edges_between(self, node_ids: Sequence[str]) -> List[Tuple[str, str, str, float]]:
+        """The ``(source, target, relationship, weight)`` edges with both ends in ``node_ids``."""
+        return self.conn.execute(
+            """WITH members(id) AS (SELECT value FROM json_each(?))
+            SELECT source, target, relationship, weight FROM edges
+            WHERE source IN (SELECT id FROM members) AND target IN (SELECT id FROM members)""",
+            (json.dumps(list(node_ids)),),
+        ).fetchall()
@@ -0,0 +1,183 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the latency histogram buckets (Prometheus style, plus +Inf).
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stage durations are recorded in this histogram, labelled by stage.
+STAGE_SECONDS = "rag_stage_seconds"
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class _Histogram:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)
+        self.count = 0
+        self.sum = 0.0
+
+
+class Metrics:
+    """
+    In-process counters, gauges and histograms, cheap enough for the ingest hot path.
+
+    Recording takes a lock and a few additions; nothing is formatted or
+    written until ``snapshot``, ``prometheus`` or ``export`` is called. Metric
+    names follow Prometheus conventions (``_total`` for counters, ``_seconds``
+    for durations) and take keyword labels.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[_Key, float] = {}
+        self._gauges: Dict[_Key, float] = {}
+        self._histograms: Dict[_Key, _Histogram] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> _Key:
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        """Set a gauge, a value such as a queue depth that goes up and down."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.buckets))
+            histogram.counts[bucket] += 1
+            histogram.count += 1
+            histogram.sum += value
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        """Time the enclosed block into ``rag_stage_seconds{stage=...}``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(STAGE_SECONDS, time.perf_counter() - start, stage=stage, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict:
+        """
+        :return: ``{"counters": [...], "gauges": [...], "histograms": [...]}``; each histogram
+            carries count, sum, mean and approximate p50/p90/p99 from its buckets.
+        """
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            gauges = [{"name": name, "labels": dict(labels), "value": value}
+                      for (name, labels), value in sorted(self._gauges.items())]
+            histograms = []
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                histograms.append({
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+                    "p50": self._quantile(histogram, 0.50),
+                    "p90": self._quantile(histogram, 0.90),
+                    "p99": self._quantile(histogram, 0.99),
+                })
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def _quantile(self, histogram: _Histogram, fraction: float) -> float:
+        # Upper bound of the bucket holding the quantile; the last bucket reports the mean.
+        rank, seen = fraction * histogram.count, 0
+        for index, count in enumerate(histogram.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else histogram.sum / histogram.count
+        return 0.0
+
+    def stage_summary(self) -> Dict[str, dict]:
+        """Per-stage count, total and mean seconds, for printing after a run."""
+        return {histogram["labels"].get("stage"): {key: histogram[key] for key in ("count", "sum", "mean", "p90")}
+                for histogram in self.snapshot()["histograms"] if histogram["name"] == STAGE_SECONDS}
+
+    def prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+
+        def labels_text(labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+            return "{" + ",".join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + "}"
+
+        lines, typed = [], set()
+        with self._lock:
+            for kind, values in (("counter", self._counters), ("gauge", self._gauges)):
+                for (name, labels), value in sorted(values.items()):
+                    if name not in typed:
+                        typed.add(name)
+                        lines.append(f"# TYPE {name} {kind}")
+                    lines.append(f"{name}{labels_text(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{labels_text(labels, (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{labels_text(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{labels_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, rag_db, run: str = None):
+        """Append the current values to the METRICS table, tagged with ``run``."""
+        snapshot = self.snapshot()
+        run = run or time.strftime("%Y-%m-%dT%H:%M:%S")
+        rows = [(run, counter["name"], json.dumps(counter["labels"]), "counter", None, counter["value"],
+                 None, None, None) for counter in snapshot["counters"]]
+        rows += [(run, gauge["name"], json.dumps(gauge["labels"]), "gauge", None, gauge["value"],
+                  None, None, None) for gauge in snapshot["gauges"]]
+        rows += [(run, histogram["name"], json.dumps(histogram["labels"]), "histogram", histogram["count"],
+                  histogram["sum"], histogram["p50"], histogram["p90"], histogram["p99"])
+                 for histogram in snapshot["histograms"]]
+        rag_db.cur.executemany(
+            """INSERT INTO METRICS(run, name, labels, kind, count, value, p50, p90, p99)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows,
+        )
+        rag_db.cn.commit()
+        logger.debug(f"Exported {len(rows)} metrics for run {run}")
+
+
+# The process-wide registry every module records into.
+metrics = Metrics()
+
+
+def timed_call(fn, item):
+    """Run ``fn(item)`` and also return its duration; picklable, for process pools."""
+    start = time.perf_counter()
+    result = fn(item)
+    return result, time.perf_counter() - start
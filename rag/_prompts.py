@@ -17,3 +17,14 @@ GRADER_PROMPT = """<|begin_of_text|><|start_header_id|>system<|end_header_id|> Y
     Here is the retrieved document: \n\n {document} \n\n
     Here is the user question: {question} \n <|eot_id|><|start_header_id|>assistant<|end_header_id|>
     """
+
+RAG_ANSWER_PROMPT = """Answer the question using only the numbered context passages below.
+    Cite the passages you used by their numbers, like [1] or [2][3].
+    If the context does not contain the answer, say that you do not know.
+
+    Context:
+    {context}
+
+    Question: {question}
+
+    Answer:"""
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from rag._config import appConfig
+from rag._metrics import metrics
+from rag.service._answer import AnswerService
+from rag.service._pool import RagDbPool
+from rag.service._search import SearchService
+
+logger = logging.getLogger(__name__)
+
+# Ends the token stream handed from a pool thread to the /ask response.
+_DONE = None
+
+
+class SearchRequest(BaseModel):
+    query: str
+    limit: int = 10
+    candidates: int = 50
+
+
+class AskRequest(BaseModel):
+    question: str
+    limit: int = 5
+    candidates: int = 50
+    model: Optional[str] = None
+    grade: bool = False
+    stream: bool = True
+
+
+class IngestRequest(BaseModel):
+    folder: str
+    streaming: bool = False
+
+
+class _Worker:
+    """Per-thread services, all sharing the thread's warm connection."""
+
+    def __init__(self, db_file: str):
+        # The pool already searches in parallel; more threads would only add cold connections.
+        self.search = SearchService(db_file, concurrent=False)
+        self.answer = AnswerService(self.search)
+
+    def close(self):
+        # The answer service shares the search service and its connection.
+        self.search.close()
+
+
+class IngestJobs:
+    """
+    Runs ingest requests one at a time on a background thread.
+
+    Jobs are kept in memory; their status is one of queued, running, done or
+    failed, with the ingest statistics or the error once finished.
+    """
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="rag-ingest")
+
+    def submit(self, folder: str, streaming: bool = False) -> dict:
+        job = {"id": uuid.uuid4().hex, "folder": folder, "status": "queued", "stats": None,
+               "error": None, "submitted": time.time(), "started": None, "finished": None}
+        with self._lock:
+            self.jobs[job["id"]] = job
+        self._executor.submit(self._run, job, streaming)
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _update(self, job: dict, **fields):
+        with self._lock:
+            job.update(fields)
+
+    def _run(self, job: dict, streaming: bool):
+        from rag.service._ingest import IngestService
+
+        self._update(job, status="running", started=time.time())
+        try:
+            stats = IngestService(self.db_file).ingest_folder(job["folder"], streaming=streaming)
+        except Exception as e:
+            logger.error(f"Ingest job {job['id']} failed: {e!r}")
+            self._update(job, status="failed", error=repr(e), finished=time.time())
+            return
+        self._update(job, status="done", stats=stats, finished=time.time())
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_app(
+        db_file: str = appConfig.get("DATABASE_PATH"),
+        workers: int = int(appConfig.get("SERVER_WORKERS")),
+) -> FastAPI:
+    """
+    Build the HTTP API.
+
+    Retrieval and answering run on a ``RagDbPool`` of warm per-thread
+    connections, so the event loop only awaits them. Ingest runs as a
+    background job polled through ``GET /ingest/{job_id}``. ``GET /metrics``
+    serves the stage timings and counters for Prometheus to scrape.
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.pool = RagDbPool(db_file, workers, factory=_Worker)
+        await asyncio.to_thread(app.state.pool.warm)
+        app.state.jobs = IngestJobs(db_file)
+        yield
+        app.state.jobs.close()
+        app.state.pool.close()
+
+    app = FastAPI(title="rag", lifespan=lifespan)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def prometheus_metrics():
+        return metrics.prometheus()
+
+    @app.post("/search")
+    async def search(request: SearchRequest):
+        return await app.state.pool.run(
+            lambda worker: worker.search.search(request.query, request.limit, request.candidates))
+
+    @app.post("/ask")
+    async def ask(request: AskRequest):
+        def answer(worker: _Worker, on_token=lambda token: None):
+            return worker.answer.ask(request.question, on_token, request.limit, request.candidates,
+                                     request.model, request.grade)
+
+        if not request.stream:
+            return await app.state.pool.run(answer)
+
+        loop = asyncio.get_running_loop()
+        tokens = asyncio.Queue()
+
+        def on_token(token: str):
+            loop.call_soon_threadsafe(tokens.put_nowait, token)
+
+        async def events():
+            # One JSON object per line: tokens as they arrive, then the sources and timings.
+            task = asyncio.ensure_future(app.state.pool.run(answer, on_token))
+            task.add_done_callback(lambda _: tokens.put_nowait(_DONE))
+            while (token := await tokens.get()) is not _DONE:
+                yield json.dumps({"token": token}) + "\n"
+            response = await task
+            yield json.dumps({"sources": response["sources"], "grading": response["grading"],
+                              "timings": response["timings"], "response_id": response["response_id"]}) + "\n"
+
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+    @app.post("/ingest", status_code=202)
+    async def ingest(request: IngestRequest):
+        return app.state.jobs.submit(request.folder, request.streaming)
+
+    @app.get("/ingest/{job_id}")
+    async def ingest_status(job_id: str):
+        job = app.state.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown ingest job: {job_id}")
+        return job
+
+    return app
@@ -0,0 +1,124 @@
+import hashlib
+import re
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_BITS = np.arange(64, dtype=np.uint64)
+_TOKEN = re.compile(r"\w+")
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    """
+    64 bit SimHash of ``text`` over its lower-cased word ``shingle``-grams.
+
+    Texts differing in a few words (a page number, a version string) get
+    signatures a few bits apart; unrelated texts differ in about 32 bits.
+    """
+    tokens = _TOKEN.findall(text.lower())
+    shingles = [" ".join(tokens[i:i + shingle]) for i in range(max(1, len(tokens) - shingle + 1))]
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+         for value in shingles),
+        dtype=np.uint64, count=len(shingles),
+    )
+    # Each bit of the signature is the majority vote of that bit over the shingle hashes.
+    votes = ((hashes[:, None] >> _BITS) & np.uint64(1)).sum(axis=0)
+    return int(np.packbits(votes * 2 > len(shingles), bitorder="little").view("<u8")[0])
+
+
+def chunk_signature(text: str, min_tokens: int) -> Optional[int]:
+    """The chunk's SimHash, or None for chunks too short to judge."""
+    if len(text.split()) < min_tokens:
+        return None
+    return simhash(text)
+
+
+def to_signed(signature: int) -> int:
+    """Map an unsigned 64 bit signature into SQLite's signed INTEGER range."""
+    return signature - (1 << 64) if signature >= 1 << 63 else signature
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+class SimHashIndex:
+    """
+    In-memory banded index of SimHash signatures for near-duplicate lookup.
+
+    The 64 bits are cut into ``max_distance + 1`` bands; two signatures at most
+    ``max_distance`` bits apart must agree exactly on at least one band
+    (pigeonhole), so only the signatures sharing a band with the query are
+    compared, in one vectorised pass. Each entry costs a signature, an id and
+    one position per band, all in flat arrays. Safe to share between threads.
+    """
+
+    def __init__(self, max_distance: int = 6):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        self._bands = []
+        shift = 0
+        for band in range(bands):
+            width = 64 // bands + (1 if band < 64 % bands else 0)
+            self._bands.append((shift, (1 << width) - 1))
+            shift += width
+        self._buckets: List[Dict[int, array]] = [{} for _ in self._bands]
+        self._signatures = array("Q")
+        self._ids = array("q")
+        self._removed = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids) - len(self._removed)
+
+    def add_many(self, entries: Iterable[Tuple[int, int]]):
+        """Index ``(id, signature)`` pairs."""
+        with self._lock:
+            for entry_id, signature in entries:
+                position = len(self._ids)
+                self._ids.append(entry_id)
+                self._signatures.append(signature)
+                for (shift, mask), buckets in zip(self._bands, self._buckets):
+                    key = (signature >> shift) & mask
+                    bucket = buckets.get(key)
+                    if bucket is None:
+                        bucket = buckets[key] = array("q")
+                    bucket.append(position)
+
+    def add(self, entry_id: int, signature: int):
+        self.add_many([(entry_id, signature)])
+
+    def remove(self, entry_ids: Sequence[int]):
+        """Drop entries, e.g. for chunks whose document failed to be written."""
+        with self._lock:
+            self._removed.update(entry_ids)
+
+    def nearest(self, signature: int) -> Optional[Tuple[int, int]]:
+        """:return: ``(id, distance)`` of the closest signature within ``max_distance``, or None."""
+        with self._lock:
+            buckets = [bucket for (shift, mask), band in zip(self._bands, self._buckets)
+                       if (bucket := band.get((signature >> shift) & mask)) is not None]
+            if not buckets:
+                return None
+            positions = np.concatenate([np.frombuffer(bucket, dtype=np.int64) for bucket in buckets])
+            signatures = np.frombuffer(self._signatures, dtype=np.uint64)[positions]
+            distances = _popcount(signatures ^ np.uint64(signature))
+            close = np.flatnonzero(distances <= self.max_distance)
+            for index in close[np.argsort(distances[close], kind="stable")]:
+                entry_id = self._ids[positions[index]]
+                if entry_id not in self._removed:
+                    return entry_id, int(distances[index])
+        return None
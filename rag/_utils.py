@@ -1,6 +1,8 @@
 import hashlib
+import mmap
 import os
 import re
+import struct
 import sys
 from pathlib import Path
 from urllib.parse import urlparse
@@ -45,13 +47,34 @@ def get_filename_from_url(url):
     return filename
 
 
-def compute_file_hash(file_path, algorithm="sha256"):
-    """Compute the hash of a file using the specified algorithm."""
+def compute_file_hash(file_path, algorithm="sha256", use_mmap=False):
+    """
+    Compute the hash of a file using the specified algorithm.
+
+    With ``use_mmap`` the file is memory-mapped and hashed in one call, which
+    avoids copying it through Python buffers and releases the GIL for the
+    whole file, so several files can be hashed in parallel threads.
+    """
     hash_func = hashlib.new(algorithm)
 
     with open(file_path, "rb") as file:
+        if use_mmap:
+            if os.fstat(file.fileno()).st_size:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    hash_func.update(mapped)
+            return hash_func.hexdigest()
         # Read the file in chunks of 8192 bytes
         while chunk := file.read(8192):
             hash_func.update(chunk)
 
     return hash_func.hexdigest()
+
+
+def compute_text_hash(text: str, algorithm="sha256") -> str:
+    """Compute the hash of a string's UTF-8 encoding."""
+    return hashlib.new(algorithm, text.encode("utf-8")).hexdigest()
+
+
+def deserialize_float32(data: bytes) -> list:
+    """Inverse of ``sqlite_vec.serialize_float32``."""
+    return list(struct.unpack(f"{len(data) // 4}f", data))
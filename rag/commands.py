@@ -2,17 +2,26 @@ import logging
 import os
 
 import click
-from rich import print
-from rich.pretty import Pretty
 
-from rag._config import appConfig
-from rag._database import RagDb
-from rag.service._ingest import IngestService
-from rag.service._ollama_service import OllamaService
+from rag._config import appConfig, setup_logging
+
+# Commands import their services when they run, so that `rag --help` or
+# `rag config` do not pay for langchain, chonkie, ollama or sqlite_vec.
 
 logger = logging.getLogger(__name__)
 
 
+def _report_metrics(rag_db, run: str):
+    """Print the per-stage timings and export the metrics if configured."""
+    from rag._metrics import metrics
+
+    for stage, summary in metrics.stage_summary().items():
+        click.echo(f"  {stage:<16}{summary['count']:>7} x {summary['mean'] * 1000:>9.1f}ms "
+                   f"= {summary['sum']:>8.2f}s")
+    if appConfig.get("METRICS_EXPORT") == "db":
+        metrics.export(rag_db, run)
+
+
 @click.command()
 @click.option(
     "--db",
@@ -28,6 +37,8 @@ def init_db(db, schema):
     """
     Will generate the sqlite database using the schema file.
     """
+    from rag._database import RagDb
+
     logger.info(f"Initializing the database at {db} with schema {schema}.")
     RagDb.init_db(db, schema)
 
@@ -40,17 +51,25 @@ def init_db(db, schema):
 )
 def drop_db(db="rag.db"):
     """Drop the database"""
+    from rag._database import RagDb
+
     click.echo("Dropping the database ...")
     if os.path.isfile(db):
-        os.remove(db)
+        RagDb.remove_file(db)
         click.echo(f"Dropped the database:{os.path.abspath(db)}.")
     else:
         click.echo(f"Database {os.path.abspath(db)} not found.")
+    RagDb.remove_ann_index()
 
 
 @click.command()
 def models():
     """List all models"""
+    from rich import print
+    from rich.pretty import Pretty
+
+    from rag.service._ollama_service import OllamaService
+
     click.echo("Installed Ollama Models:")
     ollama = OllamaService()
     print(Pretty(ollama.list_models()))
@@ -59,6 +78,9 @@ def models():
 @click.command()
 def config():
     """Dump the configuration."""
+    from rich import print
+    from rich.pretty import Pretty
+
     print(Pretty(appConfig, expand_all=True))
 
 
@@ -68,29 +90,297 @@ def config():
     "--prompt", default="Why is the sky blue?", help="The prompt used to chat."
 )
 @click.option("--role", default="user", help="The user type.")
-def chat(model: str, prompt: str, role: str):
+@click.option("--no-cache", is_flag=True, help="Always ask the model, bypassing the semantic answer cache.")
+def chat(model: str, prompt: str, role: str, no_cache: bool = False):
     """Get video text."""
+    from rich import print
+
+    from rag._database import RagDb
+    from rag.service._chat_cache import SemanticCache
+    from rag.service._ollama_service import OllamaService
+
     messages = [{"role": role, "content": prompt}]
     service = OllamaService()
-    response = service.chat_with_model(model, messages)
     db = RagDb()
-    db.insert_chat_response(response)
+    if no_cache:
+        response = service.chat_with_model(model, messages)
+        db.insert_chat_response(response)
+        print(response)
+        return
+    cache = SemanticCache(db)
+    response = cache.chat(model, messages, service.chat_with_model)
     print(response)
+    stats = cache.stats()
+    outcome = (f"hit (similarity {response['similarity']:.3f}, saved {response['saved_seconds']:.1f}s)"
+               if response["cached"] else "miss")
+    click.echo(f"Answer cache {outcome}; {stats['hits']}/{stats['hits'] + stats['misses']} hits "
+               f"({stats['hit_rate']:.0%}), {stats['saved_seconds']:.1f}s saved in total")
 
 
 @click.command()
 @click.option("--folder", default="./data", help="The folder containing the data to ingest.")
-def ingest(folder: str = "./data"):
+@click.option(
+    "--parse-workers",
+    default=int(appConfig.get("INGEST_PARSE_WORKERS")),
+    help="Number of processes parsing PDFs.",
+)
+@click.option(
+    "--split-workers",
+    default=int(appConfig.get("INGEST_SPLIT_WORKERS")),
+    help="Number of processes splitting pages into chunks.",
+)
+@click.option(
+    "--embed-concurrency",
+    default=int(appConfig.get("OLLAMA_EMBEDDING_CONCURRENCY")),
+    help="Number of embedding requests in flight.",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    help="Ingest one file at a time, page by page, with bounded memory.",
+)
+@click.option(
+    "--entities",
+    is_flag=True,
+    help="Also extract named entities from the chunks into the knowledge graph.",
+)
+def ingest(folder: str = "./data", parse_workers: int = 2, split_workers: int = 2,
+           embed_concurrency: int = 4, stream: bool = False, entities: bool = False):
     """Ingest a folder with one or more files."""
+    from rag.service._ingest import IngestService
+
     ingest_service = IngestService()
     logger.info(f"Ingesting folder: {folder}")
-    ingest_service.ingest_folder(folder)
+    stats = ingest_service.ingest_folder(folder, parse_workers, split_workers, embed_concurrency,
+                                         streaming=stream, entities=entities)
     logger.info("Ingestion completed.")
+    click.echo(
+        f"Ingested {stats['files']} files ({stats['chunks']} chunks, {stats['duplicates']} near-duplicates, "
+        f"{stats['failed']} failed) "
+        f"in {stats['seconds']:.1f}s: {stats['files_per_sec']:.2f} files/sec, "
+        f"{stats['chunks_per_sec']:.1f} chunks/sec"
+    )
+    if "entities" in stats:
+        extracted = stats["entities"]
+        click.echo(
+            f"Extracted {extracted['entities']} entities ({extracted['mentions']} mentions) from "
+            f"{extracted['chunks']} chunks in {extracted['seconds']:.1f}s: "
+            f"{extracted['chunks_per_sec']:.1f} chunks/sec, {extracted['drain_seconds']:.1f}s after ingest"
+        )
+    _report_metrics(ingest_service.rag_db, f"ingest {folder}")
+
+
+@click.command()
+@click.option("--query", required=True, help="The text to search for.")
+@click.option("--limit", default=10, help="The number of results to return.")
+@click.option(
+    "--candidates",
+    default=50,
+    help="How many results the full text and vector searches each contribute.",
+)
+def search(query: str, limit: int = 10, candidates: int = 50):
+    """Hybrid full text and vector search over the ingested documents."""
+    from rag.service._search import SearchService
+
+    service = SearchService()
+    response = service.search(query, limit, candidates)
+    service.close()
+    for rank, result in enumerate(response["results"], 1):
+        click.echo(f"{rank}. [{result['score']:.4f}] {result['file_path']} (chunk {result['chunk_id']})")
+        click.echo(f"   {result['text'][:200]}")
+    timings = ", ".join(f"{phase} {seconds * 1000:.1f}ms" for phase, seconds in response["timings"].items())
+    click.echo(f"Latency: {timings}")
+
+
+@click.command()
+@click.option("--question", required=True, help="The question to answer from the ingested documents.")
+@click.option("--model", default=appConfig.get("OLLAMA_MODEL"), help="The model used to answer.")
+@click.option("--limit", default=5, help="The number of chunks given to the model as context.")
+@click.option("--grade", is_flag=True, help="Drop retrieved chunks an LLM grades as irrelevant.")
+def ask(question: str, model: str, limit: int = 5, grade: bool = False):
+    """Answer a question from the ingested documents, streaming the answer."""
+    from rag.service._answer import AnswerService
+
+    service = AnswerService(model=model)
+    response = service.ask(question, lambda token: click.echo(token, nl=False), limit, grade=grade)
+    service.close()
+    click.echo()
+    for number, source in enumerate(response["sources"], 1):
+        click.echo(f"[{number}] {source['file_path']} (chunk {source['chunk_id']})")
+    timings = response["timings"]
+    if response["grading"]:
+        grading = response["grading"]
+        click.echo(f"Graded {grading['graded']} chunks ({grading['cached']} cached, {grading['skipped']} skipped), "
+                   f"kept {grading['relevant']} in {timings['grade'] * 1000:.0f}ms")
+    click.echo(f"First token {timings['time_to_first_token'] * 1000:.0f}ms "
+               f"(retrieval {timings['retrieve'] * 1000:.0f}ms), "
+               f"{timings['tokens_per_second']:.1f} tokens/sec, total {timings['total']:.1f}s")
+
+
+@click.command()
+@click.option("--host", default=appConfig.get("SERVER_HOST"), help="Interface to listen on.")
+@click.option("--port", default=int(appConfig.get("SERVER_PORT")), help="Port to listen on.")
+@click.option(
+    "--workers",
+    default=int(appConfig.get("SERVER_WORKERS")),
+    help="Number of threads, each with its own warm database connection.",
+)
+@click.option(
+    "--db",
+    default=appConfig.get("DATABASE_PATH"),
+    help="File path of the sqlite database to serve.",
+)
+def serve(host: str, port: int, workers: int, db: str = "rag.db"):
+    """Run the HTTP API for search, ask and ingest."""
+    import uvicorn
+
+    from rag._server import create_app
+
+    uvicorn.run(create_app(db, workers), host=host, port=port)
+
+
+@click.command()
+@click.option(
+    "--quantization",
+    type=click.Choice(["int8", "bit"]),
+    default=None,
+    help="Quantization to build, defaults to VECTOR_QUANTIZATION.",
+)
+@click.option(
+    "--dimensions",
+    type=int,
+    default=None,
+    help="Leading dimensions to keep, defaults to the current width or OLLAMA_EMBEDDING_DIMENSIONS.",
+)
+@click.option(
+    "--db",
+    default=appConfig.get("DATABASE_PATH"),
+    help="File path of the sqlite database to use.",
+)
+def quantize(quantization: str = None, dimensions: int = None, db: str = "rag.db"):
+    """Rebuild a quantized vector table from the full precision vectors."""
+    from rag._database import RagDb
+
+    rag_db = RagDb(db)
+    if not quantization and rag_db.quantization == "none":
+        raise click.UsageError("Set VECTOR_QUANTIZATION or pass --quantization.")
+    rag_db.build_quantized_table(quantization, dimensions)
+    click.echo(f"Built {quantization or rag_db.quantization} vectors "
+               f"({dimensions or rag_db.quantized_dimensions} dimensions).")
+
+
+@click.command()
+@click.option("--nlist", type=int, default=None, help="Number of IVF lists (default: about 4 * sqrt(vectors)).")
+@click.option(
+    "--path",
+    default=appConfig.get("ANN_INDEX_PATH"),
+    help="Directory of the ANN index files.",
+)
+@click.option(
+    "--db",
+    default=appConfig.get("DATABASE_PATH"),
+    help="File path of the sqlite database to use.",
+)
+def build_index(nlist: int = None, path: str = "rag-ann", db: str = "rag.db"):
+    """Build the memory-mapped ANN index from the stored vectors."""
+    from rag._database import RagDb
+
+    meta = RagDb(db, ann_index_path=path).build_ann_index(path, nlist)
+    click.echo(f"Indexed {meta['count']} vectors in {meta['nlist']} lists at {os.path.abspath(path)}.")
+
+
+@click.command()
+@click.option("--k", default=10, help="Recall is measured over the top k results.")
+@click.option("--queries", default=100, help="Number of stored vectors used as queries.")
+@click.option("--dimensions", default="1024,512,256", help="Comma separated dimensions to try.")
+@click.option("--oversample", default="4,8,16", help="Comma separated rescoring oversample factors.")
+@click.option(
+    "--db",
+    default=appConfig.get("DATABASE_PATH"),
+    help="File path of the sqlite database to use.",
+)
+def vector_recall(k: int, queries: int, dimensions: str, oversample: str, db: str = "rag.db"):
+    """Report recall@k of quantized vector search against exact search."""
+    from rag._database import RagDb
+    from rag.service._vector_recall import vector_recall_report
+
+    report = vector_recall_report(
+        RagDb(db), k, queries,
+        dimensions=[int(value) for value in dimensions.split(",")],
+        oversamples=[int(value) for value in oversample.split(",")],
+    )
+    click.echo(f"{'quantization':<13}{'dims':>6}{'oversample':>12}{'recall@' + str(k):>11}{'p50 ms':>9}{'bytes':>7}")
+    for row in report:
+        click.echo(f"{row['quantization']:<13}{row['dimensions']:>6}{row['oversample'] or '-':>12}"
+                   f"{row['recall']:>11.3f}{row['p50_ms']:>9.2f}{row['bytes_per_vector']:>7}")
+
+
+@click.command()
+@click.option("--folder", default="./data", help="The folder to watch.")
+@click.option(
+    "--debounce",
+    default=float(appConfig.get("WATCH_DEBOUNCE")),
+    help="Seconds a file must stay unchanged before it is ingested.",
+)
+@click.option(
+    "--poll-interval",
+    default=float(appConfig.get("WATCH_POLL_INTERVAL")),
+    help="Seconds between folder scans when file system events are unavailable.",
+)
+@click.option("--poll", is_flag=True, help="Poll the folder even if watchdog is installed.")
+def watch(folder: str = "./data", debounce: float = 2.0, poll_interval: float = 5.0, poll: bool = False):
+    """Ingest new and changed files as they land in a folder, until interrupted."""
+    from rag.service._ingest import IngestService
+    from rag.service._watcher import FolderWatcher
+
+    ingest_service = IngestService()
+    watcher = FolderWatcher(ingest_service, folder, debounce=debounce, poll_interval=poll_interval,
+                            use_watchdog=not poll)
+    watcher.watch()
+    stats = watcher.stats()
+    click.echo(
+        f"Ingested {stats['ingested']} files ({stats['failed']} failed, {stats['queue_depth']} still waiting), "
+        f"p50 {stats['latency_p50']:.1f}s / p90 {stats['latency_p90']:.1f}s from arrival to searchable"
+    )
+    _report_metrics(ingest_service.rag_db, f"watch {folder}")
+
+
+@click.command()
+@click.option("--query", required=True, help="The arXiv search query, e.g. a topic.")
+@click.option("--max-results", default=100, help="The number of papers to download.")
+@click.option("--folder", default="./data", help="The folder to download the PDFs into.")
+@click.option(
+    "--concurrency",
+    default=int(appConfig.get("ARXIV_DOWNLOAD_CONCURRENCY")),
+    help="Number of downloads in flight.",
+)
+@click.option(
+    "--rate",
+    default=float(appConfig.get("ARXIV_DOWNLOAD_RATE")),
+    help="PDF requests per second across all downloads (0 for no limit).",
+)
+@click.option(
+    "--api-url",
+    default=appConfig.get("ARXIV_API_URL"),
+    help="The arXiv API query endpoint.",
+)
+def download(query: str, max_results: int, folder: str = "./data", concurrency: int = 4,
+             rate: float = 1.0, api_url: str = None):
+    """Download arXiv papers matching a query, skipping and resuming earlier downloads."""
+    from rag.service._download_papers import ArxivDownloader
+
+    downloader = ArxivDownloader(folder, api_url=api_url, concurrency=concurrency, rate=rate)
+    stats = downloader.download(query, max_results)
+    click.echo(
+        f"Found {stats['found']} papers: {stats['downloaded']} downloaded, {stats['resumed']} resumed, "
+        f"{stats['skipped']} already present, {stats['failed']} failed in {stats['seconds']:.1f}s "
+        f"({stats['files_per_sec']:.2f} files/sec, {stats['mb_per_sec']:.2f} MB/sec)"
+    )
 
 
 @click.group()
 def cli():
-    pass
+    setup_logging()
 
 
 cli.add_command(init_db)
@@ -99,3 +389,11 @@ cli.add_command(config)
 cli.add_command(chat)
 cli.add_command(models)
 cli.add_command(ingest)
+cli.add_command(download)
+cli.add_command(watch)
+cli.add_command(search)
+cli.add_command(ask)
+cli.add_command(serve)
+cli.add_command(quantize)
+cli.add_command(build_index)
+cli.add_command(vector_recall)
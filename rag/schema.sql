@@ -12,6 +12,8 @@ CREATE TABLE CHAT_RESPONSE(
 	prompt_eval_duration INTEGER,
 	eval_count INTEGER,
 	eval_duration INTEGER,
+	time_to_first_token REAL,
+	tokens_per_second REAL,
 	created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -21,42 +23,128 @@ CREATE TABLE CHAT_REQUEST(
 	model TEXT NOT NULL,
 	message_role TEXT,
 	message_content TEXT,
+	prompt_hash TEXT,
+	response_id INTEGER REFERENCES CHAT_RESPONSE(id),
+	corpus_version INTEGER NOT NULL DEFAULT 0,
+	cached REAL,
+	last_used REAL,
+	hits INTEGER NOT NULL DEFAULT 0,
 	created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
+CREATE INDEX CHAT_REQUEST_PROMPT_HASH ON CHAT_REQUEST(prompt_hash, model);
+CREATE INDEX CHAT_REQUEST_CACHED ON CHAT_REQUEST(cached);
+CREATE INDEX CHAT_REQUEST_LAST_USED ON CHAT_REQUEST(last_used);
+
+DROP TABLE IF EXISTS CHAT_REQUEST_VECTOR;
+CREATE VIRTUAL TABLE CHAT_REQUEST_VECTOR
+USING vec0(rowid INTEGER PRIMARY KEY, embedding float[1024] distance_metric=cosine);
+
+DROP TABLE IF EXISTS RAG_META;
+CREATE TABLE RAG_META(
+	key TEXT PRIMARY KEY,
+	value TEXT NOT NULL
+);
 
 DROP TABLE IF EXISTS DOCUMENT;
 CREATE TABLE DOCUMENT (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
 	file_path TEXT NOT NULL,
 	file_hash TEXT NOT NULL,
-	status TEXT NOT NULL DEFAULT 'pending',
+	status TEXT NOT NULL DEFAULT 'PENDING',
+	pages_done INTEGER NOT NULL DEFAULT 0,
 	created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
 	completed TIMESTAMP 
 );
+CREATE INDEX DOCUMENT_FILE_HASH ON DOCUMENT(file_hash, status);
 
 DROP TABLE IF EXISTS DOCUMENT_FULL_TEXT;
 CREATE TABLE DOCUMENT_FULL_TEXT(
     id INTEGER PRIMARY KEY AUTOINCREMENT,
 	document_id INTEGER NOT NULL,
-	data TEXT,
+	compression TEXT NOT NULL DEFAULT 'zlib',
+	size INTEGER,
+	data BLOB,
 	created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
+CREATE INDEX DOCUMENT_FULL_TEXT_DOCUMENT ON DOCUMENT_FULL_TEXT(document_id);
 
 
 DROP TABLE IF EXISTS DOCUMENT_TEXT_CHUNK;
 CREATE TABLE DOCUMENT_TEXT_CHUNK(
     id INTEGER PRIMARY KEY AUTOINCREMENT,
 	document_id INTEGER NOT NULL,
-	text_length INTEGER,
-	data TEXT,
+	start_offset INTEGER NOT NULL,
+	end_offset INTEGER NOT NULL,
+	token_count INTEGER,
+	simhash INTEGER,
+	duplicate_of INTEGER,
 	created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
+CREATE INDEX DOCUMENT_TEXT_CHUNK_DOCUMENT ON DOCUMENT_TEXT_CHUNK(document_id);
+
+-- Chunk text sliced out of DOCUMENT_FULL_TEXT; rag_chunk_text is registered by RagDb.
+DROP VIEW IF EXISTS DOCUMENT_TEXT_CHUNK_TEXT;
+CREATE VIEW DOCUMENT_TEXT_CHUNK_TEXT AS
+SELECT id, rag_chunk_text(document_id, start_offset, end_offset) AS data FROM DOCUMENT_TEXT_CHUNK;
 
 DROP TABLE IF EXISTS DOCUMENT_TEXT_CHUNK_FTS;
 CREATE VIRTUAL TABLE DOCUMENT_TEXT_CHUNK_FTS USING fts5 (
-    chunk_id, data
+    data, content='DOCUMENT_TEXT_CHUNK_TEXT', content_rowid='id'
 );
 
 DROP TABLE IF EXISTS DOCUMENT_TEXT_CHUNK_VECTOR;
 CREATE VIRTUAL TABLE DOCUMENT_TEXT_CHUNK_VECTOR 
 USING vec0(rowid INTEGER PRIMARY KEY, embedding float[1024]);
+
+DROP TABLE IF EXISTS ANN_INDEX_MAP;
+CREATE TABLE ANN_INDEX_MAP(
+	ann_id INTEGER PRIMARY KEY,
+	chunk_id INTEGER NOT NULL UNIQUE
+);
+
+DROP TABLE IF EXISTS RELEVANCE_GRADE;
+CREATE TABLE RELEVANCE_GRADE(
+	question_hash TEXT NOT NULL,
+	chunk_id INTEGER NOT NULL,
+	model TEXT NOT NULL,
+	relevant INTEGER NOT NULL,
+	created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+	PRIMARY KEY (question_hash, chunk_id, model)
+);
+
+DROP TABLE IF EXISTS EMBEDDING_CACHE;
+CREATE TABLE EMBEDDING_CACHE(
+	model TEXT NOT NULL,
+	dimensions INTEGER NOT NULL,
+	text_hash TEXT NOT NULL,
+	embedding BLOB NOT NULL,
+	created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+	last_used REAL NOT NULL,
+	PRIMARY KEY (model, dimensions, text_hash)
+);
+CREATE INDEX EMBEDDING_CACHE_LAST_USED ON EMBEDDING_CACHE(last_used);
+
+DROP TABLE IF EXISTS FILE_SCAN;
+CREATE TABLE FILE_SCAN(
+	file_path TEXT PRIMARY KEY,
+	file_size INTEGER NOT NULL,
+	mtime_ns INTEGER NOT NULL,
+	file_hash TEXT NOT NULL,
+	scanned TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+DROP TABLE IF EXISTS METRICS;
+CREATE TABLE METRICS(
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	run TEXT NOT NULL,
+	name TEXT NOT NULL,
+	labels TEXT NOT NULL,
+	kind TEXT NOT NULL,
+	count INTEGER,
+	value REAL,
+	p50 REAL,
+	p90 REAL,
+	p99 REAL,
+	created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX METRICS_RUN ON METRICS(run, name);
@@ -0,0 +1,128 @@
+import logging
+import time
+from typing import Callable, List, Optional
+
+from rag._config import appConfig
+from rag._metrics import STAGE_SECONDS, metrics
+from rag._prompts import RAG_ANSWER_PROMPT
+from rag.service._grader import RelevanceGrader
+from rag.service._ollama_service import OllamaService
+from rag.service._search import SearchService
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerService:
+    """
+    Retrieval augmented answers, streamed token by token.
+
+    The question is run through hybrid search, the best chunks are numbered
+    into ``RAG_ANSWER_PROMPT``, and the model's answer is handed to ``on_token``
+    as it is generated. Time to first token is measured from the moment the
+    question is asked, retrieval included, because that is the wait a user
+    actually sees.
+
+    With grading, ``grade_factor`` times as many chunks are retrieved and the
+    ``RelevanceGrader`` keeps the best ranked relevant ones.
+    """
+
+    def __init__(
+            self,
+            search_service: Optional[SearchService] = None,
+            model: str = appConfig.get("OLLAMA_MODEL"),
+            grader: Optional[RelevanceGrader] = None,
+            grade_factor: int = 3,
+    ):
+        self.search_service = search_service or SearchService()
+        self.rag_db = self.search_service.rag_db
+        self.model = model
+        self.grader = grader or RelevanceGrader(self.rag_db)
+        self.grade_factor = grade_factor
+
+    @staticmethod
+    def build_prompt(question: str, results: List[dict]) -> str:
+        context = "\n\n".join(f"[{number}] {result['file_path']}\n{result['text']}"
+                              for number, result in enumerate(results, 1))
+        return RAG_ANSWER_PROMPT.format(context=context, question=question)
+
+    def ask(self, question: str, on_token: Callable[[str], None] = lambda token: None,
+            limit: int = 5, candidates: int = 50, model: str = None, grade: bool = False) -> dict:
+        """
+        Answer a question from the corpus.
+
+        :param on_token: called with each piece of the answer as it arrives.
+        :param limit: the number of chunks given to the model as context.
+        :param candidates: how many results each retriever contributes to the fusion.
+        :param model: overrides the service's model for this question.
+        :param grade: drop retrieved chunks the grader judges irrelevant.
+        :return: the answer, its sources, the stored response id, grading
+            statistics when graded, and timings: retrieve, grade,
+            time_to_first_token, generate and total in seconds, plus
+            tokens_per_second.
+        """
+        model = model or self.model
+        start = time.perf_counter()
+        results = self.search_service.search(question, limit * self.grade_factor if grade else limit,
+                                             candidates)["results"]
+        retrieved = time.perf_counter()
+        grading = None
+        if grade:
+            grading = self.grader.filter(question, results, limit)
+            results = grading["results"]
+            grading = grading["stats"]
+        graded = time.perf_counter()
+        messages = [{"role": "user", "content": self.build_prompt(question, results)}]
+
+        pieces, first_token, final = [], None, None
+        for chunk in OllamaService.stream_chat(model, messages):
+            content = chunk["message"]["content"]
+            if content:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                pieces.append(content)
+                on_token(content)
+            if chunk["done"]:
+                final = chunk
+        end = time.perf_counter()
+
+        answer = "".join(pieces)
+        first_token = first_token or end
+        eval_count = final["eval_count"] if final else None
+        eval_duration = final["eval_duration"] if final else None
+        if eval_count and eval_duration:
+            tokens_per_second = eval_count / (eval_duration / 1e9)
+        else:
+            # Without Ollama's counters, fall back to streamed chunks over wall time.
+            tokens_per_second = len(pieces) / (end - first_token) if end > first_token else 0.0
+        timings = {
+            "retrieve": retrieved - start,
+            "grade": graded - retrieved,
+            "time_to_first_token": first_token - start,
+            "generate": end - first_token,
+            "total": end - start,
+            "tokens_per_second": tokens_per_second,
+        }
+        response_id = self.rag_db.insert_chat_response({
+            "model": model,
+            "message": {"role": "assistant", "content": answer},
+            "done_reason": final["done_reason"] if final else None,
+            "done": bool(final),
+            "total_duration": final["total_duration"] if final else None,
+            "load_duration": final["load_duration"] if final else None,
+            "prompt_eval_count": final["prompt_eval_count"] if final else None,
+            "prompt_eval_duration": final["prompt_eval_duration"] if final else None,
+            "eval_count": eval_count,
+            "eval_duration": eval_duration,
+            "time_to_first_token": timings["time_to_first_token"],
+            "tokens_per_second": tokens_per_second,
+        })
+        metrics.increment("rag_answers_total", model=model)
+        for phase in ("retrieve", "grade", "time_to_first_token", "generate", "total"):
+            metrics.observe(STAGE_SECONDS, timings[phase], stage=f"ask_{phase}")
+        logger.info(f"Answered in {timings['total']:.2f}s, first token after "
+                    f"{timings['time_to_first_token']:.2f}s, {tokens_per_second:.1f} tokens/sec")
+        return {"answer": answer, "sources": results, "response_id": response_id, "grading": grading,
+                "timings": timings}
+
+    def close(self):
+        self.search_service.close()
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import random
+from typing import List, Optional, Sequence
+
+import httpx
+
+from rag._config import appConfig
+from rag._metrics import metrics
+from rag.service._embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncEmbeddingService:
+    """
+    Asyncio embedding client for Ollama's ``/api/embed`` endpoint.
+
+    One pooled keep-alive connection set is shared by all requests, and at most
+    ``max_in_flight`` requests are outstanding at a time; callers awaiting a slot
+    are held back, which gives producers natural backpressure. Connection errors
+    and timeouts are retried with exponential backoff and jitter. With a
+    ``cache``, only texts missing from the embedding cache are sent.
+
+    Use it as an async context manager so the connection pool is closed::
+
+        async with AsyncEmbeddingService() as embedder:
+            embeddings = await embedder.embed_batch(texts)
+    """
+
+    def __init__(
+            self,
+            model_name: str = appConfig.get("OLLAMA_EMBEDDING_MODEL"),
+            base_url: str = appConfig.get("OLLAMA_URL"),
+            batch_size: int = int(appConfig.get("OLLAMA_EMBEDDING_BATCH_SIZE")),
+            max_in_flight: int = int(appConfig.get("OLLAMA_EMBEDDING_CONCURRENCY")),
+            timeout: float = float(appConfig.get("OLLAMA_REQUEST_TIMEOUT")),
+            max_retries: int = int(appConfig.get("OLLAMA_MAX_RETRIES")),
+            retry_backoff: float = 0.5,
+            cache: Optional[EmbeddingCache] = None,
+    ):
+        self.model_name = model_name
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.cache = cache
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(max_connections=self.max_in_flight,
+                                max_keepalive_connections=self.max_in_flight),
+        )
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def embed(self, text: str) -> Optional[List[float]]:
+        return (await self.embed_batch([text]))[0]
+
+    async def embed_batch(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Embed many texts, sending up to ``max_in_flight`` batches concurrently.
+
+        :param texts: the texts to embed.
+        :return: one embedding per text, in order; ``None`` where a text failed.
+        """
+        if self.cache is None:
+            return await self._embed_uncached(texts)
+        embeddings = self.cache.get_many(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        metrics.increment("rag_embeddings_total", len(texts) - len(missing), source="cache")
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            fresh = await self._embed_uncached(missing_texts)
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+            self.cache.put_many(missing_texts, fresh)
+        return embeddings
+
+    async def _embed_uncached(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        batches = [list(texts[start:start + self.batch_size])
+                   for start in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._embed_with_fallback(batch) for batch in batches))
+        metrics.increment("rag_embeddings_total", len(texts), source="model")
+        return [embedding for batch in results for embedding in batch]
+
+    async def _embed_with_fallback(self, texts: List[str]) -> List[Optional[List[float]]]:
+        # Same isolation strategy as EmbeddingService: bisect a rejected batch.
+        try:
+            return await self._post_embed(texts)
+        except httpx.TransportError as e:
+            logger.error(f"Giving up on {len(texts)} texts after {self.max_retries} retries: {e!r}")
+            return [None] * len(texts)
+        except (httpx.HTTPStatusError, ValueError) as e:
+            if len(texts) == 1:
+                logger.warning(f"Failed to embed text (length {len(texts[0])}): {e}")
+                return [None]
+        middle = len(texts) // 2
+        left, right = await asyncio.gather(self._embed_with_fallback(texts[:middle]),
+                                           self._embed_with_fallback(texts[middle:]))
+        return left + right
+
+    async def _post_embed(self, texts: List[str]) -> List[List[float]]:
+        if self._client is None:
+            raise RuntimeError("AsyncEmbeddingService must be used as an async context manager")
+        attempt = 0
+        while True:
+            try:
+                async with self._slots:
+                    response = await self._client.post(
+                        "/api/embed", json={"model": self.model_name, "input": texts})
+                response.raise_for_status()
+                break
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt) * (1 + random.random())
+                attempt += 1
+                metrics.increment("rag_embedding_retries_total")
+                logger.warning(f"Embedding request failed ({e!r}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        embeddings = response.json().get("embeddings") or []
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return embeddings
@@ -0,0 +1,198 @@
+import json
+import logging
+import time
+from typing import Callable, List, Optional
+
+from sqlite_vec import serialize_float32
+
+from rag._config import appConfig
+from rag._database import RagDb
+from rag._utils import compute_text_hash
+from rag.service._embedding import EmbeddingService
+
+logger = logging.getLogger(__name__)
+
+# Nearest cached prompts considered per lookup before the model/version/TTL filters.
+_CANDIDATES = 8
+
+
+class SemanticCache:
+    """
+    Answer cache in front of the chat model, keyed by prompt meaning.
+
+    Each answered prompt is stored in CHAT_REQUEST (linked to its CHAT_RESPONSE)
+    with its embedding in the cosine CHAT_REQUEST_VECTOR table. A new prompt is
+    answered from the cache when an identical prompt, or one whose cosine
+    similarity reaches ``similarity``, was answered by the same model within
+    ``ttl`` seconds and against the current corpus version. Entries beyond
+    ``max_entries`` are evicted least recently used first.
+
+    Hit, miss and saved-latency totals are kept in RAG_META, so the reported
+    hit rate covers every ``rag chat`` run, not just the current one.
+    """
+
+    def __init__(
+            self,
+            rag_db: RagDb,
+            embedder: Optional[EmbeddingService] = None,
+            similarity: float = float(appConfig.get("CHAT_CACHE_SIMILARITY")),
+            ttl: float = float(appConfig.get("CHAT_CACHE_TTL")),
+            max_entries: int = int(appConfig.get("CHAT_CACHE_MAX_ENTRIES")),
+    ):
+        self.rag_db = rag_db
+        self.embedder = embedder or EmbeddingService()
+        self.similarity = similarity
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    @staticmethod
+    def prompt_text(messages: List[dict]) -> str:
+        return "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+
+    def chat(self, model: str, messages: List[dict], chat_fn: Callable) -> dict:
+        """
+        Return a cached answer for ``messages`` or call ``chat_fn(model, messages)``
+        and cache its response.
+
+        :return: the response, with ``cached`` and, on a hit, ``similarity`` and
+            ``saved_seconds`` (the original generation time) added.
+        """
+        text = self.prompt_text(messages)
+        prompt_hash = compute_text_hash(text)
+        corpus_version = self.rag_db.corpus_version()
+        not_before = time.time() - self.ttl
+
+        row = self.rag_db.cur.execute(
+            """SELECT id, response_id FROM CHAT_REQUEST
+            WHERE prompt_hash = ? AND model = ? AND corpus_version = ? AND cached >= ?
+            ORDER BY id DESC LIMIT 1""",
+            (prompt_hash, model, corpus_version, not_before),
+        ).fetchone()
+        similarity, embedding = (1.0, None) if row else (None, self.embedder.embed(text))
+        if row is None and embedding is not None:
+            row, similarity = self._nearest(embedding, model, corpus_version, not_before)
+        if row is not None:
+            response = self._hit(*row, similarity)
+            if response is not None:
+                return response
+
+        start = time.perf_counter()
+        response = chat_fn(model, messages)
+        elapsed = time.perf_counter() - start
+        self._store(model, messages, prompt_hash, embedding, corpus_version, response)
+        self.rag_db.increment_meta("chat_cache_misses")
+        self.rag_db.cn.commit()
+        logger.info(f"Chat cache miss for {model}, answered in {elapsed:.2f}s")
+        return dict(response, cached=False)
+
+    def _nearest(self, embedding, model: str, corpus_version: int, not_before: float):
+        candidates = self.rag_db.cur.execute(
+            "SELECT rowid, distance FROM CHAT_REQUEST_VECTOR WHERE embedding MATCH ? AND k = ?",
+            (serialize_float32(list(embedding)), _CANDIDATES),
+        ).fetchall()
+        candidates = [(rowid, distance) for rowid, distance in candidates
+                      if 1.0 - distance >= self.similarity]
+        if not candidates:
+            return None, None
+        distances = dict(candidates)
+        rows = self.rag_db.cur.execute(
+            """SELECT q.id, q.response_id FROM json_each(?) c JOIN CHAT_REQUEST q ON q.id = c.value
+            WHERE q.model = ? AND q.corpus_version = ? AND q.cached >= ?""",
+            (json.dumps(list(distances)), model, corpus_version, not_before),
+        ).fetchall()
+        if not rows:
+            return None, None
+        best = min(rows, key=lambda row: distances[row[0]])
+        return best, 1.0 - distances[best[0]]
+
+    def _hit(self, request_id: int, response_id: int, similarity: float) -> Optional[dict]:
+        row = self.rag_db.cur.execute(
+            """SELECT model, message_role, message_content, done_reason, done, total_duration,
+            load_duration, prompt_eval_count, prompt_eval_duration, eval_count, eval_duration
+            FROM CHAT_RESPONSE WHERE id = ?""",
+            (response_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        (model, role, content, done_reason, done, total_duration, load_duration,
+         prompt_eval_count, prompt_eval_duration, eval_count, eval_duration) = row
+        saved_seconds = (total_duration or 0) / 1e9
+        self.rag_db.cur.execute(
+            "UPDATE CHAT_REQUEST SET last_used = ?, hits = hits + 1 WHERE id = ?",
+            (time.time(), request_id),
+        )
+        self.rag_db.increment_meta("chat_cache_hits")
+        self.rag_db.increment_meta("chat_cache_saved_seconds", saved_seconds)
+        self.rag_db.cn.commit()
+        logger.info(f"Chat cache hit on request {request_id} (similarity {similarity:.3f})")
+        return {
+            "model": model,
+            "message": {"role": role, "content": content},
+            "done_reason": done_reason,
+            "done": bool(done),
+            "total_duration": total_duration,
+            "load_duration": load_duration,
+            "prompt_eval_count": prompt_eval_count,
+            "prompt_eval_duration": prompt_eval_duration,
+            "eval_count": eval_count,
+            "eval_duration": eval_duration,
+            "cached": True,
+            "similarity": similarity,
+            "saved_seconds": saved_seconds,
+        }
+
+    def _store(self, model: str, messages: List[dict], prompt_hash: str, embedding,
+               corpus_version: int, response):
+        response_id = self.rag_db.insert_chat_response(response)
+        if response_id is None:
+            return
+        now = time.time()
+        self.rag_db.cur.execute(
+            """INSERT INTO CHAT_REQUEST(model, message_role, message_content, prompt_hash, response_id,
+            corpus_version, cached, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (model, messages[-1]["role"], messages[-1]["content"], prompt_hash, response_id,
+             corpus_version, now, now),
+        )
+        if embedding is not None:
+            self.rag_db.cur.execute(
+                "INSERT INTO CHAT_REQUEST_VECTOR(rowid, embedding) VALUES (?, ?)",
+                (self.rag_db.cur.lastrowid, serialize_float32(list(embedding))),
+            )
+        self.rag_db.cn.commit()
+        self.evict()
+
+    def evict(self):
+        """Drop expired and stale entries, then least recently used ones above ``max_entries``."""
+        stale = [row_id for (row_id,) in self.rag_db.cur.execute(
+            """SELECT id FROM CHAT_REQUEST WHERE cached IS NOT NULL AND (cached < ? OR corpus_version != ?)""",
+            (time.time() - self.ttl, self.rag_db.corpus_version()),
+        ).fetchall()]
+        (entries,) = self.rag_db.cur.execute(
+            "SELECT COUNT(*) FROM CHAT_REQUEST WHERE cached IS NOT NULL").fetchone()
+        excess = entries - len(stale) - self.max_entries
+        if excess > 0:
+            stale += [row_id for (row_id,) in self.rag_db.cur.execute(
+                """SELECT id FROM CHAT_REQUEST WHERE cached IS NOT NULL AND id NOT IN
+                (SELECT value FROM json_each(?)) ORDER BY last_used LIMIT ?""",
+                (json.dumps(stale), excess),
+            ).fetchall()]
+        if not stale:
+            return
+        # The request row stays as chat history; it just stops being a cache entry.
+        self.rag_db.cur.executemany("UPDATE CHAT_REQUEST SET cached = NULL WHERE id = ?",
+                                    [(row_id,) for row_id in stale])
+        self.rag_db.cur.executemany("DELETE FROM CHAT_REQUEST_VECTOR WHERE rowid = ?",
+                                    [(row_id,) for row_id in stale])
+        self.rag_db.cn.commit()
+        logger.info(f"Evicted {len(stale)} chat cache entries")
+
+    def stats(self) -> dict:
+        hits = int(float(self.rag_db.get_meta("chat_cache_hits", 0)))
+        misses = int(float(self.rag_db.get_meta("chat_cache_misses", 0)))
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "saved_seconds": float(self.rag_db.get_meta("chat_cache_saved_seconds", 0)),
+        }
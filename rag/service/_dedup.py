@@ -0,0 +1,115 @@
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+from rag._config import appConfig
+from rag._database import RagDb
+from rag._metrics import metrics
+from rag._simhash import SimHashIndex, chunk_signature, to_signed, to_unsigned
+
+logger = logging.getLogger(__name__)
+
+DEDUP_POLICIES = ("off", "skip", "reuse")
+
+
+class ChunkDeduplicator:
+    """
+    Finds near-duplicate chunks before they are embedded.
+
+    Every chunk of at least ``min_tokens`` words gets a SimHash signature. A
+    chunk whose signature is within ``max_distance`` bits of an earlier chunk,
+    stored or still in flight in this run, is a duplicate of it: it is not
+    embedded and is stored with ``duplicate_of`` set. With the ``reuse``
+    policy it stays full text searchable, while vector search finds the
+    original; with ``skip`` it is kept only as a record of where the text
+    occurs, and never shows up in search results.
+
+    The signature index is built from DOCUMENT_TEXT_CHUNK on first use and
+    then kept in memory for the life of the deduplicator.
+    """
+
+    def __init__(
+            self,
+            rag_db: RagDb,
+            policy: str = appConfig.get("DEDUP_POLICY"),
+            max_distance: int = int(appConfig.get("DEDUP_MAX_DISTANCE")),
+            min_tokens: int = int(appConfig.get("DEDUP_MIN_TOKENS")),
+    ):
+        if policy not in DEDUP_POLICIES:
+            raise ValueError(f"Unknown dedup policy: {policy}")
+        self.rag_db = rag_db
+        self.policy = policy
+        self.max_distance = max_distance
+        self.min_tokens = min_tokens
+        self.checked = 0
+        self.duplicates = 0
+        self._index: Optional[SimHashIndex] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.policy != "off"
+
+    @property
+    def index(self) -> SimHashIndex:
+        if self._index is None:
+            self._index = SimHashIndex(self.max_distance)
+            self._index.add_many((chunk_id, to_unsigned(signature))
+                                 for chunk_id, signature in self.rag_db.chunk_signatures())
+            logger.info(f"Loaded {len(self._index)} chunk signatures for near-duplicate detection")
+        return self._index
+
+    def signature(self, text: str) -> Optional[int]:
+        return chunk_signature(text, self.min_tokens)
+
+    def assign(self, texts: Sequence[str], signatures: Sequence[Optional[int]] = None
+               ) -> Tuple[List[int], List[Optional[int]], List[Optional[int]]]:
+        """
+        Reserve chunk ids for ``texts`` and find the duplicates among them.
+
+        Originals are added to the index straight away, so later chunks, in
+        this batch or in documents still being embedded, match them.
+
+        :param signatures: precomputed ``signature`` values, e.g. from a split worker.
+        :return: ``(chunk_ids, signatures, duplicate_of)`` aligned with ``texts``;
+            signatures are in SQLite's signed range, ready to store.
+        """
+        chunk_ids = self.rag_db.reserve_chunk_ids(len(texts))
+        if signatures is None:
+            signatures = [self.signature(text) for text in texts]
+        duplicate_of, originals = [], []
+        for chunk_id, signature in zip(chunk_ids, signatures):
+            match = self.index.nearest(signature) if signature is not None else None
+            duplicate_of.append(match[0] if match else None)
+            if signature is not None and match is None:
+                originals.append((chunk_id, signature))
+        self.index.add_many(originals)
+        duplicates = sum(duplicate is not None for duplicate in duplicate_of)
+        self.checked += len(texts)
+        self.duplicates += duplicates
+        metrics.increment("rag_duplicate_chunks_total", duplicates, policy=self.policy)
+        stored = [to_signed(signature) if signature is not None else None for signature in signatures]
+        return chunk_ids, stored, duplicate_of
+
+    def insert_options(self, assignment) -> dict:
+        """``RagDb.insert_document_chunks`` keyword arguments for an ``assign`` result (None when off)."""
+        if assignment is None:
+            return {}
+        chunk_ids, signatures, duplicate_of = assignment
+        return {"chunk_ids": chunk_ids, "signatures": signatures, "duplicate_of": duplicate_of,
+                "index_duplicates": self.policy == "reuse"}
+
+    def discard(self, chunk_ids: Sequence[int]):
+        """Forget chunks that were assigned but never written."""
+        if self._index is not None:
+            self._index.remove(chunk_ids)
+
+    def stats(self) -> dict:
+        return {"checked": self.checked, "duplicates": self.duplicates,
+                "duplicate_rate": self.duplicates / self.checked if self.checked else 0.0}
+
+
+async def embed_originals(embedder, texts: Sequence[str], duplicate_of: Sequence[Optional[int]]
+                          ) -> List[Optional[List[float]]]:
+    """Embed only the texts that are not duplicates; duplicates get ``None``."""
+    embedded = iter(await embedder.embed_batch(
+        [text for text, duplicate in zip(texts, duplicate_of) if duplicate is None]))
+    return [next(embedded) if duplicate is None else None for duplicate in duplicate_of]
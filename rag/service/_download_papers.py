@@ -1,77 +1,301 @@
+import asyncio
 import logging
 import os
+import random
 import time
+import xml.etree.ElementTree as ET
+from typing import AsyncIterator, List, Optional, Tuple
 
-import requests
+import httpx
 
+from rag._config import appConfig
+from rag._metrics import metrics
 from rag._utils import get_filename_from_url, sanitize_filename
 
 logger = logging.getLogger(__name__)
 
-# Parameters
-search_query = "agent"  # Replace with desired search term or topic
-max_results = 5  # Adjust the number of papers you want to download
-output_folder = "data"  # Folder to store downloaded papers
-base_url = "http://export.arxiv.org/api/query?"
+ATOM = "{http://www.w3.org/2005/Atom}"
+OPENSEARCH = "{http://a9.com/-/spec/opensearch/1.1/}"
 
+# Download outcomes, counted in the run statistics and in rag_downloads_total.
+DOWNLOAD_STATUSES = ("downloaded", "resumed", "skipped", "failed")
+# Responses worth retrying: rate limited or a transient server error.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
 
-def fetch_arxiv_papers(search_query, max_results=5):
-    """Fetches metadata of papers from arXiv using the API."""
-    url = f"{base_url}search_query=all:{search_query}&start=0&max_results={max_results}"
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.text
 
-
-def parse_paper_links(response_text):
+def parse_paper_links(response_text) -> List[Tuple[str, str]]:
     """Parses paper links and titles from arXiv API response XML."""
-    import xml.etree.ElementTree as ET
+    return parse_feed(response_text)[0]
+
 
+def parse_feed(response_text) -> Tuple[List[Tuple[str, str]], Optional[int]]:
+    """
+    Parse one page of an arXiv API Atom feed.
+
+    :return: the ``(title, pdf_link)`` of each entry, and the total number of
+        results for the query when the feed reports it.
+    """
     root = ET.fromstring(response_text)
     papers = []
-    for entry in root.findall("{http://www.w3.org/2005/Atom}entry"):
-        pdf_link = None
-        for link in entry.findall("{http://www.w3.org/2005/Atom}link"):
+    for entry in root.findall(f"{ATOM}entry"):
+        for link in entry.findall(f"{ATOM}link"):
             if link.attrib.get("title") == "pdf":
                 pdf_link = link.attrib["href"] + ".pdf"
+                papers.append((get_filename_from_url(pdf_link), pdf_link))
                 break
-        if pdf_link:
-            title = get_filename_from_url(pdf_link)
-            print(title)
-            papers.append((title, pdf_link))
-    return papers
-
-
-def download_paper(title, pdf_link, output_folder):
-    """Downloads a single paper PDF."""
-    # Create a safe filename
-    safe_title = sanitize_filename(title)
-    filename = os.path.join(output_folder, f"{safe_title}.pdf")
-    response = requests.get(pdf_link, stream=True)
-    response.raise_for_status()
-
-    # Write the PDF to the specified folder
-    with open(filename, "wb") as file:
-        for chunk in response.iter_content(chunk_size=1024):
-            file.write(chunk)
-    print(f"Downloaded: {title}")
-
-
-def main(search_query, max_results):
-    # Create output folder if it doesn't exist
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-
-    # Fetch and parse papers
+    total = root.findtext(f"{OPENSEARCH}totalResults")
+    return papers, int(total) if total and total.strip().isdigit() else None
+
+
+def is_complete_pdf(file_path: str) -> bool:
+    """A PDF starts with ``%PDF-`` and ends with an ``%%EOF`` marker; a truncated one does not."""
+    try:
+        with open(file_path, "rb") as file:
+            if file.read(5) != b"%PDF-":
+                return False
+            file.seek(max(0, os.fstat(file.fileno()).st_size - 1024))
+            return b"%%EOF" in file.read()
+    except OSError:
+        return False
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket: on average ``rate`` acquisitions per second, with
+    bursts of up to ``capacity``. Waiters are served in arrival order. A rate
+    of 0 disables the limit.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class ArxivDownloader:
+    """
+    Bulk arXiv harvester and PDF downloader.
+
+    Search results are paged through the arXiv API ``page_size`` entries at a
+    time, at most one API call every ``api_interval`` seconds as arXiv asks.
+    Each page's PDFs are queued for ``concurrency`` download workers whose
+    requests are throttled by a shared token bucket of ``rate`` requests per
+    second, so harvesting the next page overlaps with downloading this one.
+
+    A PDF is written to ``<name>.pdf.part`` and only renamed into place once
+    it is complete, so a file already in ``output_folder`` that passes
+    ``is_complete_pdf`` is skipped. An interrupted or failed download keeps
+    its ``.part`` file and continues from its last byte with an HTTP Range
+    request, on retry or in a later run.
+
+    ``api_url`` is injectable, so the downloader can be pointed at a mirror or
+    at a local stub server; the PDF links are taken from the feed as given.
+    """
+
+    def __init__(
+            self,
+            output_folder: str = "data",
+            api_url: str = appConfig.get("ARXIV_API_URL"),
+            page_size: int = int(appConfig.get("ARXIV_PAGE_SIZE")),
+            concurrency: int = int(appConfig.get("ARXIV_DOWNLOAD_CONCURRENCY")),
+            rate: float = float(appConfig.get("ARXIV_DOWNLOAD_RATE")),
+            api_interval: float = float(appConfig.get("ARXIV_API_INTERVAL")),
+            timeout: float = 60.0,
+            max_retries: int = 3,
+            retry_backoff: float = 1.0,
+    ):
+        self.output_folder = output_folder
+        self.api_url = api_url
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.rate = rate
+        self.api_interval = api_interval
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.stats = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._downloads: Optional[TokenBucket] = None
+        self._api: Optional[TokenBucket] = None
+
+    def download(self, search_query: str, max_results: int) -> dict:
+        return asyncio.run(self.adownload(search_query, max_results))
+
+    async def adownload(self, search_query: str, max_results: int) -> dict:
+        """
+        Download the PDFs of the first ``max_results`` papers matching ``search_query``.
+
+        :return: the run's statistics: papers found, files per outcome, bytes
+            transferred and throughput.
+        """
+        os.makedirs(self.output_folder, exist_ok=True)
+        start = time.perf_counter()
+        self.stats = dict.fromkeys(DOWNLOAD_STATUSES, 0)
+        self.stats.update(found=0, bytes=0)
+        self._downloads = TokenBucket(self.rate)
+        self._api = TokenBucket(1 / self.api_interval if self.api_interval > 0 else 0, capacity=1)
+        async with httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout), follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.concurrency + 1,
+                                    max_keepalive_connections=self.concurrency + 1),
+        ) as self._client:
+            queue = asyncio.Queue(maxsize=self.page_size)
+            workers = [asyncio.create_task(self._download_worker(queue)) for _ in range(self.concurrency)]
+            try:
+                async for title, pdf_link in self.harvest(search_query, max_results):
+                    self.stats["found"] += 1
+                    await queue.put((title, pdf_link))
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+        self._client = None
+        elapsed = time.perf_counter() - start
+        fetched = self.stats["downloaded"] + self.stats["resumed"]
+        return {
+            **self.stats,
+            "seconds": elapsed,
+            "files_per_sec": fetched / elapsed if elapsed else 0.0,
+            "mb_per_sec": self.stats["bytes"] / 1e6 / elapsed if elapsed else 0.0,
+        }
+
+    async def harvest(self, search_query: str, max_results: int) -> AsyncIterator[Tuple[str, str]]:
+        """Yield ``(title, pdf_link)`` for up to ``max_results`` papers, one API page at a time."""
+        seen = set()
+        start = 0
+        total = None
+        empty_pages = 0
+        while len(seen) < max_results and (total is None or start < total):
+            page_size = min(self.page_size, max_results - len(seen))
+            papers, page_total = parse_feed(await self._fetch_page(search_query, start, page_size))
+            total = page_total if page_total is not None else total
+            if not papers:
+                # The arXiv API now and then returns an empty page mid-way; ask again.
+                empty_pages += 1
+                if total is None or empty_pages > self.max_retries:
+                    break
+                continue
+            empty_pages = 0
+            logger.info(f"Harvested {len(papers)} papers from offset {start} of {total}")
+            start += len(papers)
+            for title, pdf_link in papers:
+                # Results can shift between pages while paging; never yield a paper twice.
+                if pdf_link in seen or len(seen) >= max_results:
+                    continue
+                seen.add(pdf_link)
+                yield title, pdf_link
+
+    async def _fetch_page(self, search_query: str, start: int, max_results: int) -> str:
+        params = {"search_query": f"all:{search_query}", "start": start, "max_results": max_results}
+        response = await self._request("GET", self.api_url, self._api, params=params)
+        return response.text
+
+    async def _request(self, method: str, url: str, bucket: TokenBucket, **kwargs) -> httpx.Response:
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            try:
+                response = await self._client.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                error = httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request,
+                                              response=response)
+            except httpx.TransportError as e:
+                error = e
+            if attempt >= self.max_retries:
+                raise error
+            delay = self.retry_backoff * (2 ** attempt) * (1 + random.random())
+            attempt += 1
+            logger.warning(f"Request to {url} failed ({error!r}), retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def file_path(self, title: str) -> str:
+        return os.path.join(self.output_folder, f"{sanitize_filename(title)}.pdf")
+
+    async def _download_worker(self, queue: asyncio.Queue):
+        while (paper := await queue.get()) is not None:
+            title, pdf_link = paper
+            try:
+                with metrics.span("download"):
+                    status = await self.download_paper(title, pdf_link)
+            except Exception as e:
+                status = "failed"
+                logger.error(f"Failed to download '{title}' from {pdf_link}: {e!r}")
+            self.stats[status] += 1
+            metrics.increment("rag_downloads_total", status=status)
+
+    async def download_paper(self, title: str, pdf_link: str) -> str:
+        """
+        Download one PDF unless a complete copy is already present.
+
+        :return: ``"skipped"``, ``"downloaded"``, or ``"resumed"`` when an
+            earlier partial download was continued.
+        """
+        file_path = self.file_path(title)
+        if is_complete_pdf(file_path):
+            logger.debug(f"Already downloaded: {file_path}")
+            return "skipped"
+        part_path = file_path + ".part"
+        resumed = os.path.exists(part_path) and os.path.getsize(part_path) > 0
+        attempt = 0
+        while True:
+            try:
+                await self._fetch_to(pdf_link, part_path)
+                break
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                # The .part file keeps what arrived; the next attempt resumes from there.
+                retryable = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code in RETRY_STATUSES
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt) * (1 + random.random())
+                attempt += 1
+                resumed = resumed or os.path.exists(part_path) and os.path.getsize(part_path) > 0
+                logger.warning(f"Download of {pdf_link} failed ({e!r}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        if not is_complete_pdf(part_path):
+            os.remove(part_path)
+            raise ValueError(f"{pdf_link} is not a complete PDF")
+        os.replace(part_path, file_path)
+        logger.info(f"Downloaded: {title}")
+        return "resumed" if resumed else "downloaded"
+
+    async def _fetch_to(self, pdf_link: str, part_path: str):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        await self._downloads.acquire()
+        async with self._client.stream("GET", pdf_link, headers=headers) as response:
+            if response.status_code == 416:
+                # Nothing left past the offset: the part file already holds the whole PDF.
+                return
+            response.raise_for_status()
+            # A server that ignores the Range header sends the whole file again.
+            mode = "ab" if response.status_code == 206 else "wb"
+            with open(part_path, mode) as file:
+                async for data in response.aiter_bytes():
+                    file.write(data)
+                    self.stats["bytes"] += len(data)
+
+
+def main(search_query, max_results, output_folder="data"):
     print(f"Searching for papers on '{search_query}'...")
-    response_text = fetch_arxiv_papers(search_query, max_results)
-    papers = parse_paper_links(response_text)
-
-    # Download each paper
-    print(f"Found {len(papers)} papers. Starting download...")
-    for title, pdf_link in papers:
-        try:
-            download_paper(title, pdf_link, output_folder)
-            time.sleep(2)  # Pause to avoid hitting rate limits
-        except Exception as e:
-            print(f"Failed to download '{title}': {e}")
+    stats = ArxivDownloader(output_folder).download(search_query, max_results)
+    print(f"Found {stats['found']} papers: {stats['downloaded']} downloaded, {stats['resumed']} resumed, "
+          f"{stats['skipped']} already present, {stats['failed']} failed")
@@ -1,7 +1,14 @@
+import logging
+from typing import List, Optional, Sequence
+
 import requests
 import json
 
 from rag._config import appConfig
+from rag._metrics import metrics
+from rag.service._embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
 
 
 class EmbeddingService:
@@ -9,14 +16,83 @@ class EmbeddingService:
         self,
         model_name: str = appConfig.get("OLLAMA_EMBEDDING_MODEL"),
         base_url=appConfig.get("OLLAMA_URL"),
+        batch_size: int = int(appConfig.get("OLLAMA_EMBEDDING_BATCH_SIZE")),
+        cache: Optional[EmbeddingCache] = None,
     ):
         self.model_name = model_name
         self.base_url = base_url
+        self.batch_size = batch_size
+        self.cache = cache
 
     def embed(self, text: str):
-        return self.generate_embeddings(text=text, 
-                                        model=self.model_name,
-                                         base_url=self.base_url)["embedding"]
+        # Same endpoint as ingest, so query vectors are comparable to stored ones.
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Embed many texts with as few requests as possible.
+
+        The texts are sent to the list-input ``/api/embed`` endpoint in batches
+        of ``batch_size``. The result holds one entry per input text, in the
+        same order, so callers can zip it with their chunk ids. An entry is
+        ``None`` when that text could not be embedded. Texts found in the
+        embedding cache are not sent at all.
+
+        :param texts: the texts to embed.
+        :return: the embeddings, aligned with ``texts``.
+        """
+        if self.cache is None:
+            return self._embed_uncached(texts)
+        embeddings = self.cache.get_many(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        metrics.increment("rag_embeddings_total", len(texts) - len(missing), source="cache")
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            fresh = self._embed_uncached(missing_texts)
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+            self.cache.put_many(missing_texts, fresh)
+        return embeddings
+
+    def _embed_uncached(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        embeddings = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = list(texts[start:start + self.batch_size])
+            embeddings.extend(self._embed_with_fallback(batch))
+        metrics.increment("rag_embeddings_total", len(texts), source="model")
+        return embeddings
+
+    def _embed_with_fallback(self, texts: List[str]) -> List[Optional[List[float]]]:
+        # A rejected batch is split in half until the failing texts are isolated,
+        # so one bad chunk costs a few extra requests instead of the whole batch.
+        try:
+            return self.generate_batch_embeddings(texts, self.model_name, self.base_url)
+        except requests.ConnectionError:
+            logger.error(
+                "Failed to connect to the Ollama server. Make sure it is running locally and the URL is correct.")
+            return [None] * len(texts)
+        except (requests.RequestException, ValueError) as e:
+            if len(texts) == 1:
+                logger.warning(f"Failed to embed text (length {len(texts[0])}): {e}")
+                return [None]
+        middle = len(texts) // 2
+        return self._embed_with_fallback(texts[:middle]) + self._embed_with_fallback(texts[middle:])
+
+    @staticmethod
+    def generate_batch_embeddings(texts: List[str], model: str, base_url: str) -> List[List[float]]:
+        """
+        Generate embeddings for a list of texts in a single ``/api/embed`` request.
+
+        :raises requests.RequestException: if the request fails.
+        :raises ValueError: if the response does not hold one embedding per text.
+        """
+        url = f"{base_url}/api/embed"
+        response = requests.post(url, json={"model": model, "input": texts})
+        response.raise_for_status()
+        embeddings = response.json().get("embeddings") or []
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return embeddings
 
     @staticmethod
     def generate_embeddings(text, model, base_url):
@@ -27,29 +103,18 @@ class EmbeddingService:
             data = {"prompt": text, "model": model}
             response = requests.post(url, json=data)
 
-            # Check if the request was successful
             if response.status_code == 200:
-                # Parse the JSON response
-                embeddings = response.json()
-                print("Embeddings:")
-                pretty_json = json.dumps(embeddings, indent=4)
-                print(pretty_json)
-                return embeddings
-            else:
-                print(
-                    f"Failed to generate embeddings. Status code: {response.status_code}"
-                )
-                print("Response:", response.text)
-                return None
+                return response.json()
+            logger.error(f"Failed to generate embeddings. Status code: {response.status_code}")
+            return None
 
         except requests.ConnectionError:
-            print(
-                "Failed to connect to the Ollama server. Make sure it is running locally and the URL is correct."
-            )
+            logger.error(
+                "Failed to connect to the Ollama server. Make sure it is running locally and the URL is correct.")
             return None
         except json.JSONDecodeError:
-            print("Failed to parse JSON response from Ollama server.")
+            logger.error("Failed to parse JSON response from Ollama server.")
             return None
         except Exception as e:
-            print(f"An error occurred: {e}")
+            logger.error(f"An error occurred: {e}")
             return None
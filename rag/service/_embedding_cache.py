@@ -0,0 +1,108 @@
+import logging
+import time
+from typing import Dict, List, Optional, Sequence
+
+from sqlite_vec import serialize_float32
+
+from rag._config import appConfig
+from rag._database import RagDb
+from rag._utils import compute_text_hash, deserialize_float32
+
+logger = logging.getLogger(__name__)
+
+# Stay well below SQLite's bound parameter limit in IN (...) lookups.
+_LOOKUP_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache stored in the EMBEDDING_CACHE table.
+
+    Entries are keyed by (model name, dimensions, sha256 of the text), so the
+    same chunk text is embedded only once per model no matter which file it
+    came from. When the table grows past ``max_entries`` the least recently
+    used tenth is evicted.
+    """
+
+    def __init__(
+            self,
+            rag_db: RagDb,
+            model_name: str = appConfig.get("OLLAMA_EMBEDDING_MODEL"),
+            dimensions: int = int(appConfig.get("OLLAMA_EMBEDDING_DIMENSIONS")),
+            max_entries: int = int(appConfig.get("EMBEDDING_CACHE_MAX_ENTRIES")),
+    ):
+        self.rag_db = rag_db
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        (self.entries,) = self.rag_db.cur.execute("SELECT COUNT(*) FROM EMBEDDING_CACHE").fetchone()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return the cached embedding for each text, or ``None`` on a miss."""
+        hashes = [compute_text_hash(text) for text in texts]
+        found: Dict[str, bytes] = {}
+        for start in range(0, len(hashes), _LOOKUP_BATCH):
+            batch = list(set(hashes[start:start + _LOOKUP_BATCH]))
+            rows = self.rag_db.cur.execute(
+                f"""SELECT text_hash, embedding FROM EMBEDDING_CACHE
+                WHERE model = ? AND dimensions = ? AND text_hash IN ({",".join("?" * len(batch))})""",
+                (self.model_name, self.dimensions, *batch),
+            ).fetchall()
+            found.update(rows)
+        if found:
+            now = time.time()
+            self.rag_db.cur.executemany(
+                "UPDATE EMBEDDING_CACHE SET last_used = ? WHERE model = ? AND dimensions = ? AND text_hash = ?",
+                [(now, self.model_name, self.dimensions, text_hash) for text_hash in found],
+            )
+            self.rag_db.cn.commit()
+        embeddings = [deserialize_float32(found[text_hash]) if text_hash in found else None
+                      for text_hash in hashes]
+        hits = sum(embedding is not None for embedding in embeddings)
+        self.hits += hits
+        self.misses += len(embeddings) - hits
+        return embeddings
+
+    def put_many(self, texts: Sequence[str], embeddings: Sequence[Optional[Sequence[float]]]):
+        """Store embeddings for texts; ``None`` embeddings are ignored."""
+        now = time.time()
+        rows = [(self.model_name, self.dimensions, compute_text_hash(text), serialize_float32(list(embedding)), now)
+                for text, embedding in zip(texts, embeddings) if embedding is not None]
+        if not rows:
+            return
+        self.rag_db.cur.executemany(
+            """INSERT OR IGNORE INTO EMBEDDING_CACHE(model, dimensions, text_hash, embedding, last_used)
+            VALUES (?, ?, ?, ?, ?)""",
+            rows,
+        )
+        self.entries += self.rag_db.cur.rowcount
+        self.rag_db.cn.commit()
+        if self.entries > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache is at 90% of its limit."""
+        target = int(self.max_entries * 0.9)
+        (self.entries,) = self.rag_db.cur.execute("SELECT COUNT(*) FROM EMBEDDING_CACHE").fetchone()
+        excess = self.entries - target
+        if excess <= 0:
+            return
+        self.rag_db.cur.execute(
+            """DELETE FROM EMBEDDING_CACHE WHERE rowid IN (
+                SELECT rowid FROM EMBEDDING_CACHE ORDER BY last_used LIMIT ?)""",
+            (excess,),
+        )
+        self.rag_db.cn.commit()
+        self.entries -= excess
+        logger.info(f"Evicted {excess} embedding cache entries")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self.entries,
+        }
@@ -0,0 +1,266 @@
+import itertools
+import logging
+import multiprocessing
+import queue
+import re
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from rag._config import appConfig
+from rag._database import GraphDB
+from rag._metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the stream on the stage's queue.
+_DONE = None
+
+# Only the named entity recognizer (and the tok2vec layer it may listen to) is run.
+NER_COMPONENTS = ("tok2vec", "ner")
+
+# Numeric entity types link unrelated chunks ("2", "2023") and are left out of the graph.
+SKIPPED_LABELS = frozenset({"CARDINAL", "ORDINAL", "QUANTITY", "PERCENT", "MONEY", "DATE", "TIME"})
+
+# Co-occurrences are counted among at most this many distinct entities of a chunk.
+MAX_ENTITIES_PER_CHUNK = 32
+
+_SPACE = re.compile(r"\s+")
+_LEADING_ARTICLE = re.compile(r"^(the|a|an)\s+")
+
+# Per-process pipeline, loaded once by the extraction pool initializer.
+_nlp = None
+
+
+def normalize_entity(text: str) -> str:
+    """Canonical form of an entity mention: lower case, single spaces, no article or possessive."""
+    text = _SPACE.sub(" ", text.strip().lower())
+    text = _LEADING_ARTICLE.sub("", text)
+    if text.endswith("'s") or text.endswith("’s"):
+        text = text[:-2]
+    return text.strip(" .,;:\"'()[]")
+
+
+def entity_node_id(label: str, text: str) -> str:
+    return f"entity:{label}:{text}"
+
+
+def chunk_node_id(chunk_id: int) -> str:
+    return f"chunk:{chunk_id}"
+
+
+def load_pipeline(model: str):
+    """Load a spaCy model with everything but the recognizer disabled."""
+    import spacy
+
+    nlp = spacy.load(model)
+    nlp.select_pipes(enable=[name for name in nlp.pipe_names if name in NER_COMPONENTS])
+    # Chunks are much shorter than this; it only guards against a runaway text.
+    nlp.max_length = max(nlp.max_length, 2_000_000)
+    return nlp
+
+
+def document_entities(doc) -> List[Tuple[str, str]]:
+    """``[(label, normalized text), ...]`` of a parsed document, numeric entities left out."""
+    entities = []
+    for entity in doc.ents:
+        if entity.label_ in SKIPPED_LABELS:
+            continue
+        text = normalize_entity(entity.text)
+        if len(text) > 1:
+            entities.append((entity.label_, text))
+    return entities
+
+
+def _init_extractor(model: str):
+    global _nlp
+    _nlp = load_pipeline(model)
+
+
+def _extract_batch(texts: List[str]) -> List[List[Tuple[str, str]]]:
+    """Runs in an extraction worker process."""
+    return [document_entities(doc) for doc in _nlp.pipe(texts, batch_size=len(texts))]
+
+
+class EntityExtractor:
+    """
+    Named entity extraction with spaCy, tuned for throughput.
+
+    Everything but the recognizer is disabled. With one worker, texts are
+    streamed through ``nlp.pipe`` in batches of ``batch_size`` on the calling
+    thread. With more, batches go to a pool of ``workers`` spawned processes,
+    each loading the model once, with at most two batches per worker in
+    flight. spaCy's own ``n_process`` would fork, which is unsafe while the
+    ingest threads and their SQLite connections are live.
+    """
+
+    def __init__(
+            self,
+            model: str = appConfig.get("SPACY_MODEL"),
+            batch_size: int = int(appConfig.get("ENTITY_BATCH_SIZE")),
+            workers: int = int(appConfig.get("ENTITY_WORKERS")),
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.workers = workers
+        # The workers load their own copy; the parent only needs one when it extracts itself.
+        self.nlp = load_pipeline(model) if workers <= 1 else None
+
+    def extract(self, items: Iterable[Tuple[str, object]]) -> Iterator[Tuple[object, List[Tuple[str, str]]]]:
+        """
+        :param items: ``(text, context)`` pairs; the context is passed through.
+        :return: ``(context, [(label, normalized text), ...])`` per item, in order.
+        """
+        if self.nlp is not None:
+            for doc, context in self.nlp.pipe(items, as_tuples=True, batch_size=self.batch_size):
+                yield context, document_entities(doc)
+            return
+        items = iter(items)
+        with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_extractor, initargs=(self.model,)) as executor:
+            pending = deque()
+            while batch := list(itertools.islice(items, self.batch_size)):
+                texts, contexts = zip(*batch)
+                pending.append((contexts, executor.submit(_extract_batch, list(texts))))
+                if len(pending) > 2 * self.workers:
+                    contexts, future = pending.popleft()
+                    yield from zip(contexts, future.result())
+            while pending:
+                contexts, future = pending.popleft()
+                yield from zip(contexts, future.result())
+
+
+class EntityStage:
+    """
+    Optional ingest stage that feeds the knowledge graph.
+
+    Written chunks are handed over with ``submit`` and extracted on a
+    background thread, so ingest only waits on it when its bounded queue of
+    ``queue_size`` documents is full. For every chunk it records a
+    ``chunk:<id>`` node with a MENTIONS edge to each entity it names (weighted
+    by the number of mentions), and a CO_OCCURS edge between each pair of
+    entities named in the same chunk, whose weight counts the chunks they
+    share. Entities are nodes ``entity:<label>:<normalized text>``, so every
+    spelling of an entity that normalizes the same is one node. The graph is
+    written every ``write_batch`` chunks, one transaction per batch.
+
+    ``stats`` reports the stage's own throughput, separately from ingest, and
+    ``drain_seconds``, the time it ran on after ingest finished: near zero
+    while extraction keeps up.
+    """
+
+    def __init__(
+            self,
+            graph_db_path: str = appConfig.get("GRAPH_DATABASE_PATH"),
+            extractor: Optional[EntityExtractor] = None,
+            queue_size: int = 64,
+            write_batch: int = 2048,
+    ):
+        self.graph_db_path = graph_db_path
+        self.extractor = extractor
+        self.write_batch = write_batch
+        self.chunks = 0
+        self.mentions = 0
+        self.entities = set()
+        self.seconds = 0.0
+        self.drain_seconds = 0.0
+        self.error: Optional[BaseException] = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._drained = False
+        self._thread: Optional[threading.Thread] = None
+        self._started = None
+
+    def start(self) -> "EntityStage":
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="ingest-entities", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, document_id: int, chunk_ids: Sequence[int], texts: Sequence[str]):
+        if self.error is None:
+            self._queue.put((document_id, list(chunk_ids), list(texts)))
+
+    def close(self) -> dict:
+        """Wait for the submitted chunks to be written to the graph; return ``stats``."""
+        if self._thread is not None:
+            start = time.perf_counter()
+            self._queue.put(_DONE)
+            self._thread.join()
+            self._thread = None
+            # How long extraction kept running after the last chunk was submitted.
+            self.drain_seconds = time.perf_counter() - start
+        if self.error is not None:
+            logger.error(f"Entity extraction stopped early: {self.error!r}")
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {
+            "chunks": self.chunks,
+            "entities": len(self.entities),
+            "mentions": self.mentions,
+            "seconds": self.seconds,
+            "drain_seconds": self.drain_seconds,
+            "chunks_per_sec": self.chunks / self.seconds if self.seconds else 0.0,
+        }
+
+    def _items(self) -> Iterator[Tuple[str, Tuple[int, int]]]:
+        while (item := self._queue.get()) is not _DONE:
+            document_id, chunk_ids, texts = item
+            for chunk_id, text in zip(chunk_ids, texts):
+                yield text, (document_id, chunk_id)
+        self._drained = True
+
+    def _run(self):
+        try:
+            if self.extractor is None:
+                self.extractor = EntityExtractor()
+            graph_db = GraphDB(self.graph_db_path)
+            batch = []
+            for context, entities in self.extractor.extract(self._items()):
+                batch.append((context, entities))
+                if len(batch) >= self.write_batch:
+                    self._write(graph_db, batch)
+                    batch = []
+            self._write(graph_db, batch)
+            graph_db.close()
+        except BaseException as e:
+            self.error = e
+            # Keep draining, so producers blocked on the queue are released.
+            while not self._drained and self._queue.get() is not _DONE:
+                pass
+            self._drained = True
+        finally:
+            self.seconds = time.perf_counter() - self._started
+
+    def _write(self, graph_db: GraphDB, batch: List[Tuple[Tuple[int, int], List[Tuple[str, str]]]]):
+        if not batch:
+            return
+        nodes: Dict[str, dict] = {}
+        mentions: List[Tuple[str, str, str, float]] = []
+        co_occurrences = Counter()
+        for (document_id, chunk_id), entities in batch:
+            chunk_node = chunk_node_id(chunk_id)
+            nodes[chunk_node] = {"type": "chunk", "document_id": document_id}
+            counts = Counter(entity_node_id(label, text) for label, text in entities)
+            for (label, text) in entities:
+                nodes.setdefault(entity_node_id(label, text), {"type": "entity", "label": label, "name": text})
+            for node_id, count in counts.items():
+                mentions.append((chunk_node, node_id, "MENTIONS", float(count)))
+            # The most mentioned entities, in id order so each pair is counted under one key.
+            distinct = sorted(node_id for node_id, _ in counts.most_common(MAX_ENTITIES_PER_CHUNK))
+            co_occurrences.update(itertools.combinations(distinct, 2))
+        with metrics.span("entity_write"):
+            graph_db.upsert_nodes(nodes.items())
+            graph_db.upsert_edges(mentions, create_nodes=False)
+            graph_db.upsert_edges(((source, target, "CO_OCCURS", float(count))
+                                   for (source, target), count in co_occurrences.items()),
+                                  accumulate=True, create_nodes=False)
+        self.chunks += len(batch)
+        self.mentions += len(mentions)
+        self.entities.update(node_id for node_id, properties in nodes.items() if properties["type"] == "entity")
+        metrics.increment("rag_entity_chunks_total", len(batch))
+        metrics.increment("rag_entity_mentions_total", len(mentions))
+        logger.debug(f"Wrote {len(mentions)} mentions and {len(co_occurrences)} co-occurrences "
+                     f"of {len(batch)} chunks to the graph")
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+
+from rag._config import appConfig
+from rag._database import RagDb
+from rag._prompts import GRADER_PROMPT
+from rag._utils import compute_text_hash
+
+logger = logging.getLogger(__name__)
+
+
+class RelevanceGrader:
+    """
+    Filters retrieved chunks down to the ones an LLM grades relevant.
+
+    Grading one chunk per call in series would add a model round trip per
+    candidate, so candidates are graded concurrently, at most ``max_in_flight``
+    at a time, in rank order. Once ``target`` relevant chunks are known, every
+    candidate ranked below the last of them is cancelled or never started.
+    Grades are stored in RELEVANCE_GRADE keyed by (question hash, chunk id,
+    model), so a repeated question does not call the model again.
+
+    A candidate whose grade cannot be obtained is kept (and not cached): a
+    failing grader must not silently strip the answer's context.
+    """
+
+    def __init__(
+            self,
+            rag_db: RagDb,
+            model_name: str = appConfig.get("GRADER_MODEL"),
+            base_url: str = appConfig.get("OLLAMA_URL"),
+            max_in_flight: int = int(appConfig.get("GRADER_CONCURRENCY")),
+            timeout: float = float(appConfig.get("OLLAMA_REQUEST_TIMEOUT")),
+    ):
+        self.rag_db = rag_db
+        self.model_name = model_name
+        self.base_url = base_url
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+
+    def filter(self, question: str, results: List[dict], target: int) -> dict:
+        """Synchronous wrapper around ``afilter`` for callers without an event loop."""
+        return asyncio.run(self.afilter(question, results, target))
+
+    async def afilter(self, question: str, results: List[dict], target: int) -> dict:
+        """
+        Keep the best ranked relevant results.
+
+        :param results: search results, best first, each with chunk_id and text.
+        :param target: how many relevant results are wanted.
+        :return: ``{"results": [...], "stats": {...}}`` with at most ``target``
+            results in their original order, and counts of cached, graded,
+            relevant and skipped candidates plus the grading time.
+        """
+        start = time.perf_counter()
+        question_hash = compute_text_hash(question)
+        grades = self.cached_grades(question_hash, [result["chunk_id"] for result in results])
+        stats = {"cached": len(grades), "graded": 0, "skipped": 0}
+        fresh: Dict[int, bool] = {}
+
+        ranks = {result["chunk_id"]: rank for rank, result in enumerate(results)}
+
+        def cutoff() -> int:
+            # Rank of the target-th relevant chunk; candidates below it cannot be selected.
+            relevant = sorted(ranks[chunk_id] for chunk_id, grade in grades.items() if grade is not False)
+            return relevant[target - 1] if len(relevant) >= target else len(results)
+
+        pending = [result for result in results if result["chunk_id"] not in grades]
+        if pending and cutoff() == len(results):
+            slots = asyncio.Semaphore(self.max_in_flight)
+            async with httpx.AsyncClient(base_url=self.base_url, timeout=httpx.Timeout(self.timeout)) as client:
+
+                async def grade(result: dict):
+                    async with slots:
+                        return result["chunk_id"], await self._grade(client, question, result["text"])
+
+                tasks = {asyncio.create_task(grade(result)): result["chunk_id"] for result in pending}
+                cancelled = []
+                while tasks:
+                    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        del tasks[task]
+                        chunk_id, grade_value = task.result()
+                        grades[chunk_id] = grade_value
+                        stats["graded"] += 1
+                        if grade_value is not None:
+                            fresh[chunk_id] = grade_value
+                    limit = cutoff()
+                    for task, chunk_id in list(tasks.items()):
+                        if ranks[chunk_id] > limit:
+                            task.cancel()
+                            cancelled.append(task)
+                            del tasks[task]
+                            stats["skipped"] += 1
+                await asyncio.gather(*cancelled, return_exceptions=True)
+            self.store_grades(question_hash, fresh)
+        else:
+            stats["skipped"] = len(pending)
+
+        limit = cutoff()
+        kept = [result for rank, result in enumerate(results)
+                if rank <= limit and grades.get(result["chunk_id"]) is not False][:target]
+        stats["relevant"] = len(kept)
+        stats["seconds"] = time.perf_counter() - start
+        logger.info(f"Relevance grading kept {len(kept)} of {len(results)} chunks: {stats}")
+        return {"results": kept, "stats": stats}
+
+    async def _grade(self, client: httpx.AsyncClient, question: str, document: str) -> Optional[bool]:
+        try:
+            response = await client.post("/api/generate", json={
+                "model": self.model_name,
+                "prompt": GRADER_PROMPT.format(document=document, question=question),
+                # The prompt carries its own chat template tokens.
+                "raw": True,
+                "format": "json",
+                "stream": False,
+                "options": {"temperature": 0},
+            })
+            response.raise_for_status()
+            score = json.loads(response.json()["response"])["score"]
+            return str(score).strip().lower() == "yes"
+        except (httpx.HTTPError, KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Relevance grading failed, keeping the chunk: {e!r}")
+            return None
+
+    def cached_grades(self, question_hash: str, chunk_ids: Sequence[int]) -> Dict[int, bool]:
+        rows = self.rag_db.cur.execute(
+            """SELECT g.chunk_id, g.relevant FROM json_each(?) c
+            JOIN RELEVANCE_GRADE g ON g.question_hash = ? AND g.chunk_id = c.value AND g.model = ?""",
+            (json.dumps(list(chunk_ids)), question_hash, self.model_name),
+        ).fetchall()
+        return {chunk_id: bool(relevant) for chunk_id, relevant in rows}
+
+    def store_grades(self, question_hash: str, grades: Dict[int, bool]):
+        if not grades:
+            return
+        self.rag_db.cur.executemany(
+            """INSERT OR REPLACE INTO RELEVANCE_GRADE(question_hash, chunk_id, model, relevant)
+            VALUES (?, ?, ?, ?)""",
+            [(question_hash, chunk_id, self.model_name, int(relevant)) for chunk_id, relevant in grades.items()],
+        )
+        self.rag_db.cn.commit()
@@ -1,11 +1,24 @@
+import asyncio
+import io
 import logging
-import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
 
 from langchain_community.document_loaders import PyPDFLoader
 
-from rag._database import RagDb
+from rag._config import appConfig
+from rag._database import DocumentStatus, RagDb
+from rag._metrics import metrics
 from rag._models import Models
-from rag.service._embedding import EmbeddingService
+from rag.service._async_embedding import AsyncEmbeddingService
+from rag.service._dedup import ChunkDeduplicator, embed_originals
+from rag.service._embedding_cache import EmbeddingCache
+from rag.service._entities import EntityStage
+from rag.service._pipeline import IngestPipeline, originals
+from rag.service._scanner import FolderScanner
+from rag.split import get_splitter
 from rag.split._chonkie import SPDMSplitter
 
 
@@ -13,41 +26,278 @@ logger = logging.getLogger(__name__)
 
 
 class IngestService:
-    def __init__(self):
-        self.rag_db = RagDb()
+    def __init__(self, db_file: str = appConfig.get("DATABASE_PATH")):
+        self.rag_db = RagDb(db_file)
         self.models = Models()
-        self.embedder = EmbeddingService(self.models.ollama_embedding_model)
+        self.embedding_cache = EmbeddingCache(self.rag_db, self.models.ollama_embedding_model)
+        self.embedder = AsyncEmbeddingService(self.models.ollama_embedding_model,
+                                              cache=self.embedding_cache)
+        self.dedup = ChunkDeduplicator(self.rag_db)
+        self.entity_stage: Optional[EntityStage] = None
         self.llm = self.models.model_ollama
         self.data_folder = "./data"
 
-    def ingest_file(self, file_path: str):
+    def ingest_file(self, file_path: str, streaming: bool = False, entities: bool = False) -> dict:
+        with self._entities(entities):
+            stats = asyncio.run(self._ingest_files([(file_path, None)], streaming))
+        return self._with_entity_stats(stats)
+
+    def ingest_folder(self, data_folder: str, parse_workers: int = None,
+                      split_workers: int = None, embed_concurrency: int = None,
+                      streaming: bool = False, entities: bool = False) -> dict:
+        """
+        Ingest every new PDF below ``data_folder`` through the staged pipeline.
+
+        Worker counts left as ``None`` use the configured defaults. With
+        ``streaming`` the files are instead ingested one at a time, page by
+        page, which keeps memory flat for very large documents. Documents left
+        unfinished by an interrupted run resume after their last checkpoint.
+        With ``entities`` the chunks' named entities are also extracted into
+        the knowledge graph (see ``EntityStage``).
+
+        :return: the run's throughput statistics, with the entity stage's own
+            under ``"entities"``.
+        """
+        candidates = FolderScanner(self.rag_db).scan(data_folder)
+        with self._entities(entities):
+            if streaming:
+                stats = asyncio.run(self._ingest_files(candidates, streaming=True))
+            else:
+                documents = [(file_path, *self.rag_db.register_document(file_path, file_hash))
+                             for file_path, file_hash in candidates]
+                options = {"parse_workers": parse_workers, "split_workers": split_workers,
+                           "embed_concurrency": embed_concurrency}
+                pipeline = IngestPipeline(self.rag_db.db_file, embedding_model=self.models.ollama_embedding_model,
+                                          entity_stage=self.entity_stage,
+                                          **{name: value for name, value in options.items() if value})
+                stats = pipeline.run(documents)
+        return self._with_entity_stats(stats)
+
+    @contextmanager
+    def _entities(self, enabled: bool):
+        """Run the entity stage alongside the enclosed ingest, and wait for it to finish."""
+        if not enabled:
+            yield
+            return
+        self.entity_stage = EntityStage().start()
+        try:
+            yield
+        finally:
+            self.entity_stage.close()
+
+    def _with_entity_stats(self, stats: dict) -> dict:
+        if self.entity_stage is not None:
+            stats["entities"] = self.entity_stage.stats()
+            self.entity_stage = None
+        return stats
+
+    async def _ingest_files(self, candidates: List[Tuple[str, Optional[str]]], streaming: bool = False) -> dict:
+        start = time.perf_counter()
+        files = chunks = failed = 0
+        ingest = self.aingest_file_streaming if streaming else self.aingest_file
+        # One client for the whole run so the keep-alive connections are reused.
+        async with self.embedder:
+            for file_path, file_hash in candidates:
+                try:
+                    chunk_count = await ingest(file_path, file_hash)
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Failed to ingest {file_path}: {e!r}")
+                    continue
+                if chunk_count is not None:
+                    files += 1
+                    chunks += chunk_count
+        logger.info(f"Embedding cache: {self.embedding_cache.stats()}")
+        if self.dedup.enabled:
+            logger.info(f"Near-duplicate chunks: {self.dedup.stats()}")
+        metrics.increment("rag_files_total", files, status="done")
+        metrics.increment("rag_files_total", failed, status="failed")
+        metrics.increment("rag_chunks_total", chunks)
+        elapsed = time.perf_counter() - start
+        return {
+            "files": files,
+            "chunks": chunks,
+            "failed": failed,
+            "duplicates": self.dedup.duplicates,
+            "seconds": elapsed,
+            "files_per_sec": files / elapsed if elapsed else 0.0,
+            "chunks_per_sec": chunks / elapsed if elapsed else 0.0,
+        }
+
+    def _start_document(self, file_path: str, file_hash: Optional[str]) -> Tuple[int, int]:
+        document_id, pages_done = self.rag_db.register_document(file_path, file_hash)
+        self.rag_db.set_document_status(document_id, DocumentStatus.INGESTING)
+        logger.info(f"Ingesting file {file_path} with id {document_id} from page {pages_done}")
+        return document_id, pages_done
+
+    async def aingest_file(self, file_path: str, file_hash: str = None):
+        """
+        Ingest one PDF with embedding overlapped with parsing and DB writes.
+
+        Pages are parsed and split in a worker thread while earlier chunk
+        batches are being embedded. Batches wait on a bounded queue, so parsing
+        cannot run arbitrarily far ahead of the embedding server. Near-duplicates
+        of chunks already seen are never queued. The chunks, FTS rows and
+        vectors are then written in a single transaction.
+        """
         # Skip non-PDF files
         if not file_path.lower().endswith('.pdf'):
-            print(f"Skipping non-PDF file: {file_path}")
+            logger.info(f"Skipping non-PDF file: {file_path}")
             return
 
-        print(f"Starting to ingest file: {file_path}")
         loader = PyPDFLoader(file_path)
-        file_id = self.rag_db.insert_document(file_path)
-        logger.info(f"Inserted file {file_path} with id {file_id}")
-        documents = loader.load()
-        pdf_text = "\n".join([doc.page_content for doc in documents])
-        self.rag_db.insert_document_text(file_id, pdf_text)
-        logger.info(f"Inserted document text for file {file_path}")
-
-        text_splitter = SPDMSplitter()
-        for doc in documents:
-            chunks = text_splitter.split(doc.page_content)
-            logger.info(f"Splitted document into {len(chunks)} chunks")
-            for chunk in chunks:
-                chunk_id = self.rag_db.insert_document_text(file_id, chunk.text)
-                logger.info(f"Inserted document text chunk {chunk_id} for file {file_path}")
-                embedding = self.embedder.embed(chunk.text)
-                logger.info(f"Created embedding for chunk {chunk_id}")
-                self.rag_db.insert_document_embedding(chunk_id, embedding)
-
-    def ingest_folder(self, data_folder: str):
-        for filename in os.listdir(data_folder):
-            file_path = os.path.join(data_folder, filename)
-            if not self.rag_db.contains_document(file_path):
-                self.ingest_file(file_path)
+        file_id, pages_done = self._start_document(file_path, file_hash)
+        # Ids handed out by the deduplicator page by page; a failure anywhere before
+        # the chunks are written must give them back.
+        chunk_ids, written = [], False
+        try:
+            queue = asyncio.Queue(maxsize=self.embedder.max_in_flight)
+            embedded = {}
+            workers = [asyncio.create_task(self._embed_worker(queue, embedded))
+                       for _ in range(self.embedder.max_in_flight)]
+            try:
+                text_splitter = await asyncio.to_thread(get_splitter, SPDMSplitter)
+                pages = loader.lazy_load()
+                page_texts, spans = [], []
+                chunk_texts, signatures, duplicate_of = [], [], []
+                # Character offset of the current page in the "\n"-joined full text.
+                offset = 0
+                batch_texts, batch_count = [], 0
+                while (doc := await asyncio.to_thread(self._parse_page, pages)) is not None:
+                    page_texts.append(doc.page_content)
+                    page_offset, offset = offset, offset + len(doc.page_content) + 1
+                    if len(page_texts) <= pages_done:
+                        continue
+                    with metrics.span("split"):
+                        chunks = await asyncio.to_thread(text_splitter.split, doc.page_content)
+                    logger.debug(f"Split page {len(page_texts)} into {len(chunks)} chunks")
+                    spans.extend(RagDb.chunk_spans(chunks, page_offset))
+                    texts = [chunk.text for chunk in chunks]
+                    chunk_texts.extend(texts)
+                    duplicates = [None] * len(texts)
+                    if self.dedup.enabled:
+                        ids, page_signatures, duplicates = self.dedup.assign(texts)
+                        chunk_ids.extend(ids)
+                        signatures.extend(page_signatures)
+                    duplicate_of.extend(duplicates)
+                    for text, duplicate in zip(texts, duplicates):
+                        if duplicate is not None:
+                            continue
+                        batch_texts.append(text)
+                        if len(batch_texts) >= self.embedder.batch_size:
+                            await queue.put((batch_count, batch_texts))
+                            batch_texts, batch_count = [], batch_count + 1
+                if batch_texts:
+                    await queue.put((batch_count, batch_texts))
+                    batch_count += 1
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+
+            # Batches finish out of order; reassemble them before the single bulk write.
+            vectors = iter([vector for batch in range(batch_count) for vector in embedded.pop(batch)[1]])
+            embeddings = [next(vectors) if duplicate is None else None for duplicate in duplicate_of]
+            assignment = (chunk_ids, signatures, duplicate_of) if self.dedup.enabled else None
+            with metrics.span("write"):
+                pdf_text = "\n".join(page_texts)
+                self.rag_db.insert_document_full_text(file_id, io.BytesIO(pdf_text.encode("utf-8")))
+                chunk_ids = self.rag_db.insert_document_chunks(file_id, chunk_texts, embeddings, spans,
+                                                               pages_done=len(page_texts),
+                                                               **self.dedup.insert_options(assignment))
+                written = True
+                self.rag_db.complete_document(file_id)
+            if self.entity_stage is not None:
+                self.entity_stage.submit(file_id, *originals(chunk_ids, chunk_texts, assignment))
+            missing = sum(embedding is None and duplicate is None
+                          for embedding, duplicate in zip(embeddings, duplicate_of))
+            if missing:
+                logger.warning(f"No embedding for {missing} chunks of {file_path}, "
+                               f"they will not be searchable by vector")
+        except BaseException:
+            if not written:
+                self.dedup.discard(chunk_ids)
+            self.rag_db.set_document_status(file_id, DocumentStatus.FAILED)
+            raise
+        logger.info(f"Ingested file {file_path}")
+        return len(chunk_ids)
+
+    async def aingest_file_streaming(self, file_path: str, file_hash: str = None):
+        """
+        Ingest one PDF a page at a time with memory independent of its size.
+
+        Each page is split, embedded and written before the next page is kept;
+        only the following page is parsed ahead. Every page write also moves the
+        document's checkpoint, so an interrupted run resumes at the next page.
+        The page texts are spooled to a temporary file and compressed into
+        DOCUMENT_FULL_TEXT incrementally at the end, so the full text is never
+        held in memory either; until then the chunks are searchable but not
+        hydrated.
+        """
+        if not file_path.lower().endswith('.pdf'):
+            logger.info(f"Skipping non-PDF file: {file_path}")
+            return
+
+        loader = PyPDFLoader(file_path)
+        file_id, pages_done = self._start_document(file_path, file_hash)
+        try:
+            text_splitter = await asyncio.to_thread(get_splitter, SPDMSplitter)
+            pages = loader.lazy_load()
+            chunk_count = 0
+            with tempfile.TemporaryFile() as full_text:
+                next_page = asyncio.create_task(asyncio.to_thread(self._parse_page, pages))
+                page_number = offset = 0
+                while (doc := await next_page) is not None:
+                    next_page = asyncio.create_task(asyncio.to_thread(self._parse_page, pages))
+                    if page_number:
+                        full_text.write(b"\n")
+                        offset += 1
+                    full_text.write(doc.page_content.encode("utf-8"))
+                    page_offset, offset = offset, offset + len(doc.page_content)
+                    page_number += 1
+                    if page_number <= pages_done:
+                        continue
+                    with metrics.span("split"):
+                        chunks = await asyncio.to_thread(text_splitter.split, doc.page_content)
+                    chunk_texts = [chunk.text for chunk in chunks]
+                    assignment = self.dedup.assign(chunk_texts) if self.dedup.enabled else None
+                    duplicate_of = assignment[2] if assignment else [None] * len(chunk_texts)
+                    try:
+                        with metrics.span("embed"):
+                            embeddings = await embed_originals(self.embedder, chunk_texts, duplicate_of)
+                        with metrics.span("write"):
+                            chunk_ids = self.rag_db.insert_document_chunks(
+                                file_id, chunk_texts, embeddings, RagDb.chunk_spans(chunks, page_offset),
+                                pages_done=page_number, **self.dedup.insert_options(assignment))
+                    except BaseException:
+                        if assignment:
+                            self.dedup.discard(assignment[0])
+                        raise
+                    if self.entity_stage is not None:
+                        self.entity_stage.submit(file_id, *originals(chunk_ids, chunk_texts, assignment))
+                    chunk_count += len(chunk_texts)
+                    logger.debug(f"Ingested page {page_number} of {file_path}: {len(chunk_texts)} chunks")
+                with metrics.span("write"):
+                    self.rag_db.insert_document_full_text(file_id, full_text)
+                    self.rag_db.complete_document(file_id)
+        except BaseException:
+            self.rag_db.set_document_status(file_id, DocumentStatus.FAILED)
+            raise
+        logger.info(f"Ingested file {file_path}")
+        return chunk_count
+
+    @staticmethod
+    def _parse_page(pages):
+        # Runs in a worker thread, so the span measures only the parsing itself.
+        with metrics.span("parse"):
+            return next(pages, None)
+
+    async def _embed_worker(self, queue: asyncio.Queue, embedded: dict):
+        while (batch := await queue.get()) is not None:
+            batch_number, chunk_texts = batch
+            with metrics.span("embed"):
+                embeddings = await self.embedder.embed_batch(chunk_texts)
+            logger.debug(f"Created {len(embeddings)} embeddings for batch {batch_number}")
+            embedded[batch_number] = (chunk_texts, embeddings)
@@ -22,9 +22,15 @@ class OllamaService:
     @staticmethod
     def chat_with_model(model: str, messages):
         response = ollama.chat(model, messages)
-        logger.info(response)
+        logger.debug(f"Chat with {model}: {response.get('eval_count')} tokens "
+                     f"in {(response.get('total_duration') or 0) / 1e9:.2f}s")
         return response
 
+    @staticmethod
+    def stream_chat(model: str, messages):
+        """Yield response chunks as the model generates them; the last one has done=True."""
+        return ollama.chat(model, messages, stream=True)
+
     @staticmethod
     def clean_text(text: str) -> str:
         """
@@ -56,7 +62,7 @@ class OllamaService:
             " ".join(tokens[i: i + self.window_size])
             for i in range(0, len(tokens) - self.window_size + step, step)
         ]
-        logger.info(chunks)
+        logger.debug(f"Split {len(tokens)} tokens into {len(chunks)} windows")
         return chunks
 
     @staticmethod
@@ -66,7 +72,7 @@ class OllamaService:
 
     @staticmethod
     def create_embedding(model: str, text: str):
-        logger.info(f"Creating embedding for {text} with model {model}")
+        logger.debug(f"Creating embedding for text (length {len(text)}) with model {model}")
         return ollama.embed(model, text)
 
     @staticmethod
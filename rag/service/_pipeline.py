@@ -0,0 +1,330 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from rag._config import appConfig
+from rag._database import DocumentStatus, RagDb
+from rag._metrics import STAGE_SECONDS, metrics, timed_call
+from rag.service._async_embedding import AsyncEmbeddingService
+from rag.service._dedup import ChunkDeduplicator, embed_originals
+from rag.service._embedding_cache import EmbeddingCache
+from rag.service._entities import EntityStage
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the stream on every inter-stage queue.
+_DONE = None
+
+# Per-process splitter, built once by the split pool initializer.
+_splitter = None
+# Minimum words for a chunk to get a SimHash signature; None when dedup is off.
+_signature_min_tokens = None
+
+
+def _parse_pdf(document):
+    """Parse stage: runs in a worker process and returns plain page texts."""
+    from langchain_community.document_loaders import PyPDFLoader
+
+    file_path, _, _ = document
+    return document, [doc.page_content for doc in PyPDFLoader(file_path).lazy_load()]
+
+
+def _init_splitter(signature_min_tokens: int = None):
+    global _splitter, _signature_min_tokens
+    from rag.split import get_splitter
+    from rag.split._chonkie import SPDMSplitter
+
+    _splitter = get_splitter(SPDMSplitter)
+    _signature_min_tokens = signature_min_tokens
+
+
+def _split_pages(item):
+    """Split stage: runs in a worker process and returns chunk texts, spans and signatures."""
+    document, page_texts = item
+    _, _, pages_done = document
+    # Character offset of each page in the "\n"-joined full text.
+    offsets = [0]
+    for page_text in page_texts:
+        offsets.append(offsets[-1] + len(page_text) + 1)
+    chunk_texts, spans = [], []
+    # Pages before the checkpoint were stored by an earlier, interrupted run.
+    for offset, chunks in zip(offsets[pages_done:], _splitter.split_many(page_texts[pages_done:])):
+        chunk_texts.extend(chunk.text for chunk in chunks)
+        spans.extend(RagDb.chunk_spans(chunks, offset))
+    signatures = None
+    if _signature_min_tokens is not None:
+        from rag._simhash import chunk_signature
+
+        signatures = [chunk_signature(text, _signature_min_tokens) for text in chunk_texts]
+    return document, page_texts, chunk_texts, spans, signatures
+
+
+def document_of(item) -> Tuple[str, int, int]:
+    """The ``(file_path, document_id, pages_done)`` an item on any of the stage queues belongs to."""
+    return item if isinstance(item[0], str) else item[0]
+
+
+def originals(chunk_ids: List[int], chunk_texts: List[str], assignment) -> Tuple[List[int], List[str]]:
+    """The ids and texts of the chunks that are not near-duplicates of earlier ones."""
+    if not assignment:
+        return chunk_ids, chunk_texts
+    duplicate_of = assignment[2]
+    kept = [index for index, duplicate in enumerate(duplicate_of) if duplicate is None]
+    return [chunk_ids[index] for index in kept], [chunk_texts[index] for index in kept]
+
+
+class IngestPipeline:
+    """
+    Staged ingest: parse -> split -> embed -> write, joined by bounded queues.
+
+    PDF parsing and chunking run in process pools, embedding runs as
+    concurrent asyncio I/O, and a single writer thread owns the SQLite
+    connection. Each queue holds at most ``queue_size`` documents, so a fast
+    stage blocks instead of buffering the whole corpus in memory. Near-duplicate
+    chunks are found between splitting and embedding, and are not embedded.
+    With an ``entity_stage``, written chunks are also passed on to it for
+    entity extraction, which runs alongside and is waited for at the end.
+    """
+
+    def __init__(
+            self,
+            db_file: str = appConfig.get("DATABASE_PATH"),
+            parse_workers: int = int(appConfig.get("INGEST_PARSE_WORKERS")),
+            split_workers: int = int(appConfig.get("INGEST_SPLIT_WORKERS")),
+            embed_concurrency: int = int(appConfig.get("OLLAMA_EMBEDDING_CONCURRENCY")),
+            embedding_model: str = appConfig.get("OLLAMA_EMBEDDING_MODEL"),
+            dedup_policy: str = appConfig.get("DEDUP_POLICY"),
+            dedup_min_tokens: int = int(appConfig.get("DEDUP_MIN_TOKENS")),
+            entity_stage: Optional[EntityStage] = None,
+            queue_size: int = 4,
+    ):
+        self.db_file = db_file
+        self.parse_workers = parse_workers
+        self.split_workers = split_workers
+        self.embed_concurrency = embed_concurrency
+        self.embedding_model = embedding_model
+        self.dedup_policy = dedup_policy
+        self.dedup_min_tokens = dedup_min_tokens
+        self.entity_stage = entity_stage
+        self.queue_size = queue_size
+        self.dedup = None
+        self.files = 0
+        self.chunks = 0
+        self.failed = 0
+        self._failed_lock = threading.Lock()
+        # Failed documents whose status is still to be set to FAILED.
+        self._unmarked = []
+
+    def run(self, documents: List[Tuple[str, int, int]]) -> dict:
+        """
+        Ingest registered documents and return throughput statistics.
+
+        :param documents: ``(file_path, document_id, pages_done)`` tuples, as
+            returned by ``RagDb.register_document``.
+        """
+        start = time.perf_counter()
+        paths = queue.Queue()
+        for document in documents:
+            paths.put(document)
+        paths.put(_DONE)
+        parsed = queue.Queue(maxsize=self.queue_size)
+        split = queue.Queue(maxsize=self.queue_size)
+        embedded = queue.Queue(maxsize=self.queue_size)
+
+        # Spawned workers: forking while the stage threads run could copy held locks.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.parse_workers, mp_context=context) as parse_pool, \
+                ProcessPoolExecutor(self.split_workers, mp_context=context, initializer=_init_splitter,
+                                    initargs=(self.dedup_min_tokens if self.dedup_policy != "off" else None,)
+                                    ) as split_pool:
+            stages = [
+                threading.Thread(target=self._pool_stage, name="ingest-parse",
+                                 args=("parse", parse_pool, _parse_pdf, paths, parsed, self.parse_workers * 2)),
+                threading.Thread(target=self._pool_stage, name="ingest-split",
+                                 args=("split", split_pool, _split_pages, parsed, split,
+                                       self.split_workers * 2)),
+                threading.Thread(target=lambda: asyncio.run(self._embed_stage(split, embedded)),
+                                 name="ingest-embed"),
+                threading.Thread(target=self._write_stage, name="ingest-write", args=(embedded,)),
+            ]
+            for stage in stages:
+                stage.start()
+            for stage in stages:
+                stage.join()
+        if self._unmarked:
+            rag_db = RagDb(self.db_file)
+            self._mark_failed(rag_db, self._unmarked)
+            rag_db.cn.close()
+
+        elapsed = time.perf_counter() - start
+        metrics.increment("rag_files_total", self.files, status="done")
+        metrics.increment("rag_files_total", self.failed, status="failed")
+        metrics.increment("rag_chunks_total", self.chunks)
+        return {
+            "files": self.files,
+            "chunks": self.chunks,
+            "failed": self.failed,
+            "duplicates": self.dedup.duplicates if self.dedup else 0,
+            "seconds": elapsed,
+            "files_per_sec": self.files / elapsed if elapsed else 0.0,
+            "chunks_per_sec": self.chunks / elapsed if elapsed else 0.0,
+        }
+
+    def _fail(self, documents: Sequence[Tuple[str, int, int]], marked: bool = False):
+        # Every stage thread reports its failed documents here; run() marks the unmarked ones FAILED.
+        with self._failed_lock:
+            self.failed += len(documents)
+            if not marked:
+                self._unmarked.extend(documents)
+
+    @staticmethod
+    def _mark_failed(rag_db: RagDb, documents: Sequence[Tuple[str, int, int]]) -> bool:
+        # The error that failed the documents (e.g. "database is locked") may well fail this too.
+        try:
+            for _, document_id, _ in documents:
+                rag_db.set_document_status(document_id, DocumentStatus.FAILED)
+        except Exception as e:
+            logger.error(f"Could not mark {len(documents)} documents as failed: {e!r}")
+            return False
+        return True
+
+    @staticmethod
+    def _drain(source: queue.Queue) -> List[Tuple[str, int, int]]:
+        """Drop the items left on ``source``, so the stage feeding it is not blocked; return their documents."""
+        documents = []
+        while (item := source.get()) is not _DONE:
+            documents.append(document_of(item))
+        return documents
+
+    def _pool_stage(self, stage: str, executor: Executor, fn: Callable, source: queue.Queue,
+                    sink: queue.Queue, max_pending: int):
+        # Workers time themselves: measured here, the span would include the queueing.
+        # Submitted future -> its queue item.
+        pending = {}
+        done_reading = False
+        try:
+            while not done_reading or pending:
+                while not done_reading and len(pending) < max_pending:
+                    item = source.get()
+                    if item is _DONE:
+                        done_reading = True
+                    else:
+                        pending[executor.submit(timed_call, fn, item)] = item
+                if not pending:
+                    continue
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    item = pending.pop(future)
+                    try:
+                        result, seconds = future.result()
+                    except Exception as e:
+                        self._fail([document_of(item)])
+                        logger.error(f"Ingest stage {fn.__name__} failed on {document_of(item)[0]}: {e!r}")
+                        continue
+                    metrics.observe(STAGE_SECONDS, seconds, stage=stage)
+                    sink.put(result)
+        except Exception as e:
+            logger.error(f"Ingest stage {stage} stopped: {e!r}")
+            self._fail([document_of(item) for item in pending.values()]
+                       + ([] if done_reading else self._drain(source)))
+        finally:
+            # Always sent, or the stages downstream would wait forever.
+            sink.put(_DONE)
+
+    async def _embed_stage(self, source: queue.Queue, sink: queue.Queue):
+        # Several documents may be embedding at once; the client's semaphore
+        # still caps the number of requests in flight.
+        documents = asyncio.Semaphore(self.queue_size)
+        tasks = set()
+        done_reading = False
+
+        async def embed_document(embedder, item, assignment):
+            document, page_texts, chunk_texts, spans, _ = item
+            try:
+                duplicate_of = assignment[2] if assignment else [None] * len(chunk_texts)
+                with metrics.span("embed"):
+                    embeddings = await embed_originals(embedder, chunk_texts, duplicate_of)
+                await asyncio.to_thread(
+                    sink.put, (document, page_texts, chunk_texts, spans, embeddings, assignment))
+            except Exception as e:
+                self._fail([document])
+                logger.error(f"Failed to embed {document[0]}: {e!r}")
+                if assignment:
+                    self.dedup.discard(assignment[0])
+            finally:
+                documents.release()
+
+        try:
+            rag_db = RagDb(self.db_file)
+            cache = EmbeddingCache(rag_db, self.embedding_model)
+            self.dedup = ChunkDeduplicator(rag_db, self.dedup_policy, min_tokens=self.dedup_min_tokens)
+            embedder = AsyncEmbeddingService(self.embedding_model, max_in_flight=self.embed_concurrency,
+                                             cache=cache)
+            async with embedder:
+                while (item := await asyncio.to_thread(source.get)) is not _DONE:
+                    await documents.acquire()
+                    try:
+                        # In arrival order, so a chunk can match chunks of documents still being embedded.
+                        assignment = self.dedup.assign(item[2], item[4]) if self.dedup.enabled else None
+                    except Exception as e:
+                        self._fail([item[0]])
+                        logger.error(f"Failed to check {item[0][0]} for near-duplicates: {e!r}")
+                        documents.release()
+                        continue
+                    task = asyncio.create_task(embed_document(embedder, item, assignment))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                done_reading = True
+                await asyncio.gather(*tasks)
+            logger.info(f"Embedding cache: {cache.stats()}")
+            if self.dedup.enabled:
+                logger.info(f"Near-duplicate chunks: {self.dedup.stats()}")
+        except Exception as e:
+            logger.error(f"Ingest stage embed stopped: {e!r}")
+            if not done_reading:
+                self._fail(await asyncio.to_thread(self._drain, source))
+        finally:
+            # Documents already embedding are handed on (or fail) before the end marker.
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.to_thread(sink.put, _DONE)
+
+    def _write_stage(self, source: queue.Queue):
+        rag_db = None
+        try:
+            rag_db = RagDb(self.db_file)
+            while (item := source.get()) is not _DONE:
+                document, page_texts, chunk_texts, spans, embeddings, assignment = item
+                file_path, document_id, _ = document
+                # There is no assignment when near-duplicate detection is off.
+                options = self.dedup.insert_options(assignment) if assignment else {}
+                try:
+                    with metrics.span("write"):
+                        rag_db.set_document_status(document_id, DocumentStatus.INGESTING)
+                        rag_db.insert_document_full_text(document_id,
+                                                         io.BytesIO("\n".join(page_texts).encode("utf-8")))
+                        chunk_ids = rag_db.insert_document_chunks(document_id, chunk_texts, embeddings, spans,
+                                                                  pages_done=len(page_texts), **options)
+                        rag_db.complete_document(document_id)
+                except Exception as e:
+                    logger.error(f"Failed to write {file_path}: {e!r}")
+                    self._fail([document], marked=self._mark_failed(rag_db, [document]))
+                    if assignment:
+                        self.dedup.discard(assignment[0])
+                    continue
+                self.files += 1
+                self.chunks += len(chunk_texts)
+                logger.debug(f"Ingested {file_path}: {len(chunk_texts)} chunks")
+                if self.entity_stage is not None:
+                    self.entity_stage.submit(document_id, *originals(chunk_ids, chunk_texts, assignment))
+        except Exception as e:
+            logger.error(f"Ingest stage write stopped: {e!r}")
+            self._fail(self._drain(source))
+        finally:
+            if rag_db is not None:
+                rag_db.cn.close()
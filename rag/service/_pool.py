@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from rag._config import appConfig
+from rag._database import RagDb
+
+logger = logging.getLogger(__name__)
+
+
+class RagDbPool:
+    """
+    A thread pool whose threads each own a warm ``RagDb``.
+
+    A sqlite3 connection must stay on the thread that opened it, and opening one
+    (with the sqlite_vec extension load and pragmas) is too slow to repeat per
+    request. Each pool thread therefore builds its state once, with
+    ``factory(db_file)``, and keeps it for the life of the pool. ``run`` moves
+    blocking database and retrieval work off the event loop onto those threads.
+    ``close`` closes each state, with its ``close()`` or, for a ``RagDb``, its
+    connection.
+    """
+
+    def __init__(
+            self,
+            db_file: str = appConfig.get("DATABASE_PATH"),
+            workers: int = int(appConfig.get("SERVER_WORKERS")),
+            factory: Callable[[str], Any] = RagDb,
+    ):
+        self.db_file = db_file
+        self.workers = workers
+        self.factory = factory
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="rag-db",
+                                            initializer=self._init_thread)
+
+    def _init_thread(self):
+        self._local.state = self.factory(self.db_file)
+
+    def _call(self, fn: Callable, args: tuple):
+        return fn(self._local.state, *args)
+
+    def warm(self):
+        """Start every thread now, so no request pays for opening a connection."""
+        barrier = threading.Barrier(self.workers)
+        for future in [self._executor.submit(barrier.wait) for _ in range(self.workers)]:
+            future.result()
+        logger.info(f"Warmed {self.workers} connections to {self.db_file}")
+
+    async def run(self, fn: Callable, *args):
+        """Run ``fn(state, *args)`` on a pool thread and await its result."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, fn, args)
+
+    def _close_thread(self, barrier: threading.Barrier):
+        barrier.wait()
+        state = self._local.state
+        if hasattr(state, "close"):
+            state.close()
+        else:
+            state.cn.close()
+
+    def close(self):
+        """Close every thread's state on its own thread, as sqlite3 requires, then stop the threads."""
+        barrier = threading.Barrier(self.workers)
+        for future in [self._executor.submit(self._close_thread, barrier) for _ in range(self.workers)]:
+            future.result()
+        self._executor.shutdown()
@@ -0,0 +1,111 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Sequence, Tuple
+
+from rag._config import appConfig
+from rag._database import RagDb
+from rag._utils import compute_file_hash
+
+logger = logging.getLogger(__name__)
+
+# Paths looked up in the scan index per query.
+_SCAN_BATCH = 500
+
+
+class FolderScanner:
+    """
+    Finds the files in a folder tree that still need to be ingested.
+
+    The FILE_SCAN table remembers each file's size, mtime and hash. A file
+    whose size and mtime are unchanged is decided from the index alone; only
+    new or modified files are read, hashed in parallel with memory-mapped reads,
+    and each of those exactly once per scan.
+    """
+
+    def __init__(
+            self,
+            rag_db: RagDb,
+            hash_workers: int = int(appConfig.get("SCAN_HASH_WORKERS")),
+            extensions: Sequence[str] = (".pdf",),
+    ):
+        self.rag_db = rag_db
+        self.hash_workers = hash_workers
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.files = 0
+        self.hashed = 0
+
+    def walk(self, folder: str) -> Iterator[Tuple[str, int, int]]:
+        """Yield ``(path, size, mtime_ns)`` for matching files below ``folder``."""
+        directories = [folder]
+        while directories:
+            directory = directories.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            directories.append(entry.path)
+                        elif entry.is_file() and entry.name.lower().endswith(self.extensions):
+                            stat = entry.stat()
+                            yield entry.path, stat.st_size, stat.st_mtime_ns
+            except OSError as e:
+                logger.warning(f"Cannot scan {directory}: {e}")
+
+    def scan(self, folder: str) -> List[Tuple[str, str]]:
+        """
+        Return ``(file_path, file_hash)`` for every file not yet ingested.
+
+        Files with the same content are returned once, under the first path found.
+        """
+        self.files = self.hashed = 0
+        candidates, seen_hashes = [], set()
+        with ThreadPoolExecutor(self.hash_workers, thread_name_prefix="rag-hash") as executor:
+            batch = []
+            for entry in self.walk(folder):
+                batch.append(entry)
+                if len(batch) >= _SCAN_BATCH:
+                    candidates.extend(self._scan_batch(executor, batch, seen_hashes))
+                    batch = []
+            candidates.extend(self._scan_batch(executor, batch, seen_hashes))
+        logger.info(f"Scanned {self.files} files in {folder}, hashed {self.hashed}, "
+                    f"{len(candidates)} to ingest")
+        return candidates
+
+    def scan_files(self, entries: Sequence[Tuple[str, int, int]]) -> List[Tuple[str, str]]:
+        """Like ``scan``, for known ``(path, size, mtime_ns)`` entries instead of a folder walk."""
+        candidates, seen_hashes = [], set()
+        with ThreadPoolExecutor(self.hash_workers, thread_name_prefix="rag-hash") as executor:
+            for start in range(0, len(entries), _SCAN_BATCH):
+                candidates.extend(self._scan_batch(executor, list(entries[start:start + _SCAN_BATCH]),
+                                                   seen_hashes))
+        return candidates
+
+    def _scan_batch(self, executor: ThreadPoolExecutor, batch: List[Tuple[str, int, int]],
+                    seen_hashes: set) -> List[Tuple[str, str]]:
+        if not batch:
+            return []
+        self.files += len(batch)
+        known = self.rag_db.get_scan_entries([path for path, _, _ in batch])
+        hashes, changed = {}, []
+        for path, size, mtime_ns in batch:
+            entry = known.get(path)
+            if entry is not None and entry[0] == size and entry[1] == mtime_ns:
+                hashes[path] = entry[2]
+            else:
+                changed.append((path, size, mtime_ns))
+        if changed:
+            fresh = executor.map(lambda item: compute_file_hash(item[0], use_mmap=True), changed)
+            updates = []
+            for (path, size, mtime_ns), file_hash in zip(changed, fresh):
+                hashes[path] = file_hash
+                updates.append((path, size, mtime_ns, file_hash))
+            self.rag_db.upsert_scan_entries(updates)
+            self.hashed += len(changed)
+        ingested = self.rag_db.ingested_hashes(list(set(hashes.values())))
+        candidates = []
+        for path, _, _ in batch:
+            file_hash = hashes[path]
+            if file_hash not in ingested and file_hash not in seen_hashes:
+                seen_hashes.add(file_hash)
+                candidates.append((path, file_hash))
+        return candidates
@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from rag._config import appConfig
+from rag._database import RagDb
+from rag._metrics import STAGE_SECONDS, metrics
+from rag.service._embedding import EmbeddingService
+from rag.service._embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+# One thread for the FTS query, one for the vector query.
+_THREADS = 2
+
+
+class SearchService:
+    """
+    Hybrid retrieval: FTS5 BM25 and vec0 KNN, fused with reciprocal rank fusion.
+
+    The two queries run concurrently on a small thread pool. Each pool thread
+    has its own ``RagDb`` connection, because a sqlite3 connection must not be
+    shared across threads. With ``concurrent=False`` they run one after the
+    other on the caller's thread and connection instead, for callers that
+    already run many searches in parallel, like the server's ``RagDbPool``.
+    """
+
+    def __init__(
+            self,
+            db_file: str = appConfig.get("DATABASE_PATH"),
+            embedder: Optional[EmbeddingService] = None,
+            concurrent: bool = True,
+    ):
+        self.db_file = db_file
+        self.rag_db = RagDb(db_file)
+        self.embedder = embedder or EmbeddingService(cache=EmbeddingCache(self.rag_db))
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(_THREADS, thread_name_prefix="rag-search") if concurrent else None
+
+    def _thread_db(self) -> RagDb:
+        if self._executor is None:
+            return self.rag_db
+        if getattr(self._local, "rag_db", None) is None:
+            self._local.rag_db = RagDb(self.db_file)
+        return self._local.rag_db
+
+    def _fts(self, query: str, limit: int):
+        start = time.perf_counter()
+        return self._thread_db().search_fts(query, limit), time.perf_counter() - start
+
+    def _vector(self, embedding, limit: int):
+        start = time.perf_counter()
+        return self._thread_db().search_embeddings(embedding, limit), time.perf_counter() - start
+
+    def search(self, query: str, limit: int = 10, candidates: int = 50) -> dict:
+        """
+        Run a hybrid search.
+
+        :param query: the free text query.
+        :param limit: the number of fused results to return.
+        :param candidates: how many results each retriever contributes to the fusion.
+        :return: ``{"results": [...], "timings": {phase: seconds}}``, where each
+            result holds chunk_id, document_id, file_path, text and score.
+        """
+        timings = {}
+        start = time.perf_counter()
+        embedding = self.embedder.embed(query)
+        timings["embed"] = time.perf_counter() - start
+
+        if embedding is None:
+            logger.warning("Query embedding failed, falling back to full text search only")
+        phase = time.perf_counter()
+        vector_results, timings["vector"] = [], 0.0
+        if self._executor is None:
+            fts_results, timings["fts"] = self._fts(query, candidates)
+            if embedding is not None:
+                vector_results, timings["vector"] = self._vector(embedding, candidates)
+        else:
+            fts_future = self._executor.submit(self._fts, query, candidates)
+            if embedding is not None:
+                vector_results, timings["vector"] = self._executor.submit(
+                    self._vector, embedding, candidates).result()
+            fts_results, timings["fts"] = fts_future.result()
+        timings["retrieve"] = time.perf_counter() - phase
+
+        phase = time.perf_counter()
+        fused = RagDb.reciprocal_rank_fusion(fts_results, vector_results)[:limit]
+        timings["fuse"] = time.perf_counter() - phase
+
+        phase = time.perf_counter()
+        chunks = self.rag_db.get_chunks([chunk_id for chunk_id, _ in fused])
+        results = [dict(chunks[chunk_id], score=score) for chunk_id, score in fused if chunk_id in chunks]
+        timings["hydrate"] = time.perf_counter() - phase
+        timings["total"] = time.perf_counter() - start
+        metrics.increment("rag_searches_total")
+        for phase, seconds in timings.items():
+            metrics.observe(STAGE_SECONDS, seconds, stage=f"search_{phase}")
+        return {"results": results, "timings": timings}
+
+    def close(self):
+        if self._executor is not None:
+            # A connection can only be closed on its own thread; the barrier puts one call on each.
+            barrier = threading.Barrier(_THREADS)
+            for future in [self._executor.submit(self._close_thread_db, barrier) for _ in range(_THREADS)]:
+                future.result()
+            self._executor.shutdown()
+        self.rag_db.cn.close()
+
+    def _close_thread_db(self, barrier: threading.Barrier):
+        barrier.wait()
+        rag_db = getattr(self._local, "rag_db", None)
+        if rag_db is not None:
+            rag_db.cn.close()
+            self._local.rag_db = None
@@ -0,0 +1,75 @@
+import logging
+import statistics
+import time
+from typing import List, Sequence
+
+from rag._database import RagDb
+from rag._utils import deserialize_float32
+
+logger = logging.getLogger(__name__)
+
+
+def vector_recall_report(
+        rag_db: RagDb,
+        k: int = 10,
+        queries: int = 100,
+        quantizations: Sequence[str] = ("int8", "bit"),
+        dimensions: Sequence[int] = (1024, 512, 256),
+        oversamples: Sequence[int] = (4, 8, 16),
+) -> List[dict]:
+    """
+    Measure recall@k of quantized search with rescoring against exact search.
+
+    Stored vectors are sampled as queries (the query's own chunk is excluded
+    from both result lists). Every quantization/dimensions pair is built into a
+    temporary vec0 table, so the configured tables are left untouched.
+
+    :return: one row per setting, starting with the exact baseline, holding
+        recall, median latency and bytes stored per vector.
+    """
+    sample = rag_db.cur.execute(
+        "SELECT rowid, embedding FROM DOCUMENT_TEXT_CHUNK_VECTOR ORDER BY random() LIMIT ?",
+        (queries,),
+    ).fetchall()
+    if not sample:
+        return []
+    sample = [(rowid, deserialize_float32(blob)) for rowid, blob in sample]
+    full_dimensions = len(sample[0][1])
+
+    exact, latencies = {}, []
+    for rowid, embedding in sample:
+        start = time.perf_counter()
+        rows = rag_db.search_embeddings_exact(embedding, k + 1)
+        latencies.append(time.perf_counter() - start)
+        exact[rowid] = {match for match, _ in rows if match != rowid}
+    report = [{"quantization": "none", "dimensions": full_dimensions, "oversample": None,
+               "recall": 1.0, "p50_ms": statistics.median(latencies) * 1000,
+               "bytes_per_vector": full_dimensions * 4}]
+
+    for quantization in quantizations:
+        for dims in dimensions:
+            if dims > full_dimensions or (quantization == "bit" and dims % 8):
+                continue
+            table = f"temp.RECALL_{quantization.upper()}_{dims}"
+            rag_db.build_quantized_table(quantization, dims, table=table)
+            for oversample in oversamples:
+                recalls, latencies = [], []
+                for rowid, embedding in sample:
+                    start = time.perf_counter()
+                    rows = rag_db.search_embeddings_quantized(embedding, k + 1, quantization, dims,
+                                                              oversample, table=table)
+                    latencies.append(time.perf_counter() - start)
+                    found = {match for match, _ in rows if match != rowid}
+                    if exact[rowid]:
+                        recalls.append(len(found & exact[rowid]) / len(exact[rowid]))
+                report.append({
+                    "quantization": quantization,
+                    "dimensions": dims,
+                    "oversample": oversample,
+                    "recall": statistics.mean(recalls) if recalls else 0.0,
+                    "p50_ms": statistics.median(latencies) * 1000,
+                    "bytes_per_vector": dims if quantization == "int8" else dims // 8,
+                })
+            rag_db.cur.execute(f"DROP TABLE {table}")
+            logger.info(f"Measured recall for {quantization}[{dims}]")
+    return report
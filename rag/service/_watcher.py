@@ -0,0 +1,252 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from rag._config import appConfig
+from rag._database import RagDb
+from rag._metrics import metrics
+from rag.service._scanner import FolderScanner
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # Optional: without watchdog the folder is polled.
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+WATCH_LATENCY_SECONDS = "rag_watch_latency_seconds"
+WATCH_QUEUE_DEPTH = "rag_watch_queue_depth"
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Forwards watchdog events for matching files to the watcher's event loop."""
+
+    def __init__(self, watcher: "FolderWatcher", loop: asyncio.AbstractEventLoop):
+        self.watcher = watcher
+        self.loop = loop
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in ("created", "modified", "moved", "closed"):
+            return
+        path = getattr(event, "dest_path", None) or event.src_path
+        if path.lower().endswith(self.watcher.extensions):
+            self.loop.call_soon_threadsafe(self.watcher.notify, path)
+
+
+class FolderWatcher:
+    """
+    Ingests files as they land in a folder, until stopped.
+
+    New or changed files are noticed through inotify (or the platform's
+    equivalent) when the optional ``watchdog`` package is installed, and
+    otherwise by polling the folder every ``poll_interval`` seconds, which
+    only compares sizes and mtimes. A file is taken once it has been quiet for
+    ``debounce`` seconds with an unchanged size and mtime, so a PDF still being
+    written or copied is not read half way; the downloader's ``.part`` files
+    are ignored until they are renamed into place.
+
+    Settled files are hashed against FILE_SCAN and the ingested documents,
+    so a rename or an identical copy is not ingested again, and wait in a
+    priority queue that hands out the most recently modified file first: new
+    arrivals overtake a backlog. On start, files left over from before are
+    found with one ``FolderScanner`` pass and queued behind anything newer.
+
+    Each ingest records the time from the file being noticed to its chunks
+    being searchable in ``rag_watch_latency_seconds``, and the number of files
+    waiting in ``rag_watch_queue_depth``.
+    """
+
+    def __init__(
+            self,
+            ingest_service,
+            folder: str,
+            debounce: float = float(appConfig.get("WATCH_DEBOUNCE")),
+            poll_interval: float = float(appConfig.get("WATCH_POLL_INTERVAL")),
+            use_watchdog: bool = True,
+            extensions: Tuple[str, ...] = (".pdf",),
+    ):
+        self.ingest_service = ingest_service
+        self.folder = folder
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_watchdog = use_watchdog and Observer is not None
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.ingested = 0
+        self.failed = 0
+        # path -> (first noticed, last event, (size, mtime_ns) at the last event), monotonic times.
+        self._pending: Dict[str, Tuple[float, float, Optional[Tuple[int, int]]]] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._queued = set()
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self._sequence = itertools.count()
+        self._stopping: Optional[asyncio.Event] = None
+        # FolderScanner's RagDb is only ever used from this one thread.
+        self._scan_executor = ThreadPoolExecutor(1, thread_name_prefix="rag-watch-scan")
+        self._scanner: Optional[FolderScanner] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending) + (self._queue.qsize() if self._queue else 0)
+
+    def watch(self):
+        """Run until interrupted."""
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            logger.info("Stopped watching")
+
+    def stop(self):
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.PriorityQueue()
+        self._stopping = asyncio.Event()
+        observer = None
+        if self.use_watchdog:
+            observer = Observer()
+            observer.schedule(_EventHandler(self, loop), self.folder, recursive=True)
+            observer.start()
+        logger.info(f"Watching {self.folder} "
+                    f"({'file system events' if observer else f'polling every {self.poll_interval}s'})")
+        ingest = asyncio.create_task(self._ingest_loop())
+        try:
+            await self._catch_up()
+            tick = min(0.5, self.debounce / 2) if self.debounce > 0 else 0.1
+            next_poll = 0.0
+            while not self._stopping.is_set():
+                if observer is None and time.monotonic() >= next_poll:
+                    await self._poll()
+                    next_poll = time.monotonic() + self.poll_interval
+                await self._settle()
+                metrics.set(WATCH_QUEUE_DEPTH, self.queue_depth)
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), tick)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            ingest.cancel()
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            self._scan_executor.shutdown(wait=False)
+
+    def notify(self, path: str):
+        """Record a change to ``path``; it is ingested once it has settled."""
+        now = time.monotonic()
+        first_seen = self._pending[path][0] if path in self._pending else now
+        self._pending[path] = (first_seen, now, self._stat(path))
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    async def _run_scan(self, fn):
+        return await asyncio.get_running_loop().run_in_executor(self._scan_executor, fn)
+
+    def _scanner_instance(self) -> FolderScanner:
+        # Only called on the scan thread.
+        if self._scanner is None:
+            self._scanner = FolderScanner(RagDb(self.ingest_service.rag_db.db_file), extensions=self.extensions)
+        return self._scanner
+
+    async def _catch_up(self):
+        def scan():
+            scanner = self._scanner_instance()
+            candidates = scanner.scan(self.folder)
+            if not self.use_watchdog:
+                self._snapshot = {path: (size, mtime_ns) for path, size, mtime_ns in scanner.walk(self.folder)}
+            return [(path, file_hash, self._stat(path)) for path, file_hash in candidates]
+
+        now = time.monotonic()
+        for path, file_hash, stat in await self._run_scan(scan):
+            if stat is not None:
+                self._enqueue(path, file_hash, stat[1], now)
+        if self._queue.qsize():
+            logger.info(f"Queued {self._queue.qsize()} files found on start")
+
+    async def _poll(self):
+        current = await self._run_scan(
+            lambda: {path: (size, mtime_ns) for path, size, mtime_ns in self._scanner_instance().walk(self.folder)})
+        for path, stat in current.items():
+            if self._snapshot.get(path) != stat:
+                self.notify(path)
+        self._snapshot = current
+
+    async def _settle(self):
+        now = time.monotonic()
+        settled = []
+        for path, (first_seen, last_event, stat) in list(self._pending.items()):
+            if now - last_event < self.debounce:
+                continue
+            current = self._stat(path)
+            if current is None:
+                del self._pending[path]
+            elif current != stat:
+                # Still being written: wait for another quiet period.
+                self._pending[path] = (first_seen, now, current)
+            else:
+                del self._pending[path]
+                settled.append((path, *current, first_seen))
+        if not settled:
+            return
+        entries = [(path, size, mtime_ns) for path, size, mtime_ns, _ in settled]
+        candidates = dict(await self._run_scan(lambda: self._scanner_instance().scan_files(entries)))
+        for path, _, mtime_ns, first_seen in settled:
+            if path in candidates:
+                self._enqueue(path, candidates[path], mtime_ns, first_seen)
+            else:
+                logger.debug(f"Already ingested: {path}")
+
+    def _enqueue(self, path: str, file_hash: str, mtime_ns: int, first_seen: float):
+        if (path, file_hash) in self._queued:
+            return
+        self._queued.add((path, file_hash))
+        # Newest first; the sequence number keeps equal mtimes in arrival order.
+        self._queue.put_nowait((-mtime_ns, next(self._sequence), path, file_hash, first_seen))
+
+    async def _ingest_loop(self):
+        service = self.ingest_service
+        async with service.embedder:
+            while True:
+                _, _, path, file_hash, first_seen = await self._queue.get()
+                self._queued.discard((path, file_hash))
+                try:
+                    chunk_count = await service.aingest_file(path, file_hash)
+                except Exception as e:
+                    self.failed += 1
+                    metrics.increment("rag_files_total", status="failed")
+                    logger.error(f"Failed to ingest {path}: {e!r}")
+                    continue
+                if chunk_count is None:
+                    continue
+                latency = time.monotonic() - first_seen
+                self.ingested += 1
+                metrics.increment("rag_files_total", status="done")
+                metrics.increment("rag_chunks_total", chunk_count)
+                metrics.observe(WATCH_LATENCY_SECONDS, latency)
+                metrics.set(WATCH_QUEUE_DEPTH, self.queue_depth)
+                logger.info(f"Ingested {path} ({chunk_count} chunks) {latency:.1f}s after it was noticed, "
+                            f"{self.queue_depth} files waiting")
+
+    def stats(self) -> dict:
+        latency = next((histogram for histogram in metrics.snapshot()["histograms"]
+                        if histogram["name"] == WATCH_LATENCY_SECONDS), None)
+        return {
+            "ingested": self.ingested,
+            "failed": self.failed,
+            "queue_depth": self.queue_depth,
+            "latency_p50": latency["p50"] if latency else 0.0,
+            "latency_p90": latency["p90"] if latency else 0.0,
+        }
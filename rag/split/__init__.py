@@ -0,0 +1 @@
+from rag.split._registry import get_splitter, get_tokenizer
@@ -0,0 +1,41 @@
+import threading
+from typing import Dict, Tuple, Type, TypeVar
+
+from ._splitter import Splitter
+
+S = TypeVar("S", bound=Splitter)
+
+# Re-entrant: building a splitter may itself ask the registry for a tokenizer.
+_lock = threading.RLock()
+_tokenizers: Dict[str, object] = {}
+_splitters: Dict[Tuple, Splitter] = {}
+
+
+def get_tokenizer(name: str = "gpt2"):
+    """Return the process-wide ``tokenizers.Tokenizer`` for ``name``, loading it once."""
+    tokenizer = _tokenizers.get(name)
+    if tokenizer is None:
+        with _lock:
+            tokenizer = _tokenizers.get(name)
+            if tokenizer is None:
+                from tokenizers import Tokenizer
+
+                tokenizer = _tokenizers[name] = Tokenizer.from_pretrained(name)
+    return tokenizer
+
+
+def get_splitter(splitter_class: Type[S], **kwargs) -> S:
+    """
+    Return the process-wide splitter for a class and constructor arguments.
+
+    The first call builds the splitter (loading its tokenizer or embedding
+    model); later calls with the same configuration share that instance.
+    """
+    key = (splitter_class, tuple(sorted(kwargs.items())))
+    splitter = _splitters.get(key)
+    if splitter is None:
+        with _lock:
+            splitter = _splitters.get(key)
+            if splitter is None:
+                splitter = _splitters[key] = splitter_class(**kwargs)
+    return splitter
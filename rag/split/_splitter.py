@@ -7,3 +7,7 @@ class Splitter(ABC):
     @abstractmethod
     def split(self, text: str) -> List[str]:
         pass
+
+    def split_many(self, texts: List[str]) -> List[List[str]]:
+        """Split several texts, e.g. all pages of a document, in one call."""
+        return [self.split(text) for text in texts]